@@ -1,8 +1,19 @@
 import streamlit as st
+import metrics
+import warmup
 from db_sqlite import init_db, list_routines
 
 st.set_page_config(page_title="Gym App", page_icon="💪", layout="wide")
+
+# vista de diagnóstico escondida: app.py?diag=1
+if st.query_params.get("diag"):
+    import diagnostics
+    diagnostics.render()
+    st.stop()
+
+metrics.page("Inicio")
 init_db()
+warmup.start()
 
 st.title("💪 Gym App")
 
@@ -17,3 +28,5 @@ if routines:
         st.switch_page("pages/2_Entrenar.py")
 else:
     st.info("Aún no tienes rutinas. Crea una en la pestaña Rutinas.")
+
+metrics.page_done()
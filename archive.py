@@ -0,0 +1,152 @@
+"""
+Archivo de sets viejos (hot / cold).
+
+set_logs crece para siempre, pero la vista por defecto son las últimas semanas.
+archive_sets() mueve los sets más viejos que ARCHIVE_HORIZON_DAYS a gym-archive.db,
+una DB aparte que db_sqlite.connect() adjunta como "archive" en cada conexión.
+session_exercise_summary se queda completo en gym.db, así que volumen, sesiones y
+semanas no cambian; las consultas de sets que llegan a lo archivado (rango "Todo")
+leen la unión de las dos tablas (db_sqlite._set_logs_source) y las del rango
+habitual solo tocan la tabla chica. El backup completo de gym.db ya no arrastra
+el historial viejo; el archivo se respalda aparte (backup.archive_backup).
+
+En el archivo los sets conservan su id, pero la clave es la natural
+(sesión, ejercicio, set_index, created_at): moverlos de nuevo, o re-archivar
+después de un restore / merge que trajo sets ya archivados, no duplica nada.
+
+    python archive.py run [--days 180] [--no-vacuum]
+    python archive.py status
+"""
+import os
+import sqlite3
+
+import db_sqlite
+from db_sqlite import (
+    SET_LOG_COLUMNS, transaction, pooled, quiesce, flush_sets, iso_days_ago, epoch_ms,
+    archive_path, invalidate_cache, rebuild_session_summary, rebuild_personal_records,
+)
+
+ARCHIVE_HORIZON_DAYS = int(os.getenv("GYM_ARCHIVE_DAYS", "180"))
+ARCHIVE_BATCH_ROWS = 50_000
+
+def _ensure_archive():
+    """Crea gym-archive.db si no existe y reabre las conexiones para que la adjunten."""
+    if archive_path().exists():
+        return
+    with quiesce():
+        conn = sqlite3.connect(archive_path())
+        try:
+            conn.executescript("""
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS set_logs (
+                    id INTEGER NOT NULL,
+                    session_id INTEGER NOT NULL,
+                    exercise_id INTEGER NOT NULL,
+                    set_index INTEGER NOT NULL,
+                    reps INTEGER NOT NULL,
+                    weight REAL NOT NULL,
+                    created_at TEXT NOT NULL,
+                    created_ms INTEGER,
+                    local_day INTEGER,
+                    iso_week INTEGER,
+                    UNIQUE (session_id, exercise_id, set_index, created_at)
+                );
+                CREATE INDEX IF NOT EXISTS idx_archive_created ON set_logs(created_at);
+                CREATE INDEX IF NOT EXISTS idx_archive_exercise_created ON set_logs(exercise_id, created_at);
+            """)
+        finally:
+            conn.close()
+
+def _sizes() -> dict:
+    db = db_sqlite.DB_PATH
+    return {
+        "hot_bytes": db.stat().st_size if db.exists() else 0,
+        "archive_bytes": archive_path().stat().st_size if archive_path().exists() else 0,
+    }
+
+def archive_sets(horizon_days: int = ARCHIVE_HORIZON_DAYS, batch: int = ARCHIVE_BATCH_ROWS, vacuum: bool = True) -> dict:
+    """
+    Mueve al archivo los sets con created_at anterior a hoy - `horizon_days`, en lotes
+    de `batch` filas (una transacción por lote, así la app puede escribir entremedio).
+    Con `vacuum` compacta gym.db al final. Devuelve cuántos se movieron y los tamaños.
+    """
+    flush_sets()
+    _ensure_archive()
+    cutoff = iso_days_ago(horizon_days)
+    moved = 0
+    while True:
+        # en WAL el commit no es atómico entre las dos DBs: si se corta justo ahí, el
+        # lote queda en ambas y la siguiente pasada lo limpia (INSERT OR IGNORE + DELETE)
+        with transaction() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.archive_batch")
+            n = conn.execute("""
+                INSERT INTO temp.archive_batch
+                SELECT id FROM main.set_logs WHERE created_ms < ? ORDER BY created_ms LIMIT ?
+            """, (epoch_ms(cutoff), batch)).rowcount
+            if n == 0:
+                break
+            conn.execute(f"""
+                INSERT OR IGNORE INTO archive.set_logs ({SET_LOG_COLUMNS})
+                SELECT {SET_LOG_COLUMNS} FROM main.set_logs
+                WHERE id IN (SELECT id FROM temp.archive_batch)
+            """)
+            conn.execute("DELETE FROM main.set_logs WHERE id IN (SELECT id FROM temp.archive_batch)")
+            conn.execute("DELETE FROM temp.archive_batch")
+        moved += n
+
+    invalidate_cache()
+    if vacuum and moved:
+        with pooled() as conn:
+            conn.execute("VACUUM main")
+            # VACUUM en WAL escribe al -wal: el archivo principal se achica recién al checkpoint
+            conn.execute("PRAGMA main.wal_checkpoint(TRUNCATE)")
+    return {"moved": moved, "cutoff": cutoff, **_sizes()}
+
+def heal_archive() -> dict | None:
+    """
+    Después de un restore o merge: vuelve a archivar lo viejo (los sets que ya estaban
+    en el archivo se descartan por la clave natural) y recalcula el resumen con la
+    unión (también el índice de récords). No hace nada si todavía no hay archivo.
+    """
+    if not archive_path().exists():
+        return None
+    with transaction() as conn:
+        # los que ya están archivados aunque sean más nuevos que el horizonte actual
+        dropped = conn.execute("""
+            DELETE FROM main.set_logs
+            WHERE EXISTS (
+                SELECT 1 FROM archive.set_logs a
+                WHERE a.session_id = set_logs.session_id AND a.exercise_id = set_logs.exercise_id
+                  AND a.set_index = set_logs.set_index AND a.created_at = set_logs.created_at
+            )
+        """).rowcount
+    result = archive_sets(vacuum=False)
+    rebuild_session_summary()
+    rebuild_personal_records()
+    return {**result, "duplicates_dropped": dropped}
+
+def archive_status() -> dict:
+    until = db_sqlite.archived_until()
+    with pooled() as conn:
+        hot = conn.execute("SELECT COUNT(*) FROM main.set_logs").fetchone()[0]
+        cold = conn.execute("SELECT COUNT(*) FROM archive.set_logs").fetchone()[0] if until else 0
+    return {"hot_sets": hot, "archived_sets": cold, "archived_until": until, **_sizes()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Archivo de sets viejos (gym-archive.db)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="mueve al archivo los sets más viejos que --days")
+    run.add_argument("--days", type=int, default=ARCHIVE_HORIZON_DAYS)
+    run.add_argument("--no-vacuum", action="store_true", help="no compactar gym.db al final")
+    sub.add_parser("status", help="cantidad de sets y tamaño de cada archivo")
+    args = ap.parse_args()
+
+    db_sqlite.init_db()
+    if args.cmd == "run":
+        print(archive_sets(args.days, vacuum=not args.no_vacuum))
+    else:
+        print(archive_status())
@@ -0,0 +1,389 @@
+"""
+Backups y restauración de gym.db usando la API de backup de SQLite.
+
+A diferencia de copiar el archivo, `Connection.backup` entrega una copia
+consistente aunque haya una escritura en curso, y copia de a pasos para no
+bloquear la DB. Los backups se escriben a archivos temporales; las páginas
+los entregan a st.download_button directo desde disco.
+
+Para restaurar, el archivo subido se escribe a disco por partes, se valida
+(integrity_check + versión de esquema) y recién ahí se reemplaza la DB con un
+rename atómico, o se combinan sus set_logs con los actuales.
+
+Los sets archivados (gym-archive.db, ver archive.py) no entran en el backup
+completo; archive_backup() los copia aparte.
+"""
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import db_sqlite
+from db_sqlite import (
+    pooled, transaction, now_iso, apply_migrations, init_db, quiesce,
+    rebuild_session_summary, rebuild_personal_records, flush_sets, invalidate_cache, archive_path, has_archive, SCHEMA_VERSION,
+    _fill_time_columns,
+)
+from archive import heal_archive
+
+BACKUP_DIR = Path(tempfile.gettempdir()) / "gym_backups"
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_MAX_AGE_SECONDS = 3600
+
+def _new_backup_path(prefix: str) -> Path:
+    # un directorio por backup, así el archivo conserva un nombre limpio para la descarga
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    cleanup_backups()
+    ts = datetime.now().strftime("%Y%m%d_%H%M")
+    return Path(tempfile.mkdtemp(dir=BACKUP_DIR)) / f"{prefix}_{ts}.db"
+
+def cleanup_backups(max_age_seconds: int = BACKUP_MAX_AGE_SECONDS):
+    """Borra backups temporales viejos (ya descargados o abandonados)."""
+    cutoff = time.time() - max_age_seconds
+    for d in BACKUP_DIR.iterdir():
+        if d.stat().st_mtime < cutoff:
+            shutil.rmtree(d, ignore_errors=True)
+
+def _gzip(path: Path) -> Path:
+    dest = path.with_name(path.name + ".gz")
+    with open(path, "rb") as src, gzip.open(dest, "wb", compresslevel=6) as out:
+        shutil.copyfileobj(src, out, length=1024 * 1024)
+    path.unlink()
+    return dest
+
+def _record_backup(kind: str, last_set_id: int, last_session_id: int):
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO backups (created_at, kind, last_set_id, last_session_id)
+            VALUES (?, ?, ?, ?)
+        """, (now_iso(), kind, last_set_id, last_session_id))
+
+def _max_ids(conn, schema: str = "main") -> tuple[int, int]:
+    last_set = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {schema}.set_logs").fetchone()[0]
+    last_session = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {schema}.workout_sessions").fetchone()[0]
+    return last_set, last_session
+
+def last_backup():
+    with pooled() as conn:
+        return conn.execute("SELECT * FROM backups ORDER BY id DESC LIMIT 1").fetchone()
+
+def _copy_db(dest: Path) -> tuple[int, int]:
+    # copia consistente de la DB a `dest`; devuelve hasta qué set / sesión llegó
+    flush_sets()
+    target = sqlite3.connect(dest)
+    try:
+        with pooled() as conn:
+            conn.backup(target, pages=BACKUP_PAGES_PER_STEP)
+        # el header copiado viene en modo WAL; lo dejamos como archivo único
+        target.execute("PRAGMA journal_mode=DELETE")
+        return _max_ids(target)
+    finally:
+        target.close()
+
+def full_backup(compress: bool = False) -> Path:
+    """Copia completa y consistente de la DB. Devuelve la ruta del archivo (.db o .db.gz)."""
+    dest = _new_backup_path("gym_backup")
+    last_set_id, last_session_id = _copy_db(dest)
+    _record_backup("full", last_set_id, last_session_id)
+    return _gzip(dest) if compress else dest
+
+def archive_backup(compress: bool = False) -> Path | None:
+    """Copia de gym-archive.db (sets archivados, ver archive.py). None si no hay archivo."""
+    if not archive_path().exists():
+        return None
+    dest = _new_backup_path("gym_archive")
+    source = sqlite3.connect(archive_path())
+    target = sqlite3.connect(dest)
+    try:
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP)
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+    return _gzip(dest) if compress else dest
+
+def _copy_rows(conn, table: str, where: str = "", params=()):
+    # columnas explícitas: el orden físico puede variar entre DBs migradas y nuevas
+    cols = ", ".join(r["name"] for r in conn.execute(f"PRAGMA main.table_info({table})"))
+    conn.execute(f"INSERT INTO inc.{table} ({cols}) SELECT {cols} FROM main.{table} {where}", params)
+
+def incremental_backup(compress: bool = False) -> Path | None:
+    """
+    Exporta solo los set_logs (y sus sesiones) nuevos desde el último backup, a un
+    .db con el mismo esquema. set_logs es append-only, así que "nuevo" = id mayor.
+    Devuelve None si no hay nada nuevo.
+    """
+    flush_sets()
+    prev = last_backup()
+    since_set = prev["last_set_id"] if prev else 0
+    since_session = prev["last_session_id"] if prev else 0
+
+    dest = _new_backup_path("gym_sets")
+    target = sqlite3.connect(dest)
+    target.row_factory = sqlite3.Row
+    apply_migrations(target)
+    target.commit()
+    target.close()
+
+    with pooled() as conn:
+        conn.execute("ATTACH DATABASE ? AS inc", (str(dest),))
+        try:
+            with conn:
+                # rutinas y ejercicios son pocos: van completos para poder resolver nombres
+                _copy_rows(conn, "routines")
+                _copy_rows(conn, "exercises")
+                # sesiones antes que sus sets: con foreign_keys=ON el orden importa
+                _copy_rows(conn, "workout_sessions",
+                           "WHERE id > ? OR id IN (SELECT session_id FROM main.set_logs WHERE id > ?)",
+                           (since_session, since_set))
+                _copy_rows(conn, "set_logs", "WHERE id > ?", (since_set,))
+                conn.execute("""
+                    INSERT INTO inc.backups (created_at, kind, last_set_id, last_session_id)
+                    VALUES (?, 'incremental', ?, ?)
+                """, (now_iso(), since_set, since_session))
+                last_set_id, last_session_id = _max_ids(conn, "inc")
+        finally:
+            conn.execute("DETACH DATABASE inc")
+
+    if last_set_id == 0 and last_session_id == 0:
+        shutil.rmtree(dest.parent, ignore_errors=True)
+        return None
+
+    _record_backup("incremental", max(last_set_id, since_set), max(last_session_id, since_session))
+    return _gzip(dest) if compress else dest
+
+
+# --- Restore ---
+SQLITE_MAGIC = b"SQLite format 3\x00"
+GZIP_MAGIC = b"\x1f\x8b"
+REQUIRED_TABLES = {"routines", "exercises", "workout_sessions", "set_logs"}
+
+class BackupError(Exception):
+    """El archivo subido no es un backup válido de Gym App."""
+
+def stage_upload(fileobj) -> Path:
+    """
+    Copia el archivo subido (o cualquier file-like) a un temporal junto a la DB, por
+    partes y descomprimiendo si viene en gzip. Mismo directorio que DB_PATH para que
+    el reemplazo final sea un rename atómico.
+    """
+    db_dir = db_sqlite.DB_PATH.resolve().parent
+    fd, tmp = tempfile.mkstemp(prefix=".restore_", suffix=".db", dir=db_dir)
+    staged = Path(tmp)
+    try:
+        head = fileobj.read(2)
+        src = fileobj
+        if head == GZIP_MAGIC:
+            fileobj.seek(0)
+            src = gzip.open(fileobj, "rb")
+            head = b""
+        with os.fdopen(fd, "wb") as out:
+            out.write(head)
+            shutil.copyfileobj(src, out, length=1024 * 1024)
+    except Exception:
+        staged.unlink(missing_ok=True)
+        raise
+    return staged
+
+def validate_backup(path: Path) -> dict:
+    """Revisa que `path` sea una DB SQLite sana de esta app. Devuelve info básica o lanza BackupError."""
+    with open(path, "rb") as f:
+        if f.read(len(SQLITE_MAGIC)) != SQLITE_MAGIC:
+            raise BackupError("El archivo no es una base de datos SQLite.")
+
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        check = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if check != "ok":
+            raise BackupError(f"El backup está dañado (integrity_check: {check}).")
+
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise BackupError(
+                f"El backup es de una versión más nueva de la app (esquema {version}, esta app usa {SCHEMA_VERSION})."
+            )
+
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        missing = REQUIRED_TABLES - tables
+        if missing:
+            raise BackupError(f"Al backup le faltan tablas: {', '.join(sorted(missing))}.")
+
+        kind = "full"
+        if "backups" in tables:
+            row = conn.execute("SELECT kind FROM backups ORDER BY id DESC LIMIT 1").fetchone()
+            if row and row[0] == "incremental":
+                kind = "incremental"
+        n_sets = conn.execute("SELECT COUNT(*) FROM set_logs").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"No pude leer el backup: {e}") from e
+    finally:
+        conn.close()
+
+    return {"schema_version": version, "kind": kind, "n_sets": n_sets}
+
+def _prepare(staged: Path):
+    # llevar la copia al esquema actual y dejarla como archivo único (sin WAL)
+    conn = sqlite3.connect(staged)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        apply_migrations(conn)
+        conn.commit()
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+
+def restore_backup(staged: Path) -> Path:
+    """
+    Reemplaza la DB por `staged` (ya validado). Antes copia la DB actual junto a ella
+    (gym.db.pre-restore-<fecha>, fuera de BACKUP_DIR: cleanup_backups no la toca) y
+    devuelve esa ruta, por si hay que deshacer.
+    """
+    info = validate_backup(staged)
+    if info["kind"] == "incremental":
+        raise BackupError("Un export incremental no se puede restaurar solo; usa 'Combinar sets'.")
+    _prepare(staged)
+
+    db_path = db_sqlite.DB_PATH
+    previous = db_path.with_name(f"{db_path.name}.pre-restore-{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    _copy_db(previous)
+    with quiesce():
+        for suffix in ("-wal", "-shm"):
+            Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+        os.replace(staged, db_path)
+    # días locales guardados con otra GYM_TZ
+    db_sqlite._sync_time_columns()
+    # el backup puede traer sets que ya están archivados (o ser anterior al archivo)
+    heal_archive()
+    return previous
+
+def merge_backup(staged: Path) -> dict:
+    """
+    Agrega a la DB actual los sets del backup que no estén ya, en una sola transacción.
+    Rutinas, ejercicios y sesiones se resuelven por nombre / (rutina, started_at);
+    los que no existan se crean.
+    """
+    validate_backup(staged)
+    _prepare(staged)
+
+    with pooled() as conn:
+        before = conn.execute("SELECT COUNT(*) FROM set_logs").fetchone()[0]
+        # sets que ya se archivaron tampoco se vuelven a agregar
+        not_archived = """
+                      AND NOT EXISTS (
+                        SELECT 1 FROM archive.set_logs a
+                        WHERE a.session_id = ms.new_id AND a.exercise_id = me.new_id
+                          AND a.set_index = b.set_index AND a.created_at = b.created_at
+                      )""" if has_archive(conn) else ""
+        conn.execute("ATTACH DATABASE ? AS bak", (str(staged),))
+        try:
+            with conn:
+                conn.executescript(f"""
+                    BEGIN IMMEDIATE;
+
+                    INSERT INTO main.routines (name, created_at)
+                    SELECT b.name, b.created_at FROM bak.routines b
+                    WHERE NOT EXISTS (SELECT 1 FROM main.routines r WHERE r.name = b.name);
+
+                    CREATE TEMP TABLE map_routine (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL);
+                    INSERT INTO map_routine
+                    SELECT b.id, (SELECT MIN(r.id) FROM main.routines r WHERE r.name = b.name)
+                    FROM bak.routines b;
+
+                    INSERT INTO main.exercises (routine_id, name, order_index, default_sets, default_rest_seconds, image_path)
+                    SELECT m.new_id, b.name, b.order_index, b.default_sets, b.default_rest_seconds, b.image_path
+                    FROM bak.exercises b JOIN map_routine m ON m.old_id = b.routine_id
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM main.exercises e WHERE e.routine_id = m.new_id AND e.name = b.name
+                    );
+
+                    CREATE TEMP TABLE map_exercise (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL);
+                    INSERT INTO map_exercise
+                    SELECT b.id, (
+                        SELECT MIN(e.id) FROM main.exercises e WHERE e.routine_id = m.new_id AND e.name = b.name
+                    )
+                    FROM bak.exercises b JOIN map_routine m ON m.old_id = b.routine_id;
+
+                    INSERT INTO main.workout_sessions (routine_id, started_at, finished_at)
+                    SELECT m.new_id, b.started_at, b.finished_at
+                    FROM bak.workout_sessions b JOIN map_routine m ON m.old_id = b.routine_id
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM main.workout_sessions s WHERE s.routine_id = m.new_id AND s.started_at = b.started_at
+                    );
+
+                    CREATE TEMP TABLE map_session (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL);
+                    INSERT INTO map_session
+                    SELECT b.id, (
+                        SELECT MIN(s.id) FROM main.workout_sessions s WHERE s.routine_id = m.new_id AND s.started_at = b.started_at
+                    )
+                    FROM bak.workout_sessions b JOIN map_routine m ON m.old_id = b.routine_id;
+
+                    INSERT INTO main.set_logs (session_id, exercise_id, set_index, reps, weight, created_at)
+                    SELECT ms.new_id, me.new_id, b.set_index, b.reps, b.weight, b.created_at
+                    FROM bak.set_logs b
+                    JOIN map_session ms ON ms.old_id = b.session_id
+                    JOIN map_exercise me ON me.old_id = b.exercise_id
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM main.set_logs s
+                        WHERE s.session_id = ms.new_id AND s.exercise_id = me.new_id
+                          AND s.set_index = b.set_index AND s.created_at = b.created_at
+                    ){not_archived};
+
+                    DROP TABLE map_routine;
+                    DROP TABLE map_exercise;
+                    DROP TABLE map_session;
+                """)
+                # sesiones y sets recién copiados vienen sin las columnas de tiempo
+                _fill_time_columns(conn.cursor())
+            after = conn.execute("SELECT COUNT(*) FROM set_logs").fetchone()[0]
+        finally:
+            conn.execute("DETACH DATABASE bak")
+
+    staged.unlink(missing_ok=True)
+    invalidate_cache()
+    if heal_archive() is None:
+        rebuild_session_summary()
+        rebuild_personal_records()
+    return {"sets_added": after - before}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Backup de gym.db")
+    ap.add_argument("--incremental", action="store_true", help="solo sets nuevos desde el último backup")
+    ap.add_argument("--archive", action="store_true", help="copia de gym-archive.db (sets archivados)")
+    ap.add_argument("--gzip", action="store_true")
+    ap.add_argument("-o", "--output", type=Path, help="copiar el backup a esta ruta")
+    ap.add_argument("--restore", type=Path, metavar="ARCHIVO", help="reemplazar la DB por este backup")
+    ap.add_argument("--merge", type=Path, metavar="ARCHIVO", help="agregar los sets de este backup")
+    args = ap.parse_args()
+
+    init_db()
+    if args.restore or args.merge:
+        with open(args.restore or args.merge, "rb") as f:
+            staged = stage_upload(f)
+        try:
+            if args.restore:
+                print(f"Restaurado. Base anterior: {restore_backup(staged)}")
+            else:
+                print(f"Sets agregados: {merge_backup(staged)['sets_added']}")
+        finally:
+            staged.unlink(missing_ok=True)
+        raise SystemExit(0)
+
+    if args.archive:
+        path = archive_backup(args.gzip)
+    else:
+        path = incremental_backup(args.gzip) if args.incremental else full_backup(args.gzip)
+    if path is None:
+        print("No hay archivo de sets." if args.archive else "No hay sets nuevos desde el último backup.")
+    elif args.output:
+        shutil.move(path, args.output)
+        print(args.output)
+    else:
+        print(path)
@@ -0,0 +1,68 @@
+"""
+Import / export masivo: exporta una DB sintética a Parquet y CSV (streaming) y la
+importa en una DB vacía. Como referencia, log_set() fila por fila sobre una muestra.
+
+    python benchmarks/bulk_import.py [--sets 1000000] [--sample 5000]
+"""
+import argparse
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db_sqlite
+import transfer
+from workload import generate
+
+
+def timed_once(name: str, fn):
+    t0 = time.perf_counter()
+    out = fn()
+    print(f"{name:<20} {time.perf_counter() - t0:8.2f} s   {out}")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sets", type=int, default=1_000_000)
+    ap.add_argument("--sample", type=int, default=5000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        generate(tmp / "source.db", args.sets)
+        for fmt in ("parquet", "csv"):
+            dest = tmp / f"sets.{fmt}"
+            timed_once(f"export {fmt}", lambda: transfer.export_sets(dest))
+            print(f"{'':<20} {dest.stat().st_size / 2**20:8.1f} MiB")
+
+        for fmt in ("parquet", "csv"):
+            db_sqlite.DB_PATH = tmp / f"import_{fmt}.db"
+            db_sqlite.init_db()
+            timed_once(f"import {fmt}", lambda: transfer.import_sets(tmp / f"sets.{fmt}"))
+            timed_once(f"re-import {fmt}", lambda: transfer.import_sets(tmp / f"sets.{fmt}")["sets_added"])
+
+        # referencia: lo que costaba cargar historial marcando sets uno por uno
+        db_sqlite.DB_PATH = tmp / "log_set.db"
+        db_sqlite.init_db()
+        db_sqlite.create_routine("Bench")
+        rid = db_sqlite.list_routines()[0]["id"]
+        db_sqlite.add_exercise(rid, "Ej", 1, 3, 90, None)
+        eid = db_sqlite.list_exercises(rid)[0]["id"]
+        sid = db_sqlite.start_session(rid)
+        t0 = time.perf_counter()
+        for i in range(args.sample):
+            db_sqlite.log_set(sid, eid, i + 1, 10, 50.0)
+        per_row = (time.perf_counter() - t0) / args.sample
+        print(f"{'log_set x1M (est.)':<20} {per_row * args.sets:8.2f} s   ({per_row * 1e6:.0f} µs/set)")
+
+        print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB")
+        db_sqlite.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+stats_sets() -> DataFrame: filas sqlite3.Row + dict por fila (como antes) vs. fetch columnar a Arrow.
+
+Cada medición corre en un subproceso para que el peak RSS sea comparable.
+
+    python benchmarks/columnar_fetch.py [--sets 100000 1000000]
+"""
+import argparse
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+def build_db(path: Path, n_sets: int):
+    import db_sqlite
+
+    db_sqlite.DB_PATH = path
+    db_sqlite.init_db()
+    db_sqlite.close_connections()
+
+    rnd = random.Random(0)
+    start = datetime(2020, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO routines (name, created_at) VALUES ('Bench', ?)", (start.isoformat(),))
+    conn.executemany(
+        "INSERT INTO exercises (routine_id, name, order_index) VALUES (1, ?, ?)",
+        [(f"Ejercicio {i}", i) for i in range(10)],
+    )
+    n_sessions = max(1, -(-n_sets // 30))  # cada set con su sesión (los FK se cumplen)
+    conn.executemany(
+        "INSERT INTO workout_sessions (routine_id, started_at) VALUES (1, ?)",
+        [((start + timedelta(hours=12 * s)).isoformat(timespec="seconds"),) for s in range(n_sessions)],
+    )
+    conn.executemany(
+        """INSERT INTO set_logs (session_id, exercise_id, set_index, reps, weight, created_at)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        (
+            (i // 30 + 1, i % 10 + 1, i % 3 + 1, rnd.randint(3, 12), rnd.randint(0, 80) * 2.5,
+             (start + timedelta(hours=12 * (i // 30), seconds=i % 30 * 90)).isoformat(timespec="seconds"))
+            for i in range(n_sets)
+        ),
+    )
+    conn.commit()
+    conn.close()
+    db_sqlite.backfill_time_columns()
+    db_sqlite.close_connections()
+
+
+def run_one(db_path: str, method: str):
+    import pandas as pd
+    import pyarrow  # noqa: F401  (misma base de imports para ambos métodos)
+    import db_sqlite
+
+    db_sqlite.DB_PATH = Path(db_path)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    if method == "rows":
+        df = pd.DataFrame([dict(r) for r in db_sqlite.stats_sets()])
+        df["created_at"] = pd.to_datetime(df["created_at"])
+    else:
+        df = db_sqlite.stats_sets_frame()
+    elapsed = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+    print(f"{elapsed:.3f} {peak / 1024:.1f} {len(df)}")
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        run_one(sys.argv[2], sys.argv[3])
+        return
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sets", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sets:
+            path = Path(tmp) / f"bench_{n}.db"
+            build_db(path, n)
+            for method in ("rows", "arrow"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", str(path), method],
+                    capture_output=True, text=True, check=True, cwd=ROOT,
+                ).stdout.split()
+                secs, mem, rows = out
+                print(f"{n:>9} sets  {method:<6} {float(secs) * 1000:8.0f} ms   peak +{float(mem):7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Latencia de DB por rerun: conexión nueva por helper (como antes) vs. pool de conexiones.
+
+Simula el rerun de Entrenar al marcar un set: list_routines + list_exercises + log_set.
+
+    python benchmarks/rerun_latency.py [--reruns 500]
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db_sqlite
+
+
+def legacy_rerun(db_path: Path, routine_id: int, session_id: int, exercise_id: int):
+    # Patrón original: connect -> 1 statement -> commit -> close, journal por defecto.
+    def conn():
+        c = sqlite3.connect(db_path, check_same_thread=False)
+        c.row_factory = sqlite3.Row
+        return c
+
+    c = conn()
+    c.execute("SELECT id, name, created_at FROM routines ORDER BY id DESC").fetchall()
+    c.close()
+
+    c = conn()
+    c.execute("""
+        SELECT id, routine_id, name, order_index, default_sets, default_rest_seconds, image_path
+        FROM exercises WHERE routine_id=? ORDER BY order_index ASC, id ASC
+    """, (routine_id,)).fetchall()
+    c.close()
+
+    c = conn()
+    c.execute("""
+        INSERT INTO set_logs (session_id, exercise_id, set_index, reps, weight, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (session_id, exercise_id, 1, 10, 50.0, db_sqlite.now_iso()))
+    c.commit()
+    c.close()
+
+
+def pooled_rerun(routine_id: int, session_id: int, exercise_id: int):
+    db_sqlite.list_routines()
+    db_sqlite.list_exercises(routine_id)
+    db_sqlite.log_set(session_id, exercise_id, 1, 10, 50.0)
+
+
+def timed(fn, n: int) -> list[float]:
+    out = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        out.append((time.perf_counter() - t0) * 1000)
+    return sorted(out)
+
+
+def report(name: str, ms: list[float]):
+    p50 = ms[len(ms) // 2]
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    print(f"{name:<20} p50={p50:7.3f} ms   p99={p99:7.3f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reruns", type=int, default=500)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # "antes": archivo separado, en modo rollback journal (default de sqlite)
+        legacy_db = Path(tmp) / "legacy.db"
+        db_sqlite.DB_PATH = legacy_db
+        db_sqlite.init_db()
+        db_sqlite.close_connections()
+        with sqlite3.connect(legacy_db) as c:
+            c.execute("PRAGMA journal_mode=DELETE")
+
+        db_sqlite.DB_PATH = Path(tmp) / "pooled.db"
+        db_sqlite.init_db()
+
+        ids = {}
+        for path in (legacy_db, db_sqlite.DB_PATH):
+            with sqlite3.connect(path) as c:
+                c.execute("INSERT INTO routines (name, created_at) VALUES ('Bench', ?)", (db_sqlite.now_iso(),))
+                rid = c.execute("SELECT max(id) FROM routines").fetchone()[0]
+                for i in range(8):
+                    c.execute("INSERT INTO exercises (routine_id, name, order_index) VALUES (?, ?, ?)", (rid, f"Ej {i}", i))
+                eid = c.execute("SELECT max(id) FROM exercises").fetchone()[0]
+                c.execute("INSERT INTO workout_sessions (routine_id, started_at) VALUES (?, ?)", (rid, db_sqlite.now_iso()))
+                sid = c.execute("SELECT max(id) FROM workout_sessions").fetchone()[0]
+            ids[path] = (rid, sid, eid)
+
+        report("antes", timed(lambda: legacy_rerun(legacy_db, *ids[legacy_db]), args.reruns))
+        report("pool+WAL", timed(lambda: pooled_rerun(*ids[db_sqlite.DB_PATH]), args.reruns))
+        db_sqlite.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Latencia tick -> render al marcar sets rápido: log_set() síncrono vs. enqueue_set() (write-behind).
+
+    python benchmarks/set_logging.py [--ticks 1000]
+"""
+import argparse
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db_sqlite
+from rerun_latency import report, timed
+
+
+def hold_write_lock(path: Path, stop: threading.Event, hold_ms: float = 20):
+    # otra conexión escribiendo (ej. backup, import): toma el lock de escritura a ratos
+    conn = sqlite3.connect(path, isolation_level=None)
+    while not stop.is_set():
+        conn.execute("BEGIN IMMEDIATE")
+        time.sleep(hold_ms / 1000)
+        conn.execute("COMMIT")
+        time.sleep(hold_ms / 1000)
+    conn.close()
+
+
+def run(sid: int, eid: int, ticks: int, counter):
+    report("log_set", timed(lambda: db_sqlite.log_set(sid, eid, next(counter), 8, 60.0), ticks))
+
+    for fsync in (True, False):
+        db_sqlite.JOURNAL_FSYNC = fsync
+        ms = timed(lambda: db_sqlite.enqueue_set(sid, eid, next(counter), 8, 60.0), ticks)
+        report(f"enqueue fsync={'on' if fsync else 'off'}", ms)
+
+        t0 = time.perf_counter()
+        db_sqlite.flush_sets()
+        print(f"  flush final: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--ticks", type=int, default=1000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_sqlite.DB_PATH = Path(tmp) / "bench.db"
+        db_sqlite.init_db()
+        db_sqlite.create_routine("Bench")
+        rid = db_sqlite.list_routines()[0]["id"]
+        db_sqlite.add_exercise(rid, "Press", 0, 3, 60, None)
+        eid = db_sqlite.list_exercises(rid)[0]["id"]
+        sid = db_sqlite.start_session(rid)
+
+        counter = iter(range(10**9))
+        print("-- DB libre")
+        run(sid, eid, args.ticks, counter)
+
+        print("-- otra conexión tomando el lock de escritura 20 ms de cada 40 ms")
+        stop = threading.Event()
+        holder = threading.Thread(target=hold_write_lock, args=(db_sqlite.DB_PATH, stop))
+        holder.start()
+        try:
+            run(sid, eid, args.ticks // 5, counter)
+        finally:
+            stop.set()
+            holder.join()
+        db_sqlite.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Arranque en frío: cuánto cuesta la primera carga de cada página en un proceso nuevo
+y en qué se va el tiempo de imports (python -X importtime, agrupado por paquete).
+
+    python benchmarks/startup.py [--sets 20000] [--top 8]
+
+Cada página corre en su propio subproceso con AppTest, contra una DB sintética.
+Por defecto sin warm-up (GYM_WARMUP=0); GYM_WARMUP=1 para medir con él.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+ROOT = Path(__file__).resolve().parents[1]
+PAGES = ["app.py", "pages/1_Rutinas.py", "pages/2_Entrenar.py", "pages/3_Estadisticas.py"]
+HEAVY = ("pandas", "plotly.express", "pyarrow", "numpy", "PIL.Image")
+
+# streamlit y AppTest se importan antes de medir: el tiempo de la página es lo que
+# ella agrega (sus imports + el primer rerun)
+RUNNER = """
+import sys, time
+from streamlit.testing.v1 import AppTest
+print("RUN_START", file=sys.stderr)
+t0 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=600).run()
+print(f"RUN_MS {(time.perf_counter() - t0) * 1000:.1f}", file=sys.stderr)
+if at.exception:
+    raise SystemExit(at.exception[0].value)
+"""
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_page(page: str, env: dict) -> dict:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", RUNNER, page],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    by_package = defaultdict(float)
+    modules = set()
+    run_ms = None
+    started = False
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m and started:
+            # tiempo propio de cada módulo, sumado por paquete raíz
+            by_package[m.group(4).split(".")[0]] += int(m.group(1)) / 1000
+            modules.add(m.group(4))
+        elif line.startswith("RUN_START"):
+            started = True
+        elif line.startswith("RUN_MS"):
+            run_ms = float(line.split()[1])
+    if proc.returncode or run_ms is None:
+        raise RuntimeError(f"{page} falló:\n{proc.stderr[-2000:]}")
+    return {
+        "run_ms": run_ms,
+        "import_ms": sum(by_package.values()),
+        "packages": dict(by_package),
+        "heavy": [m for m in HEAVY if m in modules],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sets", type=int, default=20_000)
+    ap.add_argument("--top", type=int, default=8)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "startup.db"
+        subprocess.run([sys.executable, "-c", f"from workload import generate; generate({str(db_path)!r}, {args.sets})"],
+                       cwd=Path(__file__).resolve().parent, check=True)
+        env = {**os.environ, "GYM_DB_PATH": str(db_path), "GYM_WARMUP": os.getenv("GYM_WARMUP", "0")}
+
+        for page in PAGES:
+            res = profile_page(page, env)
+            print(f"\n{page}: primera carga {res['run_ms']:.0f} ms (imports {res['import_ms']:.0f} ms)")
+            print(f"  pesados cargados: {', '.join(res['heavy']) or '-'}")
+            top = sorted(res["packages"].items(), key=lambda kv: kv[1], reverse=True)[:args.top]
+            for pkg, ms in top:
+                print(f"  {pkg:<24} {ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
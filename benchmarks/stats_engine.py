@@ -0,0 +1,64 @@
+"""
+Estadísticas para "Todo": cálculo inline con pandas (como hacía la página) vs. el
+módulo stats (numpy, frío y memorizado), más las columnas derivadas sueltas.
+
+    python benchmarks/stats_engine.py [--sets 1000000] [--repeat 5]
+"""
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db_sqlite
+import stats
+from columnar_fetch import build_db
+from rerun_latency import report, timed
+
+
+def inline_pandas():
+    # lo que hacía la página en cada rerun, sobre todos los sets
+    df = db_sqlite.stats_sets_frame()
+    df["created_at"] = pd.to_datetime(df["created_at"], utc=True).dt.tz_convert(db_sqlite.TIMEZONE.key).dt.tz_localize(None)
+    df["session_date"] = df["created_at"].dt.date
+    df["e1rm"] = df["weight"] * (1 + df["reps"] / 30.0)
+    df["session_id"] = df["session_date"].astype(str) + "_" + df["routine"].astype(str)
+    df.groupby("exercise", as_index=False)["volume"].sum()
+    df.groupby(["exercise", "session_id"]).agg(top_weight=("weight", "max"), top_e1rm=("e1rm", "max"))
+    iso = pd.to_datetime(df["session_date"]).dt.isocalendar()
+    df.assign(year=iso["year"], week=iso["week"]).groupby(["year", "week"])["session_id"].nunique()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sets", type=int, default=1_000_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_db(Path(tmp) / "stats.db", args.sets)
+        db_sqlite.rebuild_session_summary()
+
+        report("inline pandas", timed(inline_pandas, args.repeat))
+
+        def cold():
+            stats.clear_memo()
+            stats.compute(None)
+        report("stats frío", timed(cold, args.repeat))
+        report("stats memo", timed(lambda: stats.compute(None), args.repeat * 100))
+
+        sets = stats.load_sets()
+        report("to_local", timed(lambda: stats.to_local(sets["created_at"]), args.repeat))
+        report("e1rm", timed(lambda: stats.e1rm(sets["weight"], sets["reps"]), args.repeat))
+        report("group_by sesión", timed(lambda: stats.group_by(sets["session_id"]), args.repeat))
+        print(f"{np.size(sets['session_id'])} sets")
+        db_sqlite.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Suite end-to-end: genera bases sintéticas (workload.py) de varios tamaños y mide
+cada función de db_sqlite y la corrida completa de app.py y de cada página con
+AppTest. Reporta p50/p99, peak de memoria Python por caso (tracemalloc) y peak RSS
+por tamaño, y guarda todo en un JSON para comparar entre commits.
+
+Cada tamaño corre en un subproceso (RSS y caches limpios).
+
+    python benchmarks/suite.py [--sets 10000 100000 1000000] [--out resultados.json]
+    python benchmarks/suite.py --compare antes.json despues.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(ROOT))
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+PAGES = ["app.py", "pages/1_Rutinas.py", "pages/2_Entrenar.py", "pages/3_Estadisticas.py"]
+
+# cada caso corre hasta `runs` veces o hasta gastar CASE_BUDGET_SECONDS (mínimo MIN_RUNS)
+CASE_BUDGET_SECONDS = 10.0
+MIN_RUNS = 3
+
+
+def measure(fn, runs: int = 200, setup=None) -> dict:
+    """
+    Una corrida con tracemalloc (peak de memoria Python) y después `runs` corridas
+    cronometradas. `setup`, si viene, se llama antes de cada corrida fuera del
+    cronómetro y su resultado se le pasa a `fn`.
+    """
+    call = (lambda: fn(setup())) if setup else fn
+
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    ms = []
+    spent = 0.0
+    while len(ms) < runs and (len(ms) < MIN_RUNS or spent < CASE_BUDGET_SECONDS):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg) if setup else fn()
+        elapsed = time.perf_counter() - t0
+        spent += elapsed
+        ms.append(elapsed * 1000)
+    ms.sort()
+    return {
+        "p50_ms": round(ms[len(ms) // 2], 4),
+        "p99_ms": round(ms[min(len(ms) - 1, int(len(ms) * 0.99))], 4),
+        "runs": len(ms),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def db_cases(db, stats):
+    """(nombre, fn, runs, setup) para cada función de db_sqlite. Primero lecturas, después escrituras."""
+    routine_id = db.list_routines()[-1]["id"]
+    exercise_id = db.list_exercises(routine_id)[0]["id"]
+    session_id = db.start_session(routine_id)
+    month = db.iso_days_ago(28)
+
+    def fresh(load):
+        def run():
+            db.invalidate_cache()
+            return load()
+        return run
+
+    def schema_version():
+        with db.pooled() as conn:
+            return db.schema_version(conn)
+
+    def compute_cold(days):
+        def run():
+            stats.clear_memo()
+            return stats.compute(days)
+        return run
+
+    def progress_chart(cold):
+        import charts
+
+        def build():
+            sets = stats.exercise_sets(exercise_id, None)
+            return charts.line(sets.sort_values("created_at"),
+                               "created_at", "weight", ["routine", "reps", "set_index", "volume"])
+
+        def run():
+            if cold:
+                charts.clear_memo()
+            return charts.cached(("sets", exercise_id, None), build)
+        return run
+
+    def new_routine():
+        db.create_routine("Bench tmp")
+        return db.list_routines()[0]["id"]
+
+    def new_exercise():
+        db.add_exercise(routine_id, "Bench tmp", 10**6, 3, 90, None)
+        return db.list_exercises(routine_id)[-1]["id"]
+
+    def enqueue_and_flush():
+        db.enqueue_set(session_id, exercise_id, 99, 10, 50.0)
+        db.flush_sets()
+
+    return [
+        ("init_db", db.init_db, 50, None),
+        ("schema_version", schema_version, 200, None),
+        ("data_version", db.data_version, 500, None),
+        ("cache_stats", db.cache_stats, 500, None),
+        ("list_routines", db.list_routines, 500, None),
+        ("list_routines (sin cache)", fresh(db.list_routines), 200, None),
+        ("list_exercises", lambda: db.list_exercises(routine_id), 500, None),
+        ("list_exercises (sin cache)", fresh(lambda: db.list_exercises(routine_id)), 200, None),
+        ("has_sets", db.has_sets, 200, None),
+        ("pending_sets", db.pending_sets, 500, None),
+        ("stats_sets 4 sem", lambda: db.stats_sets(since=month), 50, None),
+        ("stats_sets todo", db.stats_sets, 10, None),
+        ("stats_sets_frame 4 sem", lambda: db.stats_sets_frame(since=month), 50, None),
+        ("stats_sets_frame todo", db.stats_sets_frame, 10, None),
+        ("stats.compute 4 sem (frío)", compute_cold(28), 20, None),
+        ("stats.compute todo (frío)", compute_cold(None), 10, None),
+        ("stats.compute todo (memo)", lambda: stats.compute(None), 500, None),
+        ("stats.exercise_sets todo", lambda: stats.exercise_sets(exercise_id, None), 50, None),
+        ("stats.write_snapshot", stats.write_snapshot, 3, None),
+        ("stats.compute todo (snapshot)", compute_cold(None), 20, None),
+        ("charts.line sets todo (frío)", progress_chart(cold=True), 20, None),
+        ("charts.line sets todo (memo)", progress_chart(cold=False), 500, None),
+        ("log_set", lambda: db.log_set(session_id, exercise_id, 1, 10, 50.0), 200, None),
+        ("enqueue_set+flush_sets", enqueue_and_flush, 200, None),
+        ("recover_set_journal", db.recover_set_journal, 200, None),
+        ("start_session", lambda: db.start_session(routine_id), 200, None),
+        ("finish_session", lambda: db.finish_session(session_id), 200, None),
+        ("create_routine", lambda: db.create_routine("Bench tmp"), 100, None),
+        ("rename_routine", lambda rid: db.rename_routine(rid, "Bench renombrada"), 100, new_routine),
+        ("delete_routine", db.delete_routine, 100, new_routine),
+        ("add_exercise", lambda: db.add_exercise(routine_id, "Bench tmp", 10**6, 3, 90, None), 100, None),
+        ("update_exercise", lambda eid: db.update_exercise(eid, "Bench upd", 10**6, 4, 60, None), 100, new_exercise),
+        ("delete_exercise", db.delete_exercise, 100, new_exercise),
+        ("checkpoint", db.checkpoint, 20, None),
+        ("rebuild_session_summary", db.rebuild_session_summary, 5, None),
+    ]
+
+
+def page_cases():
+    from streamlit.testing.v1 import AppTest
+
+    def run(page):
+        def go():
+            at = AppTest.from_file(page, default_timeout=600).run()
+            if at.exception:
+                raise RuntimeError(f"{page}: {at.exception[0].value}")
+        return go
+
+    return [(f"AppTest {page}", run(page), 20, None) for page in PAGES]
+
+
+def run_size(n_sets: int, years: float, tmp: Path) -> dict:
+    """Genera la DB de `n_sets` sets y mide todos los casos. Corre dentro del subproceso."""
+    os.environ["GYM_DB_PATH"] = str(tmp / f"bench_{n_sets}.db")
+    import db_sqlite
+    import stats
+    from workload import generate
+
+    workload = generate(Path(os.environ["GYM_DB_PATH"]), n_sets, years=years)
+    db_sqlite.DB_PATH = Path(os.environ["GYM_DB_PATH"])
+
+    cases = {}
+    # páginas primero: ven la DB recién generada, sin las filas que agregan los casos de escritura
+    for name, fn, runs, setup in page_cases() + db_cases(db_sqlite, stats):
+        cases[name] = measure(fn, runs, setup)
+        print(f"  {name:<34} p50={cases[name]['p50_ms']:10.3f} ms  p99={cases[name]['p99_ms']:10.3f} ms",
+              file=sys.stderr, flush=True)
+    db_sqlite.close_connections()
+    return {
+        "workload": workload,
+        "peak_rss_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "cases": cases,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=ROOT).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path: Path, after_path: Path):
+    before = json.loads(before_path.read_text())
+    after = json.loads(after_path.read_text())
+    print(f"{before.get('commit')} -> {after.get('commit')}  (p50, después/antes)")
+    for size, res in after["sizes"].items():
+        old = before["sizes"].get(size)
+        if old is None:
+            continue
+        print(f"\n{size} sets   peak RSS {old['peak_rss_mib']} -> {res['peak_rss_mib']} MiB")
+        for name, case in res["cases"].items():
+            prev = old["cases"].get(name)
+            if prev is None:
+                print(f"  {name:<34} {'nuevo':>10}  {case['p50_ms']:10.3f} ms")
+                continue
+            ratio = case["p50_ms"] / prev["p50_ms"] if prev["p50_ms"] else float("inf")
+            print(f"  {name:<34} {prev['p50_ms']:10.3f} -> {case['p50_ms']:10.3f} ms  x{ratio:5.2f}")
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == "--child":
+        os.chdir(ROOT)  # AppTest y las rutas de assets son relativas a la raíz
+        print(json.dumps(run_size(int(sys.argv[2]), float(sys.argv[3]), Path(sys.argv[4]))))
+        return
+
+    ap = argparse.ArgumentParser(description="Benchmarks end-to-end de Gym App")
+    ap.add_argument("--sets", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                    help="tamaños de set_logs a generar (hasta 5M)")
+    ap.add_argument("--years", type=float, default=5.0)
+    ap.add_argument("--out", type=Path, help="JSON de salida (default: benchmarks/results/<commit>.json)")
+    ap.add_argument("--compare", type=Path, nargs=2, metavar=("ANTES", "DESPUES"))
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    commit = git_commit()
+    result = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sets:
+            print(f"{n} sets", file=sys.stderr, flush=True)
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", str(n), str(args.years), tmp],
+                stdout=subprocess.PIPE, text=True, check=True, cwd=ROOT,
+                # sin warm-up: su thread (snapshots, mantención) correría durante las mediciones
+                env={**os.environ, "GYM_WARMUP": "0"},
+            ).stdout
+            result["sizes"][str(n)] = json.loads(out.strip().splitlines()[-1])
+
+    out_path = args.out or RESULTS_DIR / f"{commit or 'sin-commit'}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"resultados en {out_path}")
+
+
+if __name__ == "__main__":
+    main()
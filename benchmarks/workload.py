@@ -0,0 +1,133 @@
+"""
+Generador de bases sintéticas con años de historial.
+
+Varias rutinas con 5-8 ejercicios cada una, sesiones repartidas parejo en
+`years` años (las que hagan falta para llegar a `sets`), 3-5 sets por ejercicio,
+pesos con progresión lenta + ruido y horarios en hora local razonables.
+
+    python benchmarks/workload.py out.db --sets 1000000 [--years 5] [--routines 6]
+"""
+import argparse
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import db_sqlite
+
+ROUTINE_NAMES = ["Push", "Pull", "Piernas", "Torso", "Full body", "Core", "Brazos", "Hombros"]
+EXERCISE_NAMES = [
+    "Press banca", "Press inclinado", "Fondos", "Aperturas", "Remo", "Dominadas", "Jalón",
+    "Curl bíceps", "Sentadilla", "Peso muerto", "Prensa", "Zancadas", "Press militar",
+    "Elevaciones laterales", "Extensión tríceps", "Hip thrust", "Gemelos", "Plancha",
+]
+
+def generate(path: Path, n_sets: int, years: float = 5.0, n_routines: int = 6, seed: int = 0) -> dict:
+    """Crea (o completa) la DB en `path` con ~`n_sets` sets y deja el resumen al día."""
+    rnd = random.Random(seed)
+    db_sqlite.DB_PATH = Path(path)
+    db_sqlite.init_db()
+    db_sqlite.close_connections()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    now = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    first_day = now - timedelta(days=365 * years)
+
+    routines = []  # (routine_id, [(exercise_id, base_weight, sets), ...])
+    for r in range(n_routines):
+        name = ROUTINE_NAMES[r % len(ROUTINE_NAMES)] + (f" {r // len(ROUTINE_NAMES) + 1}" if r >= len(ROUTINE_NAMES) else "")
+        rid = conn.execute("INSERT INTO routines (name, created_at) VALUES (?, ?)", (name, first_day.isoformat(timespec="seconds"))).lastrowid
+        exercises = []
+        # nombres distintos dentro de la rutina: import y merge identifican el ejercicio por nombre
+        for i, ex_name in enumerate(rnd.sample(EXERCISE_NAMES, rnd.randint(5, 8))):
+            n = rnd.randint(3, 5)
+            eid = conn.execute(
+                "INSERT INTO exercises (routine_id, name, order_index, default_sets, default_rest_seconds) VALUES (?, ?, ?, ?, ?)",
+                (rid, ex_name, i + 1, n, rnd.choice([60, 90, 120, 180])),
+            ).lastrowid
+            exercises.append((eid, rnd.choice([10, 20, 30, 40, 60, 80, 100]), n))
+        routines.append((rid, exercises))
+
+    sets_per_session = sum(n for _, exs in routines for _, _, n in exs) / n_routines
+    n_sessions = max(1, round(n_sets / sets_per_session))
+    span = (now - first_day).total_seconds()
+    tz = db_sqlite.TIMEZONE
+
+    def session_rows():
+        written = 0
+        for s in range(n_sessions):
+            if written >= n_sets:
+                return
+            rid, exercises = routines[s % n_routines]
+            # día repartido en el rango, entre 7:00 y 21:00 hora local
+            day = first_day + timedelta(seconds=span * s / n_sessions)
+            local = day.replace(tzinfo=timezone.utc).astimezone(tz).replace(hour=rnd.randint(7, 21), minute=rnd.randint(0, 59))
+            started = local.astimezone(timezone.utc).replace(tzinfo=None)
+            progress = s / n_sessions
+            sets = []
+            t = started
+            for eid, base, n in exercises:
+                weight = round(base * (1 + 0.5 * progress) * rnd.uniform(0.9, 1.1) / 2.5) * 2.5
+                for k in range(n):
+                    t += timedelta(seconds=rnd.randint(60, 240))
+                    sets.append((eid, k + 1, rnd.randint(5, 12), weight, t.isoformat(timespec="seconds")))
+            sets = sets[:n_sets - written]
+            written += len(sets)
+            yield rid, started.isoformat(timespec="seconds"), t.isoformat(timespec="seconds"), sets
+
+    t0 = time.perf_counter()
+    n_written = 0
+    batch = []
+    first_sid = next_sid = conn.execute("SELECT COALESCE(MAX(id), 0) FROM workout_sessions").fetchone()[0] + 1
+
+    def write(batch):
+        conn.executemany("INSERT INTO workout_sessions (id, routine_id, started_at, finished_at) VALUES (?, ?, ?, ?)",
+                         [(sid, rid, st, fin) for sid, rid, st, fin, _ in batch])
+        conn.executemany(
+            "INSERT INTO set_logs (session_id, exercise_id, set_index, reps, weight, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            ((sid,) + row for sid, _, _, _, rows in batch for row in rows),
+        )
+        conn.commit()
+
+    for rid, started, finished, sets in session_rows():
+        batch.append((next_sid, rid, started, finished, sets))
+        next_sid += 1
+        n_written += len(sets)
+        if len(batch) >= 5000:
+            write(batch)
+            batch = []
+    if batch:
+        write(batch)
+    conn.close()
+
+    db_sqlite.backfill_time_columns()
+    db_sqlite.rebuild_session_summary()
+    db_sqlite.rebuild_personal_records()
+    db_sqlite.close_connections()
+    return {
+        "sets": n_written,
+        "sessions": next_sid - first_sid,
+        "routines": n_routines,
+        "exercises": sum(len(exs) for _, exs in routines),
+        "seconds": round(time.perf_counter() - t0, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Genera una DB sintética para benchmarks")
+    ap.add_argument("path", type=Path)
+    ap.add_argument("--sets", type=int, default=100_000)
+    ap.add_argument("--years", type=float, default=5.0)
+    ap.add_argument("--routines", type=int, default=6)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    print(generate(args.path, args.sets, args.years, args.routines, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Gráficos de progreso de la página de Estadísticas.
+
+Con el rango "Todo" un ejercicio puede tener miles de sets; dibujarlos todos
+como marcadores SVG significa serializar y mandar al navegador la serie
+completa en cada rerun. Acá:
+
+- line() submuestrea en el servidor con LTTB (Largest-Triangle-Three-Buckets)
+  hasta POINT_BUDGET puntos: conserva picos y valles, así la forma de la curva
+  no cambia, y el payload queda acotado sin importar el largo del historial.
+- Sobre WEBGL_AFTER puntos la traza pasa a WebGL (scattergl) en vez de SVG.
+- cached() memoriza la figura por clave (gráfico, ejercicio, rango) y versión
+  de la DB, igual que stats.compute(). La figura se guarda ya pasada a JSON y
+  reconstruida desde ahí (listas planas en vez de arrays y fechas de pandas),
+  que es lo que st.plotly_chart vuelve a serializar barato en cada redibujo.
+"""
+import os
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+
+from db_sqlite import data_version
+
+POINT_BUDGET = int(os.getenv("GYM_CHART_POINTS", "1000"))
+WEBGL_AFTER = 300
+
+# --- Submuestreo ---
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Índices de los `n_out` puntos que elige LTTB sobre la serie (x, y), con x
+    creciente. Siempre incluye el primero y el último. Si la serie ya cabe,
+    devuelve todos.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_out - 2 baldes entre el primer y el último punto
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # promedio del balde siguiente (el último punto, para el último balde)
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else (n - 1, n)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        # el punto del balde que forma el triángulo más grande con el elegido antes y ese promedio
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+def downsample(df: pd.DataFrame, x: str, y: str, budget: int = POINT_BUDGET) -> pd.DataFrame:
+    """Filas de `df` (ordenado por `x`) que elige LTTB sobre (x, y); todas si caben en `budget`."""
+    if len(df) <= budget:
+        return df
+    xs = df[x].to_numpy()
+    if np.issubdtype(xs.dtype, np.datetime64):
+        xs = xs.astype("datetime64[s]").astype(np.int64)
+        xs = xs - xs[0]  # segundos desde el primer punto: sin perder precisión en float64
+    return df.iloc[lttb(xs, df[y].to_numpy(), budget)]
+
+# --- Figuras ---
+@dataclass(frozen=True)
+class Chart:
+    figure: go.Figure
+    points: int   # puntos dibujados
+    total: int    # puntos de la serie completa
+
+    @property
+    def downsampled(self) -> bool:
+        return self.points < self.total
+
+def line(df: pd.DataFrame, x: str, y: str, hover_data: list[str], budget: int = POINT_BUDGET) -> Chart:
+    """px.line con marcadores, submuestreado a `budget` puntos y en WebGL si son muchos."""
+    shown = downsample(df, x, y, budget)
+    render_mode = "webgl" if len(shown) > WEBGL_AFTER else "svg"
+    fig = px.line(shown, x=x, y=y, markers=True, hover_data=hover_data, render_mode=render_mode)
+    # ida y vuelta por JSON: la figura queda con listas planas, barata de re-serializar
+    return Chart(pio.from_json(fig.to_json(), skip_invalid=True), len(shown), len(df))
+
+# --- Cache ---
+_memo: dict[tuple, Chart] = {}
+_memo_version = None
+_memo_lock = threading.Lock()
+
+def cached(key: tuple, build) -> Chart:
+    """
+    Chart de `key` (ej. ("sets", exercise_id, days)) hecho por `build()` la primera
+    vez; después, el mismo objeto hasta el próximo commit. No modificar la figura.
+    """
+    global _memo_version
+    version = data_version()
+    with _memo_lock:
+        if version != _memo_version:
+            _memo.clear()
+            _memo_version = version
+        hit = _memo.get(key)
+    if hit is not None:
+        return hit
+
+    result = build()
+    with _memo_lock:
+        if _memo_version == version:
+            _memo[key] = result
+    return result
+
+def clear_memo():
+    global _memo_version
+    with _memo_lock:
+        _memo.clear()
+        _memo_version = None
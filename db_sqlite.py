@@ -1,22 +1,246 @@
+import atexit
+import json
+import os
 import sqlite3
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
 from pathlib import Path
-from uuid import uuid4
-import shutil
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 
-DB_PATH = Path("gym.db")
-EXERCISE_IMG_DIR = Path("assets/exercises")
-EXERCISE_IMG_DIR.mkdir(parents=True, exist_ok=True)
+import metrics
+
+DB_PATH = Path(os.getenv("GYM_DB_PATH", "gym.db"))
+EXERCISE_IMG_DIR = Path("assets/exercises")  # la crea init_db()
+
+# created_at se guarda en UTC; los días/semanas de las stats se calculan en hora local
+TIMEZONE = ZoneInfo(os.getenv("GYM_TZ", "America/Santiago"))
+
+# --- Columnas de tiempo ---
+# Junto al texto ISO (clave natural, exports y backups) cada fila guarda el instante
+# como epoch ms (INTEGER) y, calculados al escribir con TIMEZONE, el día local (días
+# desde 1970-01-01) y la semana ISO (año * 100 + semana). Filtros de rango, ORDER BY
+# y agrupaciones por semana van sobre enteros indexados, sin parsear texto por fila.
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_MS_PER_DAY = 86_400_000
+_TZ_BUCKET_MS = 900_000  # los cambios de horario caen siempre en un borde de 15 min
+
+def epoch_ms(ts: str | None) -> int | None:
+    """Texto ISO (UTC si no trae zona) -> epoch ms."""
+    if ts is None:
+        return None
+    dt = datetime.fromisoformat(ts)
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH) // timedelta(milliseconds=1)
+
+@lru_cache(maxsize=4096)
+def _utc_offset_ms(bucket: int) -> int:
+    instant = datetime.fromtimestamp(bucket * _TZ_BUCKET_MS / 1000, TIMEZONE)
+    return int(instant.utcoffset().total_seconds() * 1000)
+
+def local_day_number(ms: int) -> int:
+    """Día local en TIMEZONE del instante `ms`, como días desde 1970-01-01."""
+    return (ms + _utc_offset_ms(ms // _TZ_BUCKET_MS)) // _MS_PER_DAY
+
+def iso_week_key(day: int) -> int:
+    """Semana ISO del día local `day` como año * 100 + semana (ej. 202501)."""
+    year, week, _ = date.fromordinal(_EPOCH_ORDINAL + day).isocalendar()
+    return year * 100 + week
+
+def day_date(day: int) -> date:
+    """Día local guardado (días desde 1970-01-01) -> date."""
+    return date.fromordinal(_EPOCH_ORDINAL + day)
+
+def _ts_local_day(ts):
+    return None if ts is None else local_day_number(epoch_ms(ts))
+
+def _ts_iso_week(ts):
+    return None if ts is None else iso_week_key(local_day_number(epoch_ms(ts)))
+
+def register_functions(conn):
+    """Funciones SQL para calcular las columnas de tiempo desde el texto ISO."""
+    conn.create_function("ts_ms", 1, epoch_ms, deterministic=True)
+    conn.create_function("ts_local_day", 1, _ts_local_day, deterministic=True)
+    conn.create_function("ts_iso_week", 1, _ts_iso_week, deterministic=True)
+
+# --- Connection pool ---
+# Streamlit re-ejecuta el script completo en cada click, y cada rerun corre en
+# un thread nuevo. En vez de abrir/cerrar una conexión por helper, guardamos
+# conexiones ya configuradas a nivel de proceso y las reutilizamos.
+POOL_SIZE = 4
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 128
+
+_pool: dict[str, list[sqlite3.Connection]] = {}
+_pool_lock = threading.Lock()
+
+# quiesce(): espera a que nadie tenga una conexión prestada y bloquea préstamos nuevos
+_gate = threading.Condition()
+_active = 0
+_quiesced = False
 
 def connect():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    """
+    Abre una conexión nueva y la configura (WAL, synchronous=NORMAL, busy_timeout).
+    Los helpers usan el pool (`pooled()` / `transaction()`), no esta función directo.
+    """
+    started = time.perf_counter()
+    conn = sqlite3.connect(
+        DB_PATH,
+        check_same_thread=False,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=metrics.connection_factory(),
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    # sin esto SQLite ignora los ON DELETE CASCADE del esquema
+    conn.execute("PRAGMA foreign_keys=ON")
+    register_functions(conn)
+    _attach_archive(conn)
+    if metrics.ENABLED:
+        metrics.instrument(conn, started)
     return conn
 
-def init_db():
-    conn = connect()
-    cur = conn.cursor()
+def archive_path() -> Path:
+    """Archivo con los sets archivados (ver archive.py): gym.db -> gym-archive.db."""
+    return DB_PATH.with_name(f"{DB_PATH.stem}-archive{DB_PATH.suffix}")
+
+def _attach_archive(conn):
+    # el archivo puede aparecer después de abrir la conexión (archive.py en otro proceso)
+    if archive_path().exists() and not has_archive(conn):
+        conn.execute("ATTACH DATABASE ? AS archive", (str(archive_path()),))
+
+@contextmanager
+def pooled():
+    """Presta una conexión del pool y la devuelve al salir."""
+    global _active
+    key = str(DB_PATH)
+    with _gate:
+        while _quiesced:
+            _gate.wait()
+        _active += 1
+    try:
+        with _pool_lock:
+            free = _pool.setdefault(key, [])
+            conn = free.pop() if free else None
+        if conn is None:
+            conn = connect()
+        else:
+            _attach_archive(conn)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            with _pool_lock:
+                free = _pool.setdefault(key, [])
+                if len(free) < POOL_SIZE:
+                    free.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+    finally:
+        with _gate:
+            _active -= 1
+            _gate.notify_all()
+
+@contextmanager
+def transaction():
+    """Conexión del pool dentro de una transacción: commit al salir, rollback si falla."""
+    with pooled() as conn:
+        # IMMEDIATE: toma el lock de escritura al inicio. Con BEGIN diferido, una
+        # transacción que lee y después escribe puede fallar con "database is locked"
+        # sin esperar el busy_timeout si otra conexión escribió entremedio.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+def close_connections():
+    """Cierra todas las conexiones del pool (ej. antes de reemplazar el archivo de la DB)."""
+    global _version_conn
+    with _pool_lock:
+        conns = [c for free in _pool.values() for c in free]
+        _pool.clear()
+    with _version_lock:
+        if _version_conn is not None:
+            conns.append(_version_conn[1])
+            _version_conn = None
+    for conn in conns:
+        conn.close()
+
+@contextmanager
+def quiesce(timeout: float = 30.0):
+    """
+    Deja la DB sin conexiones abiertas mientras dura el bloque (ej. para reemplazar
+    el archivo). Los helpers que se llamen en otros threads esperan a que termine.
+    """
+    global _quiesced
+    with _gate:
+        if not _gate.wait_for(lambda: _active == 0 and not _quiesced, timeout=timeout):
+            raise TimeoutError("La base de datos sigue en uso; intenta de nuevo.")
+        _quiesced = True
+    try:
+        close_connections()
+        yield
+    finally:
+        # lo que se haga durante el quiesce (ej. cambiar el archivo) deja el cache viejo
+        invalidate_cache()
+        with _gate:
+            _quiesced = False
+            _gate.notify_all()
+
+def checkpoint():
+    """
+    Vuelca el WAL al archivo principal. Necesario antes de copiar gym.db a mano,
+    si no los últimos sets pueden quedar solo en gym.db-wal.
+    """
+    with pooled() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+# PRAGMA data_version cambia cada vez que *otra* conexión hace commit, así que se
+# lee siempre desde una conexión propia que nunca escribe. Al reabrirla (otro
+# DB_PATH, restore) el contador parte de nuevo: _version_epoch lo distingue.
+_version_conn: tuple[str, sqlite3.Connection] | None = None
+_version_lock = threading.Lock()
+_version_epoch = 0
 
+def data_version() -> tuple:
+    """Identifica el contenido actual de la DB: cambia con cada commit, de este u otro proceso."""
+    global _version_conn, _version_epoch, _active
+    key = str(DB_PATH)
+    # cuenta como conexión en uso: quiesce() espera a que termine y la cierra
+    with _gate:
+        while _quiesced:
+            _gate.wait()
+        _active += 1
+    try:
+        with _version_lock:
+            if _version_conn is None or _version_conn[0] != key:
+                if _version_conn is not None:
+                    _version_conn[1].close()
+                _version_conn = (key, connect())
+                _version_epoch += 1
+            version = _version_conn[1].execute("PRAGMA data_version").fetchone()[0]
+            return (key, _version_epoch, version)
+    finally:
+        with _gate:
+            _active -= 1
+            _gate.notify_all()
+
+def _migrate_v1(cur):
+    # Esquema base (las DB creadas antes de las migraciones ya lo tienen: todo es IF NOT EXISTS)
     cur.execute("""
     CREATE TABLE IF NOT EXISTS routines (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -37,7 +261,7 @@ def init_db():
     )
     """)
 
-     # --- Migration: add image_path column if missing ---
+    # --- Migration: add image_path column if missing ---
     cols = [row["name"] for row in cur.execute("PRAGMA table_info(exercises)").fetchall()]
     if "image_path" not in cols:
         cur.execute("ALTER TABLE exercises ADD COLUMN image_path TEXT")
@@ -66,145 +290,1104 @@ def init_db():
     )
     """)
 
-    conn.commit()
-    conn.close()
+def _migrate_v2(cur):
+    # Índices para los lookups de set_logs y los ORDER BY de stats/listados
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_set_logs_exercise_created ON set_logs(exercise_id, created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_set_logs_session ON set_logs(session_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_set_logs_created ON set_logs(created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_exercises_routine_order ON exercises(routine_id, order_index)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_routine_started ON workout_sessions(routine_id, started_at)")
+
+def _migrate_v3(cur):
+    # Resumen por (sesión, ejercicio) que log_set() mantiene al día; las stats leen esto
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS session_exercise_summary (
+        session_id INTEGER NOT NULL,
+        exercise_id INTEGER NOT NULL,
+        started_at TEXT NOT NULL,
+        top_weight REAL NOT NULL,
+        session_volume REAL NOT NULL,
+        top_e1rm REAL NOT NULL,
+        n_sets INTEGER NOT NULL,
+        PRIMARY KEY (session_id, exercise_id),
+        FOREIGN KEY (session_id) REFERENCES workout_sessions(id) ON DELETE CASCADE,
+        FOREIGN KEY (exercise_id) REFERENCES exercises(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_summary_exercise_started ON session_exercise_summary(exercise_id, started_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_summary_started ON session_exercise_summary(started_at)")
+    cur.execute("DELETE FROM session_exercise_summary")
+    cur.execute("""
+        INSERT INTO session_exercise_summary
+            (session_id, exercise_id, started_at, top_weight, session_volume, top_e1rm, n_sets)
+        SELECT
+            session_id, exercise_id, MIN(created_at), MAX(weight), SUM(reps * weight),
+            MAX(weight * (1 + reps / 30.0)), COUNT(*)
+        FROM set_logs
+        GROUP BY session_id, exercise_id
+    """)
+
+def _migrate_v4(cur):
+    # Registro de backups: hasta qué set/sesión llegó cada uno (para exports incrementales)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS backups (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        last_set_id INTEGER NOT NULL,
+        last_session_id INTEGER NOT NULL
+    )
+    """)
+
+def _migrate_v5(cur):
+    # El chequeo de duplicados de _insert_sets busca por (sesión, ejercicio, set);
+    # este índice reemplaza al de session_id solo y sigue sirviendo para esos lookups.
+    cur.execute("DROP INDEX IF EXISTS idx_set_logs_session")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_set_logs_session_set ON set_logs(session_id, exercise_id, set_index)")
+
+def _migrate_v6(cur):
+    # Columnas de tiempo enteras (ver "Columnas de tiempo"): epoch ms, día local y
+    # semana ISO. El texto ISO se queda (clave natural de los sets, exports, backups).
+    register_functions(cur.connection)
+    for table, columns in (
+        ("set_logs", ("created_ms", "local_day", "iso_week")),
+        ("workout_sessions", ("started_ms", "finished_ms", "local_day")),
+        ("session_exercise_summary", ("started_ms", "local_day", "iso_week")),
+    ):
+        for column in columns:
+            cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER")
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """)
+    _fill_time_columns(cur)
+
+    # los rangos y ORDER BY pasan a los enteros
+    cur.execute("DROP INDEX IF EXISTS idx_set_logs_exercise_created")
+    cur.execute("DROP INDEX IF EXISTS idx_set_logs_created")
+    cur.execute("DROP INDEX IF EXISTS idx_summary_exercise_started")
+    cur.execute("DROP INDEX IF EXISTS idx_summary_started")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_set_logs_exercise_ms ON set_logs(exercise_id, created_ms)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_set_logs_ms ON set_logs(created_ms)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_summary_exercise_ms ON session_exercise_summary(exercise_id, started_ms)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_summary_ms ON session_exercise_summary(started_ms)")
+
+def _migrate_v7(cur):
+    # Índice de récords personales (ver "Récords personales"): una fila por sesión que
+    # batió el récord de ese momento en peso para unas reps, e1RM o volumen.
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS personal_records (
+        exercise_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        reps INTEGER NOT NULL,
+        session_id INTEGER NOT NULL,
+        value REAL NOT NULL,
+        achieved_at TEXT NOT NULL,
+        achieved_ms INTEGER NOT NULL,
+        PRIMARY KEY (exercise_id, kind, reps, session_id),
+        FOREIGN KEY (session_id) REFERENCES workout_sessions(id) ON DELETE CASCADE,
+        FOREIGN KEY (exercise_id) REFERENCES exercises(id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_records_best ON personal_records(exercise_id, kind, reps, value)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_records_achieved ON personal_records(exercise_id, achieved_ms)")
+    _rebuild_personal_records(cur, _set_logs_source() if has_archive(cur.connection) else "set_logs")
+
+def _migrate_v8(cur):
+    # Con foreign_keys=ON, borrar una sesión busca sus récords por session_id
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_records_session ON personal_records(session_id)")
+
+def _migrate_v9(cur):
+    # Imágenes que un ejercicio dejó de usar (cambio de imagen o ejercicio borrado, también
+    # por CASCADE). Es lo único que images.collect_unused_images() borra por su cuenta: la
+    # carpeta de assets puede ser compartida con otras DB (copias, benchmarks).
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS released_images (
+        image_path TEXT PRIMARY KEY,
+        released_at TEXT NOT NULL
+    ) WITHOUT ROWID
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS exercises_release_image_update
+    AFTER UPDATE OF image_path ON exercises
+    WHEN old.image_path IS NOT NULL AND old.image_path IS NOT new.image_path
+    BEGIN
+        INSERT OR REPLACE INTO released_images VALUES (old.image_path, strftime('%Y-%m-%dT%H:%M:%S', 'now'));
+    END
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS exercises_release_image_delete
+    AFTER DELETE ON exercises
+    WHEN old.image_path IS NOT NULL
+    BEGIN
+        INSERT OR REPLACE INTO released_images VALUES (old.image_path, strftime('%Y-%m-%dT%H:%M:%S', 'now'));
+    END
+    """)
+
+# --- Migrations ---
+# Cada entrada sube PRAGMA user_version en 1. Para cambiar el esquema se agrega
+# una función nueva al final; nunca se editan las que ya corrieron.
+MIGRATIONS = [
+    _migrate_v1,
+    _migrate_v2,
+    _migrate_v3,
+    _migrate_v4,
+    _migrate_v5,
+    _migrate_v6,
+    _migrate_v7,
+    _migrate_v8,
+    _migrate_v9,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(conn):
+    """Corre las migraciones que falten sobre `conn` (sin commit). Sirve para cualquier archivo, no solo DB_PATH."""
+    version = schema_version(conn)
+    cur = conn.cursor()
+    for i, migrate in enumerate(MIGRATIONS[version:], start=version + 1):
+        migrate(cur)
+        cur.execute(f"PRAGMA user_version = {i}")
+
+def init_db():
+    """
+    Deja lista la DB: carpeta de imágenes, migraciones pendientes y sets que quedaron
+    en el journal. Corre una vez por proceso y por archivo; las páginas la llaman en
+    cada rerun y después de la primera vez no cuesta nada.
+    """
+    key = str(DB_PATH)
+    if key in _initialized:
+        return
+    with _init_lock:
+        if key in _initialized:
+            return
+        EXERCISE_IMG_DIR.mkdir(parents=True, exist_ok=True)
+        _migrate()
+        _sync_time_columns()
+        recover_set_journal()
+        _initialized.add(key)
+
+_initialized: set[str] = set()
+_init_lock = threading.Lock()
+
+def _migrate():
+    with pooled() as conn:
+        if schema_version(conn) >= SCHEMA_VERSION:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # re-chequear con el lock tomado (otro proceso pudo migrar antes)
+            apply_migrations(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def _fill_time_columns(cur, recompute: bool = False):
+    """
+    Calcula las columnas de tiempo que falten (filas insertadas con SQL directo, un
+    merge, la migración) o, con `recompute`, todas: el día local y la semana dependen
+    de TIMEZONE y se guardan con la zona que se usó.
+    """
+    conn = cur.connection
+    set_tables = ["main.set_logs"]
+    if has_archive(conn):
+        # archivos creados antes de estas columnas
+        cols = {row[1] for row in conn.execute("PRAGMA archive.table_info(set_logs)")}
+        if "created_ms" not in cols:
+            for column in ("created_ms", "local_day", "iso_week"):
+                cur.execute(f"ALTER TABLE archive.set_logs ADD COLUMN {column} INTEGER")
+        set_tables.append("archive.set_logs")
+
+    for table in set_tables:
+        cur.execute(f"""
+            UPDATE {table}
+            SET created_ms = ts_ms(created_at), local_day = ts_local_day(created_at), iso_week = ts_iso_week(created_at)
+            {"" if recompute else "WHERE created_ms IS NULL"}
+        """)
+    cur.execute(f"""
+        UPDATE workout_sessions
+        SET started_ms = ts_ms(started_at), finished_ms = ts_ms(finished_at), local_day = ts_local_day(started_at)
+        {"" if recompute else "WHERE started_ms IS NULL OR (finished_ms IS NULL AND finished_at IS NOT NULL)"}
+    """)
+    cur.execute(f"""
+        UPDATE session_exercise_summary
+        SET started_ms = ts_ms(started_at), local_day = ts_local_day(started_at), iso_week = ts_iso_week(started_at)
+        {"" if recompute else "WHERE started_ms IS NULL"}
+    """)
+    cur.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('timezone', ?)", (TIMEZONE.key,))
+
+def backfill_time_columns():
+    """Completa las columnas de tiempo de filas insertadas sin ellas (ej. cargas con SQL directo)."""
+    with transaction() as conn:
+        _fill_time_columns(conn.cursor())
+
+def _sync_time_columns():
+    # si GYM_TZ cambió desde la última escritura, los días locales guardados ya no sirven
+    with pooled() as conn:
+        row = conn.execute("SELECT value FROM settings WHERE key = 'timezone'").fetchone()
+        stale = row is None or row[0] != TIMEZONE.key
+        old_archive = has_archive(conn) and not any(
+            r[1] == "created_ms" for r in conn.execute("PRAGMA archive.table_info(set_logs)")
+        )
+    if stale or old_archive:
+        with transaction() as conn:
+            _fill_time_columns(conn.cursor(), recompute=stale)
+        invalidate_cache()
 
 def now_iso():
     return datetime.utcnow().isoformat(timespec="seconds")
 
+# --- Cache de rutinas / ejercicios ---
+# list_routines() y list_exercises() se llaman en cada rerun pero solo cambian al
+# editar una rutina. Se sirven desde memoria; cada función que modifica rutinas o
+# ejercicios sube _generation y eso invalida todo lo cacheado antes.
+class _Record:
+    """Acceso tipo sqlite3.Row (r["name"], r.keys()) sobre un namedtuple inmutable."""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def keys(self):
+        return self._fields
+
+class Routine(_Record, namedtuple("Routine", "id name created_at")):
+    __slots__ = ()
+
+class Exercise(_Record, namedtuple(
+    "Exercise", "id routine_id name order_index default_sets default_rest_seconds image_path"
+)):
+    __slots__ = ()
+
+_cache: dict[tuple, tuple[int, tuple]] = {}
+_cache_lock = threading.Lock()
+_generation = 0
+_cache_hits = 0
+_cache_misses = 0
+
+def _cached(key: tuple, load):
+    global _cache_hits, _cache_misses
+    key = (str(DB_PATH),) + key
+    with _cache_lock:
+        gen = _generation
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == gen:
+            _cache_hits += 1
+            return entry[1]
+        _cache_misses += 1
+    value = load()
+    with _cache_lock:
+        # si hubo una escritura mientras leíamos, no guardar un valor que ya es viejo
+        if _generation == gen:
+            _cache[key] = (gen, value)
+    return value
+
+def invalidate_cache():
+    """Sube la generación: la próxima lectura va a la DB. Se llama después del commit."""
+    global _generation
+    with _cache_lock:
+        _generation += 1
+        _cache.clear()
+    # restore / merge / archivado pueden cambiar qué hay en el archivo
+    _archived_until.clear()
+
+def cache_stats() -> dict:
+    with _cache_lock:
+        return {"hits": _cache_hits, "misses": _cache_misses, "entries": len(_cache), "generation": _generation}
+
+metrics.register_collector(lambda: {f"cache_{k}": v for k, v in cache_stats().items()})
+
 # --- Routines ---
 def list_routines():
-    conn = connect()
-    rows = conn.execute("SELECT id, name, created_at FROM routines ORDER BY id DESC").fetchall()
-    conn.close()
-    return rows
+    def load():
+        with pooled() as conn:
+            rows = conn.execute("SELECT id, name, created_at FROM routines ORDER BY id DESC").fetchall()
+        return tuple(Routine(*r) for r in rows)
+    return _cached(("routines",), load)
 
 def create_routine(name: str):
-    conn = connect()
-    conn.execute("INSERT INTO routines (name, created_at) VALUES (?, ?)", (name, now_iso()))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("INSERT INTO routines (name, created_at) VALUES (?, ?)", (name, now_iso()))
+    invalidate_cache()
 
 def rename_routine(routine_id: int, name: str):
-    conn = connect()
-    conn.execute("UPDATE routines SET name=? WHERE id=?", (name, routine_id))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("UPDATE routines SET name=? WHERE id=?", (name, routine_id))
+    invalidate_cache()
 
 def delete_routine(routine_id: int):
-    conn = connect()
-    conn.execute("DELETE FROM routines WHERE id=?", (routine_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM routines WHERE id=?", (routine_id,))
+        _delete_archived_orphans(conn)
+    invalidate_cache()
 
 # --- Exercises ---
 def list_exercises(routine_id: int):
-    conn = connect()
-    rows = conn.execute("""
-        SELECT id, routine_id, name, order_index, default_sets, default_rest_seconds, image_path
-        FROM exercises
-        WHERE routine_id=?
-        ORDER BY order_index ASC, id ASC
-    """, (routine_id,)).fetchall()
-    conn.close()
-    return rows
+    def load():
+        with pooled() as conn:
+            rows = conn.execute("""
+                SELECT id, routine_id, name, order_index, default_sets, default_rest_seconds, image_path
+                FROM exercises
+                WHERE routine_id=?
+                ORDER BY order_index ASC, id ASC
+            """, (routine_id,)).fetchall()
+        return tuple(Exercise(*r) for r in rows)
+    return _cached(("exercises", routine_id), load)
 
 def add_exercise(routine_id: int, name: str, order_index: int, default_sets: int, default_rest_seconds: int, image_path: str | None):
-    conn = connect()
-    conn.execute("""
-        INSERT INTO exercises (routine_id, name, order_index, default_sets, default_rest_seconds, image_path)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (routine_id, name, order_index, default_sets, default_rest_seconds, image_path))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("""
+            INSERT INTO exercises (routine_id, name, order_index, default_sets, default_rest_seconds, image_path)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (routine_id, name, order_index, default_sets, default_rest_seconds, image_path))
+    invalidate_cache()
 
 
 def update_exercise(exercise_id: int, name: str, order_index: int, default_sets: int, default_rest_seconds: int, image_path: str | None):
-    conn = connect()
+    with transaction() as conn:
+        if image_path is None:
+            # no cambies imagen si no se subió una nueva
+            conn.execute("""
+                UPDATE exercises
+                SET name=?, order_index=?, default_sets=?, default_rest_seconds=?
+                WHERE id=?
+            """, (name, order_index, default_sets, default_rest_seconds, exercise_id))
+        else:
+            conn.execute("""
+                UPDATE exercises
+                SET name=?, order_index=?, default_sets=?, default_rest_seconds=?, image_path=?
+                WHERE id=?
+            """, (name, order_index, default_sets, default_rest_seconds, image_path, exercise_id))
+    invalidate_cache()
 
-    if image_path is None:
-        # no cambies imagen si no se subió una nueva
-        conn.execute("""
-            UPDATE exercises
-            SET name=?, order_index=?, default_sets=?, default_rest_seconds=?
-            WHERE id=?
-        """, (name, order_index, default_sets, default_rest_seconds, exercise_id))
-    else:
-        conn.execute("""
-            UPDATE exercises
-            SET name=?, order_index=?, default_sets=?, default_rest_seconds=?, image_path=?
-            WHERE id=?
-        """, (name, order_index, default_sets, default_rest_seconds, image_path, exercise_id))
 
-    conn.commit()
-    conn.close()
+EXERCISE_FIELDS = ("name", "order_index", "default_sets", "default_rest_seconds", "image_path")
+
+def update_exercises_bulk(routine_id: int, changes: dict[int, dict], delete_ids=()) -> int:
+    """
+    Aplica en una sola transacción los cambios de varios ejercicios de `routine_id`:
+    `changes` = {exercise_id: {campo: valor}}, solo con los campos que cambiaron
+    (ver EXERCISE_FIELDS), y borra los de `delete_ids`. Ejercicios de otra rutina se
+    ignoran. Devuelve cuántos ejercicios se tocaron.
+    """
+    unknown = {f for fields in changes.values() for f in fields} - set(EXERCISE_FIELDS)
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {sorted(unknown)}")
+
+    # un UPDATE por combinación de campos, con executemany para todos los que la comparten
+    by_columns: dict[tuple, list] = {}
+    for exercise_id, fields in changes.items():
+        if fields and exercise_id not in delete_ids:
+            cols = tuple(sorted(fields))
+            by_columns.setdefault(cols, []).append((*(fields[c] for c in cols), exercise_id, routine_id))
+    if not by_columns and not delete_ids:
+        return 0
 
+    touched = 0
+    with transaction() as conn:
+        for cols, rows in by_columns.items():
+            assignments = ", ".join(f"{c}=?" for c in cols)
+            touched += conn.executemany(
+                f"UPDATE exercises SET {assignments} WHERE id=? AND routine_id=?", rows
+            ).rowcount
+        if delete_ids:
+            touched += conn.executemany(
+                "DELETE FROM exercises WHERE id=? AND routine_id=?",
+                [(exercise_id, routine_id) for exercise_id in delete_ids],
+            ).rowcount
+            _delete_archived_orphans(conn)
+    invalidate_cache()
+    return touched
 
 def delete_exercise(exercise_id: int):
-    conn = connect()
-    conn.execute("DELETE FROM exercises WHERE id=?", (exercise_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM exercises WHERE id=?", (exercise_id,))
+        _delete_archived_orphans(conn)
+    invalidate_cache()
 
 # --- Sessions / Logs ---
 def start_session(routine_id: int) -> int:
-    conn = connect()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO workout_sessions (routine_id, started_at) VALUES (?, ?)", (routine_id, now_iso()))
-    session_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return int(session_id)
+    with transaction() as conn:
+        now = now_iso()
+        ms = epoch_ms(now)
+        cur = conn.execute(
+            "INSERT INTO workout_sessions (routine_id, started_at, started_ms, local_day) VALUES (?, ?, ?, ?)",
+            (routine_id, now, ms, local_day_number(ms)),
+        )
+        return int(cur.lastrowid)
 
 def finish_session(session_id: int):
-    conn = connect()
-    conn.execute("UPDATE workout_sessions SET finished_at=? WHERE id=?", (now_iso(), session_id))
-    conn.commit()
-    conn.close()
+    # lo que siga en cola pertenece a esta sesión: a la DB antes de cerrarla
+    flush_sets()
+    with transaction() as conn:
+        now = now_iso()
+        conn.execute("UPDATE workout_sessions SET finished_at=?, finished_ms=? WHERE id=?", (now, epoch_ms(now), session_id))
+
+class LastPerformance(_Record, namedtuple("LastPerformance", "exercise_id session_id local_day sets")):
+    """Última sesión de un ejercicio: sets = ((set_index, reps, weight), ...) en orden."""
+    __slots__ = ()
+
+    @property
+    def top_set(self) -> tuple[int, int, float]:
+        # el más pesado; a igual peso, el de más reps
+        return max(self.sets, key=lambda s: (s[2], s[1]))
+
+def _last_sets(conn, table: str, routine_id: int, session_id: int | None) -> dict[int, LastPerformance]:
+    # la última sesión de cada ejercicio sale del resumen (índice por ejercicio e inicio)
+    # y sus sets del índice de _insert_sets (session_id, exercise_id, set_index)
+    rows = conn.execute(f"""
+        WITH last AS (
+            SELECT e.id AS exercise_id, (
+                SELECT s.session_id FROM session_exercise_summary s
+                WHERE s.exercise_id = e.id AND s.session_id != ?
+                ORDER BY s.started_ms DESC LIMIT 1
+            ) AS session_id
+            FROM exercises e
+            WHERE e.routine_id = ?
+        )
+        SELECT l.exercise_id, l.session_id, ses.local_day, sl.set_index, sl.reps, sl.weight
+        FROM last l
+        JOIN session_exercise_summary ses ON ses.session_id = l.session_id AND ses.exercise_id = l.exercise_id
+        LEFT JOIN {table} sl ON sl.session_id = l.session_id AND sl.exercise_id = l.exercise_id
+        ORDER BY l.exercise_id, sl.set_index
+    """, (-1 if session_id is None else session_id, routine_id)).fetchall()
+    found: dict[int, tuple] = {}
+    sets: dict[int, list] = {}
+    for ex_id, sid, day, set_index, reps, weight in rows:
+        found[ex_id] = (sid, day)
+        if set_index is not None:
+            sets.setdefault(ex_id, []).append((set_index, reps, weight))
+    return {
+        ex_id: LastPerformance(ex_id, sid, day, tuple(sets.get(ex_id, ())))
+        for ex_id, (sid, day) in found.items()
+    }
+
+def last_performance(routine_id: int, session_id: int | None = None) -> dict[int, LastPerformance]:
+    """
+    Para cada ejercicio de la rutina, los sets de la última sesión en que se hizo (sin
+    contar `session_id`, la sesión en curso), en una sola consulta para toda la rutina.
+    Si esa sesión ya está archivada, sus sets se buscan en el archivo. Los ejercicios
+    nunca hechos no aparecen.
+    """
+    with pooled() as conn:
+        last = _last_sets(conn, "main.set_logs", routine_id, session_id)
+        if any(not p.sets for p in last.values()) and has_archive(conn):
+            archived = _last_sets(conn, "archive.set_logs", routine_id, session_id)
+            last.update({ex_id: archived[ex_id] for ex_id, p in last.items() if not p.sets})
+    return {ex_id: p for ex_id, p in last.items() if p.sets}
+
+def e1rm(weight: float, reps: int) -> float:
+    # Epley. Si weight=0, queda 0.
+    return weight * (1 + reps / 30.0)
+
+def _insert_sets(conn, records):
+    """
+    Único camino de escritura de sets: inserta `records` (tuplas session_id, exercise_id,
+    set_index, reps, weight, created_at) y actualiza session_exercise_summary, dentro de
+    la transacción de `conn`. Los que ya existen (mismo set y mismo created_at) se
+    ignoran, así reintentar un lote o re-aplicar el journal no duplica nada.
+    Las columnas de tiempo (epoch ms, día local, semana ISO) se calculan acá.
+    """
+    conn.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS pending_sets (
+            session_id INTEGER, exercise_id INTEGER, set_index INTEGER,
+            reps INTEGER, weight REAL, created_at TEXT,
+            created_ms INTEGER, local_day INTEGER, iso_week INTEGER
+        )
+    """)
+    conn.execute("DELETE FROM temp.pending_sets")
+    conn.executemany("INSERT INTO temp.pending_sets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", _with_time_columns(records))
+    # sets en cola (o en el journal) de una sesión o ejercicio que se borró entretanto:
+    # el CASCADE ya se los habría llevado
+    conn.execute("""
+        DELETE FROM temp.pending_sets
+        WHERE NOT EXISTS (SELECT 1 FROM workout_sessions s WHERE s.id = pending_sets.session_id)
+           OR NOT EXISTS (SELECT 1 FROM exercises e WHERE e.id = pending_sets.exercise_id)
+    """)
+    conn.execute("""
+        DELETE FROM temp.pending_sets
+        WHERE EXISTS (
+            SELECT 1 FROM set_logs sl
+            WHERE sl.session_id = pending_sets.session_id AND sl.exercise_id = pending_sets.exercise_id
+              AND sl.set_index = pending_sets.set_index AND sl.created_at = pending_sets.created_at
+        )
+    """)
+    if has_archive(conn):
+        # historial viejo re-importado (import / merge): ya está en el archivo
+        conn.execute("""
+            DELETE FROM temp.pending_sets
+            WHERE EXISTS (
+                SELECT 1 FROM archive.set_logs a
+                WHERE a.session_id = pending_sets.session_id AND a.exercise_id = pending_sets.exercise_id
+                  AND a.set_index = pending_sets.set_index AND a.created_at = pending_sets.created_at
+            )
+        """)
+    cur = conn.execute("""
+        INSERT INTO set_logs (session_id, exercise_id, set_index, reps, weight, created_at, created_ms, local_day, iso_week)
+        SELECT session_id, exercise_id, set_index, reps, weight, created_at, created_ms, local_day, iso_week
+        FROM temp.pending_sets
+    """)
+    inserted = cur.rowcount
+    conn.execute("""
+        INSERT INTO session_exercise_summary
+            (session_id, exercise_id, started_at, started_ms, local_day, iso_week,
+             top_weight, session_volume, top_e1rm, n_sets)
+        SELECT
+            session_id, exercise_id, MIN(created_at), MIN(created_ms),
+            ts_local_day(MIN(created_at)), ts_iso_week(MIN(created_at)),
+            MAX(weight), SUM(reps * weight), MAX(weight * (1 + reps / 30.0)), COUNT(*)
+        FROM temp.pending_sets
+        WHERE true
+        GROUP BY session_id, exercise_id
+        ON CONFLICT (session_id, exercise_id) DO UPDATE SET
+            started_at = MIN(started_at, excluded.started_at),
+            local_day = CASE WHEN excluded.started_ms < started_ms THEN excluded.local_day ELSE local_day END,
+            iso_week = CASE WHEN excluded.started_ms < started_ms THEN excluded.iso_week ELSE iso_week END,
+            started_ms = MIN(started_ms, excluded.started_ms),
+            top_weight = MAX(top_weight, excluded.top_weight),
+            session_volume = session_volume + excluded.session_volume,
+            top_e1rm = MAX(top_e1rm, excluded.top_e1rm),
+            n_sets = n_sets + excluded.n_sets
+    """)
+    _update_personal_records(conn)
+    conn.execute("DELETE FROM temp.pending_sets")
+    return inserted
+
+def _with_time_columns(records):
+    for *row, created_at in records:
+        ms = epoch_ms(created_at)
+        day = local_day_number(ms)
+        yield (*row, created_at, ms, day, iso_week_key(day))
 
 def log_set(session_id: int, exercise_id: int, set_index: int, reps: int, weight: float):
-    conn = connect()
+    with transaction() as conn:
+        _insert_sets(conn, [(session_id, exercise_id, set_index, reps, weight, now_iso())])
+
+# --- Write-behind de sets ---
+# enqueue_set() deja el set en un journal en disco (append + fsync) y vuelve de
+# inmediato; un thread de fondo los pasa a set_logs en lotes, en una sola
+# transacción. Si el proceso muere antes del flush, recover_set_journal() los
+# re-aplica al partir (el insert ignora los que ya estaban).
+FLUSH_INTERVAL_SECONDS = 1.0
+JOURNAL_FSYNC = True
+
+_pending: list[tuple] = []
+_queue_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_writer: threading.Thread | None = None
+_writer_wake = threading.Event()
+writer_error: str | None = None
+
+def _journal_path() -> Path:
+    return Path(f"{DB_PATH}-setjournal")
+
+def _write_journal(records, mode: str):
+    with open(_journal_path(), mode, encoding="utf-8") as f:
+        for rec in records:
+            f.write(json.dumps(rec) + "\n")
+        f.flush()
+        if JOURNAL_FSYNC:
+            os.fsync(f.fileno())
+
+def enqueue_set(session_id: int, exercise_id: int, set_index: int, reps: int, weight: float):
+    """Como log_set(), pero sin esperar a la DB."""
+    rec = (session_id, exercise_id, set_index, reps, float(weight), now_iso())
+    with _queue_lock:
+        _write_journal([rec], "a")
+        _pending.append(rec)
+    _ensure_writer()
+
+def pending_sets() -> int:
+    with _queue_lock:
+        return len(_pending)
+
+def flush_sets() -> int:
+    """Pasa a set_logs todo lo pendiente. Devuelve cuántos sets nuevos se insertaron."""
+    with _flush_lock:
+        with _queue_lock:
+            batch = _pending[:]
+            del _pending[:]
+        if not batch:
+            return 0
+        try:
+            with transaction() as conn:
+                inserted = _insert_sets(conn, batch)
+        except Exception:
+            with _queue_lock:
+                _pending[:0] = batch
+            raise
+        # ya está en la DB: el journal queda solo con lo que llegó durante el flush
+        with _queue_lock:
+            tmp = Path(f"{_journal_path()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                for rec in _pending:
+                    f.write(json.dumps(rec) + "\n")
+                f.flush()
+                if JOURNAL_FSYNC:
+                    os.fsync(f.fileno())
+            tmp.replace(_journal_path())
+        return inserted
+
+def recover_set_journal() -> int:
+    """Re-aplica sets que quedaron en el journal (ej. tras un crash). Devuelve cuántos se recuperaron."""
+    path = _journal_path()
+    if not path.exists():
+        return 0
+    records = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            records.append(tuple(json.loads(line)))
+        except ValueError:
+            # última línea a medio escribir
+            continue
+    with _queue_lock:
+        known = set(_pending)
+        _pending[:0] = [r for r in records if r not in known]
+    return flush_sets()
+
+def _writer_loop():
+    global writer_error
+    while True:
+        _writer_wake.wait(FLUSH_INTERVAL_SECONDS)
+        _writer_wake.clear()
+        try:
+            flush_sets()
+            writer_error = None
+        except Exception as e:
+            # se reintenta en el próximo ciclo; lo pendiente sigue en memoria y en el journal
+            writer_error = str(e)
+
+metrics.register_collector(lambda: {"pending_sets": pending_sets(), "writer_failing": int(writer_error is not None)})
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _queue_lock:
+        if _writer is not None and _writer.is_alive():
+            return
+        _writer = threading.Thread(target=_writer_loop, name="set-writer", daemon=True)
+        _writer.start()
+
+@atexit.register
+def _flush_at_exit():
+    if _pending:
+        flush_sets()
+
+def _rebuild_session_summary(cur, source: str = "set_logs"):
+    cur.execute("DELETE FROM session_exercise_summary")
+    cur.execute(f"""
+        INSERT INTO session_exercise_summary
+            (session_id, exercise_id, started_at, started_ms, local_day, iso_week,
+             top_weight, session_volume, top_e1rm, n_sets)
+        SELECT
+            session_id,
+            exercise_id,
+            MIN(created_at),
+            MIN(created_ms),
+            ts_local_day(MIN(created_at)),
+            ts_iso_week(MIN(created_at)),
+            MAX(weight),
+            SUM(reps * weight),
+            MAX(weight * (1 + reps / 30.0)),
+            COUNT(*)
+        FROM {source}
+        GROUP BY session_id, exercise_id
+    """)
+
+def rebuild_session_summary() -> int:
+    """Recalcula session_exercise_summary desde set_logs (+ archivo). Devuelve cuántas filas quedaron."""
+    with transaction() as conn:
+        _rebuild_session_summary(conn.cursor(), _set_logs_source())
+        return conn.execute("SELECT COUNT(*) FROM session_exercise_summary").fetchone()[0]
+
+# --- Récords personales ---
+# personal_records guarda, por ejercicio, cada sesión que batió el récord vigente
+# (récord = mayor que el de todas las sesiones anteriores):
+#   kind="weight": mejor peso para un número de reps (reps = ese número)
+#   kind="e1rm":   mejor e1RM Epley de un set (reps = 0)
+#   kind="volume": volumen de la sesión en el ejercicio (reps = 0)
+# El récord vigente es el MAX(value) de la clave, y las filas son el historial.
+# _insert_sets() lo mantiene con unos pocos lookups por set; si llega un set más
+# viejo que un récord ya registrado (import, merge) se recalcula ese ejercicio.
+PR_KINDS = ("weight", "e1rm", "volume")
+
+def _personal_records_query(source: str, only: str) -> str:
+    # una fila por (clave, sesión) con el mejor valor de la sesión; queda la que supera
+    # al máximo de las sesiones anteriores (orden: primer set del ejercicio en la sesión)
+    return f"""
+        WITH per_session AS (
+            SELECT exercise_id, 'weight' AS kind, reps, session_id, MAX(weight) AS value
+            FROM {source} {only} GROUP BY exercise_id, reps, session_id
+            UNION ALL
+            SELECT exercise_id, 'e1rm', 0, session_id, MAX(weight * (1 + reps / 30.0))
+            FROM {source} {only} GROUP BY exercise_id, session_id
+            UNION ALL
+            SELECT exercise_id, 'volume', 0, session_id, session_volume
+            FROM session_exercise_summary {only}
+        ), ordered AS (
+            SELECT p.exercise_id, p.kind, p.reps, p.session_id, p.value, ses.started_at, ses.started_ms,
+                   MAX(p.value) OVER (
+                       PARTITION BY p.exercise_id, p.kind, p.reps ORDER BY ses.started_ms, p.session_id
+                       ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                   ) AS previous
+            FROM per_session p
+            JOIN session_exercise_summary ses ON ses.session_id = p.session_id AND ses.exercise_id = p.exercise_id
+        )
+        SELECT exercise_id, kind, reps, session_id, value, started_at, started_ms
+        FROM ordered
+        WHERE previous IS NULL OR value > previous
+    """
+
+def _rebuild_personal_records(cur, source: str = "set_logs", exercise_ids=None, table: str = "personal_records"):
+    only, params = "", []
+    if exercise_ids is not None:
+        only = f"WHERE exercise_id IN ({', '.join('?' * len(exercise_ids))})"
+        params = list(exercise_ids)
+    cur.execute(f"DELETE FROM {table} {only}", params)
+    cur.execute(f"""
+        INSERT INTO {table} (exercise_id, kind, reps, session_id, value, achieved_at, achieved_ms)
+        {_personal_records_query(source, only)}
+    """, params * 3)
+
+def _update_personal_records(conn):
+    """Aplica a personal_records los sets de temp.pending_sets (ya en set_logs y en el resumen)."""
+    # sesiones que quedaron antes de un récord ya registrado de otra sesión: recalcular
+    stale = [row[0] for row in conn.execute("""
+        SELECT DISTINCT p.exercise_id
+        FROM temp.pending_sets p
+        JOIN session_exercise_summary ses ON ses.session_id = p.session_id AND ses.exercise_id = p.exercise_id
+        WHERE EXISTS (
+            SELECT 1 FROM personal_records pr
+            WHERE pr.exercise_id = p.exercise_id AND pr.session_id != p.session_id
+              AND (pr.achieved_ms, pr.session_id) > (ses.started_ms, ses.session_id)
+        )
+    """)]
+    conn.execute("""
+        INSERT INTO personal_records (exercise_id, kind, reps, session_id, value, achieved_at, achieved_ms)
+        SELECT c.exercise_id, c.kind, c.reps, c.session_id, c.value, ses.started_at, ses.started_ms
+        FROM (
+            SELECT exercise_id, 'weight' AS kind, reps, session_id, MAX(weight) AS value
+            FROM temp.pending_sets GROUP BY exercise_id, reps, session_id
+            UNION ALL
+            SELECT exercise_id, 'e1rm', 0, session_id, MAX(weight * (1 + reps / 30.0))
+            FROM temp.pending_sets GROUP BY exercise_id, session_id
+            UNION ALL
+            SELECT exercise_id, 'volume', 0, session_id, session_volume
+            FROM session_exercise_summary
+            WHERE (session_id, exercise_id) IN (SELECT session_id, exercise_id FROM temp.pending_sets)
+        ) c
+        JOIN session_exercise_summary ses ON ses.session_id = c.session_id AND ses.exercise_id = c.exercise_id
+        WHERE c.value > COALESCE((
+            SELECT MAX(pr.value) FROM personal_records pr
+            WHERE pr.exercise_id = c.exercise_id AND pr.kind = c.kind AND pr.reps = c.reps
+              AND pr.session_id != c.session_id
+        ), -1)
+        ON CONFLICT (exercise_id, kind, reps, session_id) DO UPDATE SET
+            value = MAX(value, excluded.value),
+            achieved_at = excluded.achieved_at,
+            achieved_ms = excluded.achieved_ms
+    """)
+    # un set anterior al primero de la sesión corre su inicio: los récords que ya tenía
+    # en otras claves llevan la fecha del resumen
     conn.execute("""
-        INSERT INTO set_logs (session_id, exercise_id, set_index, reps, weight, created_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (session_id, exercise_id, set_index, reps, weight, now_iso()))
-    conn.commit()
-    conn.close()
-
-def stats_sets():
-    conn = connect()
-    rows = conn.execute("""
+        UPDATE personal_records
+        SET (achieved_at, achieved_ms) = (
+            SELECT ses.started_at, ses.started_ms FROM session_exercise_summary ses
+            WHERE ses.session_id = personal_records.session_id AND ses.exercise_id = personal_records.exercise_id
+        )
+        WHERE (session_id, exercise_id) IN (SELECT session_id, exercise_id FROM temp.pending_sets)
+          AND achieved_ms != (
+            SELECT ses.started_ms FROM session_exercise_summary ses
+            WHERE ses.session_id = personal_records.session_id AND ses.exercise_id = personal_records.exercise_id
+          )
+    """)
+    if stale:
+        _rebuild_personal_records(conn.cursor(), _set_logs_source(), stale)
+
+def rebuild_personal_records() -> int:
+    """Recalcula personal_records desde los sets (+ archivo). Devuelve cuántas filas quedaron."""
+    with transaction() as conn:
+        _rebuild_personal_records(conn.cursor(), _set_logs_source())
+        return conn.execute("SELECT COUNT(*) FROM personal_records").fetchone()[0]
+
+def check_personal_records() -> int:
+    """Compara personal_records con un recálculo completo. Devuelve cuántas filas difieren (0 = al día)."""
+    with transaction() as conn:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS records_check AS SELECT * FROM main.personal_records WHERE 0")
+        _rebuild_personal_records(conn.cursor(), _set_logs_source(), table="temp.records_check")
+        diff = conn.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT * FROM (SELECT * FROM main.personal_records EXCEPT SELECT * FROM temp.records_check)
+                UNION ALL
+                SELECT * FROM (SELECT * FROM temp.records_check EXCEPT SELECT * FROM main.personal_records)
+            )
+        """).fetchone()[0]
+        conn.execute("DROP TABLE temp.records_check")
+        return diff
+
+def check_personal_record(session_id: int, exercise_id: int, reps: int, weight: float) -> list[str]:
+    """
+    Tipos de récord (PR_KINDS) que batiría este set, antes de registrarlo: compara contra
+    el índice y los sets de la sesión que siguen en cola. El primer set de un ejercicio
+    (o de unas reps) no cuenta: no hay récord anterior que batir.
+    """
+    with _queue_lock:
+        queued = [r for r in _pending if r[0] == session_id and r[1] == exercise_id]
+    e1 = e1rm(weight, reps)
+    with pooled() as conn:
+        best_weight, best_e1rm, best_volume, volume = conn.execute("""
+            SELECT
+                (SELECT MAX(value) FROM personal_records WHERE exercise_id = :ex AND kind = 'weight' AND reps = :reps),
+                (SELECT MAX(value) FROM personal_records WHERE exercise_id = :ex AND kind = 'e1rm' AND reps = 0),
+                (SELECT MAX(value) FROM personal_records
+                 WHERE exercise_id = :ex AND kind = 'volume' AND reps = 0 AND session_id != :session),
+                (SELECT session_volume FROM session_exercise_summary WHERE session_id = :session AND exercise_id = :ex)
+        """, {"ex": exercise_id, "reps": reps, "session": session_id}).fetchone()
+
+    records = []
+    queued_same_reps = [r[4] for r in queued if r[3] == reps]
+    if best_weight is not None and weight > max([best_weight, *queued_same_reps]):
+        records.append("weight")
+    if best_e1rm is not None and e1 > max([best_e1rm, *(e1rm(r[4], r[3]) for r in queued)]):
+        records.append("e1rm")
+    volume = (volume or 0.0) + sum(r[3] * r[4] for r in queued)
+    # el set que hace cruzar el volumen del récord, una sola vez por sesión
+    if best_volume is not None and volume <= best_volume < volume + reps * weight:
+        records.append("volume")
+    return records
+
+def personal_records(exercise_id: int, current: bool = False):
+    """
+    Historial de récords del ejercicio (kind, reps, value, session_id, achieved_at),
+    del más viejo al más nuevo. Con `current`, solo el récord vigente de cada clave.
+    """
+    with pooled() as conn:
+        if current:
+            return conn.execute("""
+                SELECT kind, reps, MAX(value) AS value, session_id, achieved_at, achieved_ms
+                FROM personal_records
+                WHERE exercise_id = ?
+                GROUP BY kind, reps
+                ORDER BY kind, reps
+            """, (exercise_id,)).fetchall()
+        return conn.execute("""
+            SELECT kind, reps, value, session_id, achieved_at, achieved_ms
+            FROM personal_records
+            WHERE exercise_id = ?
+            ORDER BY achieved_ms, kind, reps
+        """, (exercise_id,)).fetchall()
+
+# --- Sets archivados ---
+# archive.py mueve los sets viejos a gym-archive.db (adjunta como "archive" en cada
+# conexión). Las consultas cuyo rango llega a lo archivado leen la unión de ambas
+# tablas; las del rango habitual (últimas semanas) solo tocan set_logs.
+SET_LOG_COLUMNS = "id, session_id, exercise_id, set_index, reps, weight, created_at, created_ms, local_day, iso_week"
+
+# DB -> (firma del archivo, MAX(created_at)): otro proceso puede archivar mientras tanto
+_archived_until: dict[str, tuple[tuple, str | None]] = {}
+
+def has_archive(conn) -> bool:
+    return any(row[1] == "archive" for row in conn.execute("PRAGMA database_list"))
+
+def archived_until() -> str | None:
+    """created_at del set archivado más nuevo (None si no hay nada archivado)."""
+    key = str(DB_PATH)
+    signature = _archive_signature()
+    cached = _archived_until.get(key)
+    if cached is None or cached[0] != signature:
+        with pooled() as conn:
+            until = (
+                conn.execute("SELECT MAX(created_at) FROM archive.set_logs").fetchone()[0]
+                if has_archive(conn) else None
+            )
+        cached = _archived_until[key] = (signature, until)
+    return cached[1]
+
+def _archive_signature() -> tuple:
+    # en WAL lo nuevo queda primero en el -wal: cuentan los dos archivos
+    path = archive_path()
+    return tuple(
+        (st.st_mtime_ns, st.st_size) if (st := _stat(p)) else None
+        for p in (path, path.with_name(path.name + "-wal"))
+    )
+
+def _stat(path: Path):
+    try:
+        return path.stat()
+    except FileNotFoundError:
+        return None
+
+def _set_logs_source(since: str | None = None) -> str:
+    """FROM para set_logs: la tabla sola, o unida al archivo si `since` llega a lo archivado."""
+    until = archived_until()
+    if until is None or (since is not None and since > until):
+        return "set_logs"
+    return f"""(
+        SELECT {SET_LOG_COLUMNS} FROM main.set_logs
+        UNION ALL
+        SELECT {SET_LOG_COLUMNS} FROM archive.set_logs
+    )"""
+
+def _delete_archived_orphans(conn) -> int:
+    """
+    Borra del archivo los sets cuya sesión o ejercicio ya no existe. El CASCADE no
+    cruza a otra DB, así que los borrados de rutinas y ejercicios llaman a esto.
+    """
+    if not has_archive(conn):
+        return 0
+    return conn.execute("""
+        DELETE FROM archive.set_logs
+        WHERE NOT EXISTS (SELECT 1 FROM main.workout_sessions s WHERE s.id = set_logs.session_id)
+           OR NOT EXISTS (SELECT 1 FROM main.exercises e WHERE e.id = set_logs.exercise_id)
+    """).rowcount
+
+def iso_days_ago(days: int) -> str:
+    """Corte para filtros de rango, en el mismo formato que created_at."""
+    return (datetime.utcnow() - timedelta(days=days)).isoformat(timespec="seconds")
+
+def _sets_filter(since=None, until=None, exercise_id=None, routine_id=None, table="sl", ts="created_ms"):
+    # WHERE común para las consultas de stats (sl = set_logs o ses = session_exercise_summary, e = exercises).
+    # since / until llegan como texto ISO y se comparan contra la columna epoch ms.
+    where, params = [], []
+    if since is not None:
+        where.append(f"{table}.{ts} >= ?")
+        params.append(epoch_ms(since))
+    if until is not None:
+        where.append(f"{table}.{ts} < ?")
+        params.append(epoch_ms(until))
+    if exercise_id is not None:
+        where.append(f"{table}.exercise_id = ?")
+        params.append(exercise_id)
+    if routine_id is not None:
+        where.append("e.routine_id = ?")
+        params.append(routine_id)
+    sql = ("WHERE " + " AND ".join(where)) if where else ""
+    return sql, params
+
+def has_sets() -> bool:
+    with pooled() as conn:
+        hot = bool(conn.execute("SELECT EXISTS (SELECT 1 FROM set_logs)").fetchone()[0])
+    return hot or archived_until() is not None
+
+def _stats_sets_query(since=None, until=None, exercise_id=None, routine_id=None, columnar=False):
+    # el fetch columnar lee created_at como epoch ms (ver iter_arrow_batches); las filas, como texto ISO
+    where, params = _sets_filter(since, until, exercise_id, routine_id)
+    sql = f"""
         SELECT
-            sl.created_at,
+            {"sl.created_ms AS created_at" if columnar else "sl.created_at"},
+            sl.session_id,
+            sl.exercise_id,
             r.name AS routine,
             e.name AS exercise,
             sl.set_index,
             sl.reps,
             sl.weight,
             (sl.reps * sl.weight) AS volume
-        FROM set_logs sl
+        FROM {_set_logs_source(since)} sl
         JOIN exercises e ON e.id = sl.exercise_id
         JOIN routines r ON r.id = e.routine_id
-        ORDER BY sl.created_at DESC
-    """).fetchall()
-    conn.close()
-    return rows
+        {where}
+        ORDER BY sl.created_ms DESC
+    """
+    return sql, params
+
+# tipos de las columnas de stats_sets, para el fetch columnar
+STATS_SETS_COLUMNS = {
+    "created_at": "timestamp",
+    "session_id": "int64",
+    "exercise_id": "int64",
+    "routine": "string",
+    "exercise": "string",
+    "set_index": "int64",
+    "reps": "int64",
+    "weight": "float64",
+    "volume": "float64",
+}
 
+def stats_sets(since: str | None = None, until: str | None = None, exercise_id: int | None = None, routine_id: int | None = None):
+    sql, params = _stats_sets_query(since, until, exercise_id, routine_id)
+    with pooled() as conn:
+        return conn.execute(sql, params).fetchall()
 
-# --- GUARDA IMAGENES ---
-def save_exercise_image(uploaded_file) -> str:
+def stats_sets_frame(since: str | None = None, until: str | None = None, exercise_id: int | None = None, routine_id: int | None = None):
+    """Igual que stats_sets() pero como DataFrame; created_at queda como datetime64 en UTC (naive)."""
+    sql, params = _stats_sets_query(since, until, exercise_id, routine_id, columnar=True)
+    return fetch_arrow(sql, params, STATS_SETS_COLUMNS).to_pandas()
+
+FETCH_BATCH_SIZE = 50_000
+
+def arrow_schema(columns: dict[str, str]):
+    """Schema pyarrow de `columns` (nombre -> "int64" | "float64" | "string" | "timestamp")."""
+    import pyarrow as pa
+
+    types = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string(), "timestamp": pa.timestamp("s")}
+    return pa.schema([(name, types[t]) for name, t in columns.items()])
+
+def iter_arrow_batches(sql: str, params, columns: dict[str, str], batch_size: int = FETCH_BATCH_SIZE):
     """
-    Guarda un archivo subido por Streamlit en assets/exercises/ y devuelve su ruta (str).
+    Ejecuta `sql` y entrega pyarrow.RecordBatch de hasta `batch_size` filas, columna por
+    columna. Sin sqlite3.Row ni dicts por fila: cada lote de tuplas se transpone a arrays
+    tipados y se descarta. La conexión queda prestada mientras se consume el generador.
+    Los "timestamp" vienen como enteros epoch ms (UTC): se reinterpretan, sin parsear.
     """
-    suffix = Path(uploaded_file.name).suffix.lower() if uploaded_file.name else ".png"
-    if suffix not in [".png", ".jpg", ".jpeg", ".webp"]:
-        suffix = ".png"
+    # pyarrow solo lo necesitan stats y export; no lo cargamos al importar db_sqlite
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    schema = arrow_schema(columns)
+    read_types = [pa.int64() if t == "timestamp" else f.type for f, t in zip(schema, columns.values())]
+
+    with pooled() as conn:
+        cur = conn.cursor()
+        cur.row_factory = None  # tuplas planas, más baratas que sqlite3.Row
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            arrays = [pa.array(col, type=t) for col, t in zip(zip(*rows), read_types)]
+            del rows
+            arrays = [
+                pc.cast(a.view(pa.timestamp("ms")), pa.timestamp("s"), safe=False) if t == "timestamp" else a
+                for a, t in zip(arrays, columns.values())
+            ]
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def fetch_arrow(sql: str, params, columns: dict[str, str], batch_size: int = FETCH_BATCH_SIZE):
+    """
+    Ejecuta `sql` y arma un pyarrow.Table con los lotes de iter_arrow_batches(): el peak
+    de memoria es ~ la tabla Arrow + un lote.
+    """
+    import pyarrow as pa
+
+    return pa.Table.from_batches(iter_arrow_batches(sql, params, columns, batch_size), schema=arrow_schema(columns))
+
 
-    filename = f"{uuid4().hex}{suffix}"
-    dest = EXERCISE_IMG_DIR / filename
+if __name__ == "__main__":
+    import argparse
 
-    # uploaded_file es un UploadedFile (tiene getbuffer())
-    with open(dest, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+    ap = argparse.ArgumentParser(description="Mantención de la base de datos de Gym App")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("migrate", help="aplica migraciones pendientes")
+    sub.add_parser("rebuild-summary", help="recalcula session_exercise_summary desde set_logs")
+    sub.add_parser("rebuild-records", help="recalcula personal_records desde set_logs")
+    sub.add_parser("check-records", help="compara personal_records con un recálculo completo")
+    args = ap.parse_args()
 
-    return str(dest).replace("\\", "/")
+    init_db()
+    if args.cmd == "rebuild-summary":
+        print(f"session_exercise_summary: {rebuild_session_summary()} filas")
+    elif args.cmd == "rebuild-records":
+        print(f"personal_records: {rebuild_personal_records()} filas")
+    elif args.cmd == "check-records":
+        diff = check_personal_records()
+        print("personal_records al día" if diff == 0 else f"personal_records: {diff} filas distintas (correr rebuild-records)")
+        raise SystemExit(1 if diff else 0)
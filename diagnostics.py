@@ -0,0 +1,64 @@
+"""
+Vista de diagnóstico (no aparece en el menú): app.py?diag=1.
+Muestra lo que junta metrics.py en este proceso.
+"""
+import streamlit as st
+
+import metrics
+from db_sqlite import cache_stats
+
+def render():
+    st.title("Diagnóstico")
+
+    if not metrics.ENABLED:
+        st.info(
+            "La instrumentación está apagada. Arranca la app con GYM_METRICS=1 "
+            "(opcional: GYM_SLOW_QUERY_MS=100, GYM_METRICS_FILE=metrics.prom o metrics.jsonl)."
+        )
+        st.caption(f"Cache de rutinas/ejercicios: {cache_stats()}")
+        return
+
+    snap = metrics.snapshot()
+    st.caption(
+        f"Umbral de query lenta: {metrics.SLOW_QUERY_MS:g} ms · "
+        f"Archivo: {metrics.METRICS_FILE or '(ninguno)'}"
+    )
+
+    c1, c2, c3 = st.columns(3)
+    for col, (kind, t) in zip((c1, c2), snap["timings"].items()):
+        avg = t["ms"] / t["count"] if t["count"] else 0.0
+        col.metric(f"{kind} ({t['count']})", f"{avg:.2f} ms prom.")
+    c3.metric("Queries lentas", len(snap["slow"]))
+
+    st.subheader("Reruns por página (ms promedio)")
+    st.dataframe([
+        {"página": page, "reruns": a["count"],
+         **{p: round(a[p] / a["count"], 2) for p in metrics.PHASES + ("other", "total")}}
+        for page, a in snap["pages"].items()
+    ], use_container_width=True)
+
+    st.subheader("Últimos reruns")
+    st.dataframe(list(reversed(snap["reruns"]))[:50], use_container_width=True)
+
+    st.subheader("Queries (por tiempo total)")
+    st.dataframe([
+        {"sql": q["sql"], "veces": q["count"], "total ms": round(q["ms"], 2),
+         "prom ms": round(q["ms"] / q["count"], 3) if q["count"] else 0.0,
+         "máx ms": round(q["max_ms"], 2), "filas": q["rows"]}
+        for q in snap["queries"]
+    ], use_container_width=True)
+
+    st.subheader("Queries lentas")
+    st.dataframe(list(reversed(snap["slow"])), use_container_width=True)
+
+    st.subheader("Statements ejecutados por SQLite")
+    st.dataframe([{"statement": v, "veces": n} for v, n in sorted(snap["statements"].items())], use_container_width=True)
+
+    st.subheader("Cache de rutinas/ejercicios")
+    st.json(cache_stats())
+
+    c1, c2 = st.columns(2)
+    c1.download_button("⬇️ Métricas (Prometheus)", metrics.prometheus_text(), file_name="gym_metrics.prom")
+    if c2.button("Reiniciar contadores"):
+        metrics.reset()
+        st.rerun()
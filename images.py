@@ -0,0 +1,212 @@
+"""
+Imágenes de ejercicios.
+
+Los archivos se guardan por hash de contenido (la misma foto subida dos veces
+ocupa un solo archivo) y al subirlos se generan miniaturas WebP a los anchos
+que usan las páginas. Las miniaturas ya codificadas se mantienen en un LRU en
+memoria para que los reruns no vuelvan a leer disco.
+"""
+import hashlib
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from db_sqlite import EXERCISE_IMG_DIR, pooled, transaction, invalidate_cache
+
+THUMB_DIR = EXERCISE_IMG_DIR / "thumbs"
+ALLOWED_SUFFIXES = [".png", ".jpg", ".jpeg", ".webp"]
+
+# anchos con los que se muestran en Rutinas (220) y Entrenar (260)
+THUMB_WIDTHS = (220, 260)
+THUMB_QUALITY = 80
+THUMB_CACHE_SIZE = 256
+
+def _as_posix(path: Path) -> str:
+    return str(path).replace("\\", "/")
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:32]
+
+def thumb_path(image_path: str | Path, width: int) -> Path:
+    return THUMB_DIR / f"{Path(image_path).stem}_{width}.webp"
+
+def make_thumbnail(image_path: str | Path, width: int) -> Path:
+    """Genera (si falta) la miniatura WebP de `image_path` a `width` px de ancho."""
+    dest = thumb_path(image_path, width)
+    if dest.exists():
+        return dest
+
+    # Pillow solo hace falta al generar miniaturas (las páginas leen las ya hechas)
+    from PIL import Image, ImageOps
+
+    THUMB_DIR.mkdir(parents=True, exist_ok=True)
+    with Image.open(image_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if img.mode in ("LA", "P", "PA") else "RGB")
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        # escribir a un temporal y renombrar: nunca queda una miniatura a medias
+        tmp = dest.with_suffix(".tmp")
+        img.save(tmp, "WEBP", quality=THUMB_QUALITY, method=4)
+        tmp.replace(dest)
+    return dest
+
+@lru_cache(maxsize=THUMB_CACHE_SIZE)
+def _thumbnail_bytes(image_path: str, width: int) -> bytes:
+    return make_thumbnail(image_path, width).read_bytes()
+
+def image_variant(image_path: str, width: int):
+    """
+    Lo que hay que pasarle a st.image: bytes de la miniatura (cacheados) o, si no se
+    puede generar, la ruta original. None si el archivo ya no está (p. ej. un backup
+    restaurado que apunta a una imagen que la mantención ya borró): no mostrar nada.
+    """
+    if not Path(image_path).is_file():
+        return None
+    try:
+        return _thumbnail_bytes(image_path, width)
+    except (OSError, ValueError):
+        return image_path
+
+def store_image(data: bytes, suffix: str) -> str:
+    """Guarda `data` por hash de contenido (si ya existe no escribe nada) y genera sus miniaturas."""
+    suffix = suffix.lower()
+    if suffix not in ALLOWED_SUFFIXES:
+        suffix = ".png"
+
+    dest = EXERCISE_IMG_DIR / f"{content_hash(data)}{suffix}"
+    if not dest.exists():
+        tmp = dest.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        tmp.replace(dest)
+
+    for width in THUMB_WIDTHS:
+        try:
+            make_thumbnail(dest, width)
+        except (OSError, ValueError):
+            # no es una imagen que Pillow entienda; se mostrará el original
+            break
+
+    return _as_posix(dest)
+
+def save_exercise_image(uploaded_file) -> str:
+    """
+    Guarda un archivo subido por Streamlit en assets/exercises/ y devuelve su ruta (str).
+    """
+    suffix = Path(uploaded_file.name).suffix if uploaded_file.name else ".png"
+    # uploaded_file es un UploadedFile (tiene getbuffer())
+    return store_image(bytes(uploaded_file.getbuffer()), suffix)
+
+def migrate_assets() -> dict:
+    """
+    One-off para assets existentes: renombra por hash, borra duplicados, actualiza
+    exercises.image_path y genera miniaturas. Se puede correr más de una vez.
+    """
+    renamed = {}
+    size_before = 0
+    for f in sorted(EXERCISE_IMG_DIR.iterdir()):
+        if not f.is_file() or f.suffix.lower() not in ALLOWED_SUFFIXES:
+            continue
+        size_before += f.stat().st_size
+        new_path = store_image(f.read_bytes(), f.suffix)
+        if new_path != _as_posix(f):
+            renamed[_as_posix(f)] = new_path
+
+    # primero apuntar la DB a los archivos nuevos, después borrar los viejos
+    with transaction() as conn:
+        conn.executemany("UPDATE exercises SET image_path=? WHERE image_path=?",
+                         [(new, old) for old, new in renamed.items()])
+    invalidate_cache()
+
+    for old in renamed:
+        Path(old).unlink(missing_ok=True)
+    size_after = sum(
+        f.stat().st_size for f in EXERCISE_IMG_DIR.iterdir()
+        if f.is_file() and f.suffix.lower() in ALLOWED_SUFFIXES
+    )
+
+    with pooled() as conn:
+        unique = conn.execute("SELECT COUNT(DISTINCT image_path) FROM exercises WHERE image_path IS NOT NULL").fetchone()[0]
+    _thumbnail_bytes.cache_clear()
+    return {"renamed": len(renamed), "bytes_freed": size_before - size_after, "images_in_use": unique}
+
+def _remove_image(f: Path) -> int:
+    # bytes liberados (0 si ya no estaba)
+    try:
+        size = f.stat().st_size
+    except FileNotFoundError:
+        return 0
+    f.unlink(missing_ok=True)
+    return size
+
+def collect_unused_images(grace_seconds: int = 3600, sweep: bool = False) -> dict:
+    """
+    Borra las imágenes que los ejercicios de esta DB soltaron (released_images) y que
+    ya nadie usa, con sus miniaturas, y las miniaturas cuyo original no existe. Con
+    `sweep` borra además cualquier imagen de la carpeta que esta DB no use: solo a mano,
+    porque la carpeta puede ser de otra DB. Respeta lo de menos de `grace_seconds` (una
+    subida recién guardada puede no estar todavía en exercises).
+    Devuelve cuántos archivos y bytes se liberaron.
+    """
+    if not EXERCISE_IMG_DIR.exists():
+        return {"images_removed": 0, "bytes_freed": 0}
+    cutoff = time.time() - grace_seconds
+    with pooled() as conn:
+        in_use = {
+            Path(row[0]).resolve()
+            for row in conn.execute("SELECT DISTINCT image_path FROM exercises WHERE image_path IS NOT NULL")
+        }
+        released = [
+            row[0] for row in conn.execute(
+                "SELECT image_path FROM released_images WHERE released_at < ?",
+                (datetime.utcfromtimestamp(cutoff).isoformat(timespec="seconds"),),
+            )
+        ]
+
+    candidates = {Path(p) for p in released}
+    if sweep:
+        candidates |= {
+            f for f in EXERCISE_IMG_DIR.iterdir()
+            if f.is_file() and f.suffix.lower() in ALLOWED_SUFFIXES and f.stat().st_mtime < cutoff
+        }
+    removed, freed = 0, 0
+    for f in candidates:
+        if f.resolve() in in_use:
+            continue
+        size = _remove_image(f)
+        removed += size > 0
+        freed += size
+    if THUMB_DIR.exists():
+        originals = {f.stem for f in EXERCISE_IMG_DIR.iterdir() if f.is_file()}
+        for f in THUMB_DIR.iterdir():
+            # <stem>_<ancho>.webp; las miniaturas se regeneran, no necesitan gracia
+            if f.is_file() and f.stem.rsplit("_", 1)[0] not in originals:
+                size = _remove_image(f)
+                removed += size > 0
+                freed += size
+
+    if released:
+        with transaction() as conn:
+            conn.executemany("DELETE FROM released_images WHERE image_path = ?", [(p,) for p in released])
+    _thumbnail_bytes.cache_clear()
+    return {"images_removed": removed, "bytes_freed": freed}
+
+if __name__ == "__main__":
+    import argparse
+
+    from db_sqlite import init_db
+
+    ap = argparse.ArgumentParser(description="Imágenes de ejercicios")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("migrate", help="deduplica por hash y genera miniaturas de los assets existentes")
+    gc = sub.add_parser("gc", help="borra las imágenes que los ejercicios dejaron de usar")
+    gc.add_argument("--sweep", action="store_true", help="también las que esta DB nunca usó (la carpeta no debe ser de otra DB)")
+    args = ap.parse_args()
+
+    init_db()
+    if args.cmd == "migrate":
+        print(migrate_assets())
+    else:
+        print(collect_unused_images(sweep=args.sweep))
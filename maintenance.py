@@ -0,0 +1,193 @@
+"""
+Mantención periódica de la DB y de las imágenes.
+
+Las conexiones abren con foreign_keys=ON, así que borrar una rutina o un ejercicio
+ya se lleva sus sesiones, sets, resumen y récords. Lo que se borró antes de eso
+(SQLite ignora los FK si no se piden) quedó huérfano: collect_orphans() lo limpia,
+también en el archivo, donde el CASCADE no llega. collect_unused_images() (images.py)
+borra las imágenes que los ejercicios soltaron y que ya nadie usa; las que esta DB
+nunca usó se quedan (la carpeta puede ser de otra DB): `python images.py gc --sweep`.
+
+reclaim_space() devuelve al disco las páginas libres con un incremental_vacuum, que no
+reescribe la DB; eso exige auto_vacuum=INCREMENTAL. Pasar gym.db (y gym-archive.db) a
+ese modo es un VACUUM completo que puede tomar más que el busy_timeout de la app, así
+que se hace solo a mano: `python maintenance.py run --force`. Mientras tanto la
+mantención programada se salta ese paso. PRAGMA optimize actualiza las estadísticas
+del planificador igual, y el checkpoint achica el -wal.
+
+run_maintenance() corre todo y guarda el informe (bytes recuperados, filas e imágenes
+borradas) en settings. maybe_run() lo hace solo si pasaron MAINTENANCE_INTERVAL_HOURS
+desde la última vez; warmup.py lo llama al arrancar y Entrenar al terminar una sesión.
+
+    python maintenance.py run [--force]
+    python maintenance.py status
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import db_sqlite
+from db_sqlite import (
+    transaction, pooled, flush_sets, has_archive, archive_path, now_iso,
+    invalidate_cache, rebuild_personal_records,
+)
+from images import collect_unused_images
+
+MAINTENANCE_INTERVAL_HOURS = float(os.getenv("GYM_MAINTENANCE_HOURS", "24"))
+
+# (tabla, condición de huérfano), en orden: primero los padres, así el CASCADE
+# se lleva lo que cuelga de ellos y la condición de los hijos ve lo que queda
+ORPHAN_RULES = (
+    ("exercises", "routine_id NOT IN (SELECT id FROM routines)"),
+    ("workout_sessions", "routine_id NOT IN (SELECT id FROM routines)"),
+    ("set_logs", "session_id NOT IN (SELECT id FROM workout_sessions) OR exercise_id NOT IN (SELECT id FROM exercises)"),
+    ("session_exercise_summary", "session_id NOT IN (SELECT id FROM workout_sessions) OR exercise_id NOT IN (SELECT id FROM exercises)"),
+    ("personal_records", "session_id NOT IN (SELECT id FROM workout_sessions) OR exercise_id NOT IN (SELECT id FROM exercises)"),
+)
+
+_lock = threading.Lock()
+
+# --- Huérfanos ---
+def collect_orphans() -> dict:
+    """
+    Borra, en una transacción, las filas que apuntan a una rutina, sesión o ejercicio
+    que ya no existe. Devuelve cuántas salieron de cada tabla (contando las que se
+    llevó el CASCADE).
+    """
+    flush_sets()
+    with transaction() as conn:
+        tables = [t for t, _ in ORPHAN_RULES]
+        before = {t: conn.execute(f"SELECT COUNT(*) FROM main.{t}").fetchone()[0] for t in tables}
+        for table, orphan in ORPHAN_RULES:
+            conn.execute(f"DELETE FROM main.{table} WHERE {orphan}")
+        removed = {t: before[t] - conn.execute(f"SELECT COUNT(*) FROM main.{t}").fetchone()[0] for t in tables}
+        removed["archive.set_logs"] = db_sqlite._delete_archived_orphans(conn)
+    if any(removed.values()):
+        # un récord borrado puede ser el que tapaba a uno posterior: índice desde cero
+        rebuild_personal_records()
+        invalidate_cache()
+    return removed
+
+def count_orphans() -> int:
+    """Filas de gym.db que violan un FK (PRAGMA foreign_key_check), sin borrar nada."""
+    with pooled() as conn:
+        return len(conn.execute("PRAGMA main.foreign_key_check").fetchall())
+
+# --- Espacio ---
+def _file_bytes(path) -> int:
+    return sum(p.stat().st_size for p in (path, path.with_name(path.name + "-wal")) if p.exists())
+
+def _reclaim(conn, schema: str, path, convert: bool) -> dict:
+    size_before = _file_bytes(path)
+    if conn.execute(f"PRAGMA {schema}.auto_vacuum").fetchone()[0] != 2:
+        if convert:
+            # cambiar el modo requiere reescribir la DB una vez
+            conn.execute(f"PRAGMA {schema}.auto_vacuum = INCREMENTAL")
+            conn.execute(f"VACUUM {schema}")
+            mode = "vacuum"
+        else:
+            # sin auto_vacuum no hay nada incremental que hacer: no bloquear a la app
+            mode = "skipped"
+    else:
+        # el pragma libera una página por paso: fetchall() lo corre hasta el final
+        conn.execute(f"PRAGMA {schema}.incremental_vacuum").fetchall()
+        mode = "incremental"
+    conn.execute(f"PRAGMA {schema}.optimize")
+    # en WAL el archivo principal se achica recién al checkpoint
+    conn.execute(f"PRAGMA {schema}.wal_checkpoint(TRUNCATE)")
+    size_after = _file_bytes(path)
+    return {
+        "mode": mode,
+        "bytes_before": size_before,
+        "bytes_after": size_after,
+        "bytes_reclaimed": max(size_before - size_after, 0),
+    }
+
+def reclaim_space(convert: bool = False) -> dict:
+    """
+    Vacuum incremental + optimize de gym.db y del archivo. Devuelve los tamaños por DB.
+    Con convert=True pasa a auto_vacuum=INCREMENTAL (VACUUM completo) la DB que no lo esté.
+    """
+    with pooled() as conn:
+        result = {"main": _reclaim(conn, "main", db_sqlite.DB_PATH, convert)}
+        if has_archive(conn):
+            result["archive"] = _reclaim(conn, "archive", archive_path(), convert)
+    return result
+
+# --- Programación ---
+def _run(convert: bool = False) -> dict:
+    t0 = time.perf_counter()
+    orphans = collect_orphans()
+    images = collect_unused_images()
+    space = reclaim_space(convert)
+    report = {
+        "at": now_iso(),
+        "orphans": orphans,
+        "images": images,
+        "space": space,
+        "bytes_reclaimed": images["bytes_freed"] + sum(db["bytes_reclaimed"] for db in space.values()),
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+    with transaction() as conn:
+        conn.executemany("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", [
+            ("maintenance_at", report["at"]),
+            ("maintenance_report", json.dumps(report)),
+        ])
+    return report
+
+def run_maintenance(convert: bool = False) -> dict:
+    """
+    Huérfanos, imágenes sin uso y espacio, en ese orden. Guarda y devuelve el informe.
+    convert: ver reclaim_space(); solo desde la CLI, nunca en un thread de la app.
+    """
+    with _lock:
+        return _run(convert)
+
+def last_report() -> dict | None:
+    """Informe de la última mantención (None si nunca corrió)."""
+    with pooled() as conn:
+        row = conn.execute("SELECT value FROM settings WHERE key = 'maintenance_report'").fetchone()
+    return json.loads(row[0]) if row else None
+
+def is_due(interval_hours: float = MAINTENANCE_INTERVAL_HOURS) -> bool:
+    with pooled() as conn:
+        row = conn.execute("SELECT value FROM settings WHERE key = 'maintenance_at'").fetchone()
+    if row is None:
+        return True
+    return datetime.fromisoformat(row[0]) <= datetime.fromisoformat(now_iso()) - timedelta(hours=interval_hours)
+
+def maybe_run() -> dict | None:
+    """Corre la mantención si ya toca (ver MAINTENANCE_INTERVAL_HOURS); si no, None."""
+    if MAINTENANCE_INTERVAL_HOURS <= 0:
+        return None
+    # si ya está corriendo (otro thread), esta vez no
+    if not _lock.acquire(blocking=False):
+        return None
+    try:
+        return _run() if is_due() else None
+    finally:
+        _lock.release()
+
+def schedule():
+    """maybe_run() en un thread de fondo: para llamarlo desde una página sin esperar."""
+    threading.Thread(target=maybe_run, name="gym-maintenance", daemon=True).start()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Mantención de gym.db: huérfanos, imágenes sin uso y espacio libre")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="corre la mantención si ya toca")
+    run.add_argument("--force", action="store_true",
+                     help="correrla aunque no haya pasado el intervalo, y pasar la DB a auto_vacuum=INCREMENTAL")
+    sub.add_parser("status", help="huérfanos actuales e informe de la última mantención")
+    args = ap.parse_args()
+
+    db_sqlite.init_db()
+    if args.cmd == "run":
+        print(run_maintenance(convert=True) if args.force else maybe_run() or "todavía no toca (usa --force)")
+    else:
+        print({"orphans": count_orphans(), "last": last_report()})
@@ -0,0 +1,312 @@
+"""
+Instrumentación opcional. Apagada por defecto; se prende con GYM_METRICS=1.
+
+- Queries: SQL, duración (execute + fetch) y filas, agregadas por SQL. Las que pasan
+  GYM_SLOW_QUERY_MS (default 100) quedan en el log de lentas.
+- Conexiones: tiempo de connect() y de cada commit; set_trace_callback cuenta
+  todos los statements que corre SQLite (incluidos los de executescript).
+- Reruns: tiempo total por página, separado en db / pandas / plotly / resto. Los
+  reruns parciales de un st.fragment se cuentan aparte ("<página> (fragment)").
+
+Se ve en app.py?diag=1 (diagnostics.py) y, si GYM_METRICS_FILE está definido, se
+escribe a ese archivo: texto Prometheus si termina en .prom (se reescribe en cada
+rerun), si no JSONL (un evento por línea: reruns y queries lentas).
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+ENABLED = os.getenv("GYM_METRICS", "") not in ("", "0")
+SLOW_QUERY_MS = float(os.getenv("GYM_SLOW_QUERY_MS", "100"))
+METRICS_FILE = Path(os.environ["GYM_METRICS_FILE"]) if os.getenv("GYM_METRICS_FILE") else None
+
+RECENT_QUERIES = 500
+RECENT_RERUNS = 200
+PHASES = ("db", "pandas", "plotly")
+
+_lock = threading.Lock()
+_file_lock = threading.Lock()
+_queries: dict[str, dict] = {}            # sql normalizado -> count, ms, max_ms, rows
+_slow: deque = deque(maxlen=RECENT_QUERIES)
+_reruns: deque = deque(maxlen=RECENT_RERUNS)
+_pages: dict[str, dict] = {}              # página -> count + ms por fase
+_statements: Counter = Counter()          # verbo (SELECT, INSERT, COMMIT...) -> cantidad
+_timings = {"connect": [0, 0.0], "commit": [0, 0.0]}  # cantidad, ms
+_collectors = []                          # funciones -> {nombre: valor} extra (ej. cache_stats)
+_local = threading.local()                # rerun en curso del thread del script
+
+def _normalize(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+def _write_event(event: dict):
+    if METRICS_FILE is None or METRICS_FILE.suffix == ".prom":
+        return
+    with _file_lock, open(METRICS_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+# --- Queries ---
+class _Query:
+    __slots__ = ("sql", "ms", "rows", "at", "slow")
+
+    def __init__(self, sql: str):
+        self.sql = _normalize(sql)
+        self.ms = 0.0
+        self.rows = 0
+        self.at = time.time()
+        self.slow = False
+
+def _start_query(sql: str) -> _Query:
+    q = _Query(sql)
+    with _lock:
+        agg = _queries.get(q.sql)
+        if agg is None:
+            agg = _queries[q.sql] = {"count": 0, "ms": 0.0, "max_ms": 0.0, "rows": 0}
+        agg["count"] += 1
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun["queries"] += 1
+    return q
+
+def _observe_query(q: _Query, ms: float, rows: int):
+    """Suma `ms` y `rows` a la query: primero el execute, después cada fetch."""
+    q.ms += ms
+    q.rows += rows
+    with _lock:
+        agg = _queries[q.sql]
+        agg["ms"] += ms
+        agg["rows"] += rows
+        agg["max_ms"] = max(agg["max_ms"], q.ms)
+        newly_slow = not q.slow and q.ms >= SLOW_QUERY_MS
+        if newly_slow:
+            q.slow = True
+            _slow.append(q)
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun["db"] += ms
+    if newly_slow:
+        _write_event({"type": "slow_query", "at": round(q.at, 3), "sql": q.sql, "ms": round(q.ms, 3)})
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor que mide cada execute y los fetch que le siguen."""
+    _query = None
+
+    def _timed(self, method, sql, *args):
+        self._query = _start_query(sql)
+        t0 = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            _observe_query(self._query, (time.perf_counter() - t0) * 1000, max(self.rowcount, 0))
+
+    def execute(self, sql, params=()):
+        return self._timed(super().execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed(super().executemany, sql, seq_of_params)
+
+    def executescript(self, script):
+        return self._timed(super().executescript, script)
+
+    def _fetch(self, method, *args):
+        t0 = time.perf_counter()
+        rows = method(*args)
+        if self._query is not None:
+            n = len(rows) if isinstance(rows, list) else int(rows is not None)
+            _observe_query(self._query, (time.perf_counter() - t0) * 1000, n)
+        return rows
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+class TracedConnection(sqlite3.Connection):
+    """Conexión cuyos cursores (también los de conn.execute) pasan por TracedCursor."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def commit(self):
+        t0 = time.perf_counter()
+        super().commit()
+        observe("commit", t0)
+
+def connection_factory():
+    """Clase para el `factory=` de sqlite3.connect()."""
+    return TracedConnection if ENABLED else sqlite3.Connection
+
+def trace_statement(sql: str):
+    # set_trace_callback: cada statement que ejecuta SQLite, incluidos BEGIN/COMMIT y executescript
+    verb = sql.lstrip().split(None, 1)[0].upper() if sql and sql.strip() else "?"
+    with _lock:
+        _statements[verb] += 1
+
+def instrument(conn: sqlite3.Connection, started: float):
+    """Se llama al final de db_sqlite.connect(): registra el trace y el tiempo de apertura."""
+    conn.set_trace_callback(trace_statement)
+    observe("connect", started)
+
+def observe(kind: str, started: float):
+    ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        _timings[kind][0] += 1
+        _timings[kind][1] += ms
+
+def register_collector(fn):
+    """`fn()` -> {nombre: número}; se agrega al snapshot y al texto Prometheus."""
+    _collectors.append(fn)
+
+# --- Reruns ---
+def page(name: str):
+    """
+    Empieza a medir un rerun de la página `name` (arriba del script). Si el rerun
+    anterior no llegó a page_done() (st.stop, st.rerun) se descarta.
+    """
+    if not ENABLED:
+        return
+    _local.rerun = {"page": name, "started": time.perf_counter(), "queries": 0, **{p: 0.0 for p in PHASES}}
+
+@contextmanager
+def _phase(rerun: dict, name: str):
+    # lo que se vaya a la DB dentro de la fase ya se cuenta en "db"
+    db_before = rerun["db"]
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        rerun[name] += (time.perf_counter() - t0) * 1000 - (rerun["db"] - db_before)
+
+def phase(name: str):
+    """`with metrics.phase("pandas"):` suma ese bloque a la fase `name` del rerun en curso."""
+    rerun = getattr(_local, "rerun", None) if ENABLED else None
+    return _phase(rerun, name) if rerun is not None else nullcontext()
+
+@contextmanager
+def fragment(page_name: str):
+    """
+    Envuelve el cuerpo de un st.fragment. Dentro de un rerun completo no hace nada;
+    si el fragment corre solo (rerun parcial) se mide como rerun de "<página> (fragment)".
+    """
+    if not ENABLED or getattr(_local, "rerun", None) is not None:
+        yield
+        return
+    page(f"{page_name} (fragment)")
+    try:
+        yield
+    finally:
+        page_done()
+
+def page_done():
+    """Cierra el rerun en curso (al final del script) y lo exporta."""
+    rerun = getattr(_local, "rerun", None) if ENABLED else None
+    if rerun is None:
+        return
+    _local.rerun = None
+    total = (time.perf_counter() - rerun.pop("started")) * 1000
+    event = {
+        "type": "rerun",
+        "at": round(time.time(), 3),
+        "page": rerun["page"],
+        "queries": rerun["queries"],
+        "total_ms": round(total, 3),
+        **{f"{p}_ms": round(rerun[p], 3) for p in PHASES},
+        "other_ms": round(total - sum(rerun[p] for p in PHASES), 3),
+    }
+    with _lock:
+        _reruns.append(event)
+        agg = _pages.setdefault(event["page"], {"count": 0, **{p: 0.0 for p in PHASES + ("other", "total")}})
+        agg["count"] += 1
+        for p in PHASES + ("other", "total"):
+            agg[p] += event[f"{p}_ms"]
+    _write_event(event)
+    if METRICS_FILE is not None and METRICS_FILE.suffix == ".prom":
+        write_prometheus(METRICS_FILE)
+
+# --- Exportar ---
+def snapshot() -> dict:
+    with _lock:
+        queries = sorted(
+            ({"sql": sql, **agg} for sql, agg in _queries.items()),
+            key=lambda q: q["ms"], reverse=True,
+        )
+        data = {
+            "queries": queries,
+            "slow": [{"at": q.at, "sql": q.sql, "ms": q.ms, "rows": q.rows} for q in _slow],
+            "reruns": list(_reruns),
+            "pages": {k: dict(v) for k, v in _pages.items()},
+            "statements": dict(_statements),
+            "timings": {k: {"count": n, "ms": ms} for k, (n, ms) in _timings.items()},
+        }
+    data["collected"] = {k: v for fn in _collectors for k, v in fn().items()}
+    return data
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def prometheus_text() -> str:
+    snap = snapshot()
+    lines = []
+
+    def metric(name, kind, samples):
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+    metric("gym_queries_total", "counter", [(f'{{sql="{_label(q["sql"])}"}}', q["count"]) for q in snap["queries"]])
+    metric("gym_query_seconds_total", "counter", [(f'{{sql="{_label(q["sql"])}"}}', q["ms"] / 1000) for q in snap["queries"]])
+    metric("gym_query_rows_total", "counter", [(f'{{sql="{_label(q["sql"])}"}}', q["rows"]) for q in snap["queries"]])
+    metric("gym_query_max_seconds", "gauge", [(f'{{sql="{_label(q["sql"])}"}}', q["max_ms"] / 1000) for q in snap["queries"]])
+    metric("gym_slow_queries", "gauge", [("", len(snap["slow"]))])
+    metric("gym_statements_total", "counter", [(f'{{verb="{_label(v)}"}}', n) for v, n in snap["statements"].items()])
+    for kind, t in snap["timings"].items():
+        metric(f"gym_{kind}_total", "counter", [("", t["count"])])
+        metric(f"gym_{kind}_seconds_total", "counter", [("", t["ms"] / 1000)])
+    metric("gym_reruns_total", "counter", [(f'{{page="{_label(p)}"}}', a["count"]) for p, a in snap["pages"].items()])
+    metric("gym_rerun_seconds_total", "counter", [
+        (f'{{page="{_label(p)}",phase="{ph}"}}', a[ph] / 1000)
+        for p, a in snap["pages"].items() for ph in PHASES + ("other",)
+    ])
+    for name, value in snap["collected"].items():
+        metric(f"gym_{name}", "gauge", [("", value)])
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: Path):
+    # a un temporal y rename: el scraper nunca lee un archivo a medias
+    tmp = Path(f"{path}.tmp")
+    with _file_lock:
+        tmp.write_text(prometheus_text(), encoding="utf-8")
+        tmp.replace(path)
+
+def reset():
+    with _lock:
+        _queries.clear()
+        _slow.clear()
+        _reruns.clear()
+        _pages.clear()
+        _statements.clear()
+        for t in _timings.values():
+            t[:] = [0, 0.0]
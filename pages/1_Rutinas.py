@@ -1,9 +1,15 @@
 import streamlit as st
+import metrics
+import warmup
 from db_sqlite import (
-    list_routines, create_routine, rename_routine, delete_routine,
-    list_exercises, add_exercise, update_exercise, delete_exercise,
-    save_exercise_image
+    init_db, list_routines, create_routine, rename_routine, delete_routine,
+    list_exercises, add_exercise, update_exercises_bulk,
 )
+from images import save_exercise_image, image_variant
+
+metrics.page("Rutinas")
+init_db()
+warmup.start()
 
 st.title("Rutinas")
 
@@ -17,6 +23,7 @@ with st.expander("➕ Crear rutina", expanded=True):
 routines = list_routines()
 if not routines:
     st.info("Aún no tienes rutinas. Crea una arriba.")
+    metrics.page_done()
     st.stop()
 
 # --- Seleccionar rutina ---
@@ -56,35 +63,84 @@ with st.expander("➕ Agregar ejercicio", expanded=True):
 
 if not exs:
     st.info("Agrega ejercicios para esta rutina.")
+    metrics.page_done()
     st.stop()
 
-for ex in exs:
-    with st.container(border=True):
-        c1, c2, c3, c4, c5 = st.columns([3,1,1,1,1])
-        with c1:
-            n = st.text_input("Ejercicio", value=ex["name"], key=f"n_{ex['id']}")
-        with c2:
-            oi = st.number_input("Orden", min_value=0, value=ex["order_index"], step=1, key=f"oi_{ex['id']}")
-        with c3:
-            ds = st.number_input("Sets", min_value=1, max_value=10, value=ex["default_sets"], step=1, key=f"ds_{ex['id']}")
-        with c4:
-            rs = st.number_input("Rest(s)", min_value=0, max_value=600, value=ex["default_rest_seconds"], step=5, key=f"rs_{ex['id']}")
-        with c5:
-            if st.button("🗑️", key=f"del_{ex['id']}"):
-                delete_exercise(ex["id"])
-                st.rerun()
-        # Mostrar imagen actual si existe
-        if ("image_path" in ex.keys()) and ex["image_path"]:
-            st.image(ex["image_path"], caption="Imagen actual", width=220)
-        
-        new_img = st.file_uploader(
-            "Reemplazar imagen (opcional)",
-            type=["png", "jpg", "jpeg", "webp"],
-            key=f"img_{ex['id']}"
-        )
-
-        if st.button("Guardar cambios", key=f"save_{ex['id']}"):
-            new_path = save_exercise_image(new_img) if new_img is not None else None
-            update_exercise(ex["id"], n.strip(), int(oi), int(ds), int(rs), new_path)
-            st.rerun()
+def _save_all(routine_id: int, exs):
+    # callback del form: corre antes del rerun, así el editor ya se dibuja con lo guardado
+    changes, delete_ids = {}, []
+    for ex in exs:
+        if st.session_state.get(f"del_{ex['id']}"):
+            delete_ids.append(ex["id"])
+            continue
+        edited = {
+            "name": st.session_state[f"n_{ex['id']}"].strip() or ex["name"],
+            "order_index": int(st.session_state[f"oi_{ex['id']}"]),
+            "default_sets": int(st.session_state[f"ds_{ex['id']}"]),
+            "default_rest_seconds": int(st.session_state[f"rs_{ex['id']}"]),
+        }
+        new_img = st.session_state.get(f"img_{ex['id']}")
+        if new_img is not None:
+            edited["image_path"] = save_exercise_image(new_img)
+        diff = {k: v for k, v in edited.items() if v != ex[k]}
+        if diff:
+            changes[ex["id"]] = diff
+
+    if changes or delete_ids:
+        update_exercises_bulk(routine_id, changes, delete_ids)
+        st.session_state.rutinas_msg = f"✅ Guardado: {len(changes)} editados, {len(delete_ids)} eliminados."
+    else:
+        st.session_state.rutinas_msg = "Sin cambios."
+
+# con rutinas largas las imágenes se cargan recién al pedirlas
+LAZY_IMAGES_AFTER = 6
+
+@st.fragment
+def exercise_editor(routine_id: int):
+    """
+    Tarjetas de edición como fragment: el form no re-ejecuta nada mientras se edita,
+    y guardar o mostrar imágenes re-ejecuta solo este bloque, no la página entera.
+    """
+    with metrics.fragment("Rutinas"):
+        exs = list_exercises(routine_id)
+        if not exs:
+            st.info("Agrega ejercicios para esta rutina.")
+            return
+        show_images = st.toggle("🖼️ Mostrar imágenes", value=len(exs) <= LAZY_IMAGES_AFTER, key=f"imgs_{routine_id}")
+        with st.form(f"exercises_{routine_id}"):
+            for ex in exs:
+                with st.container(border=True):
+                    c1, c2, c3, c4, c5 = st.columns([3,1,1,1,1])
+                    with c1:
+                        st.text_input("Ejercicio", value=ex["name"], key=f"n_{ex['id']}")
+                    with c2:
+                        st.number_input("Orden", min_value=0, value=ex["order_index"], step=1, key=f"oi_{ex['id']}")
+                    with c3:
+                        st.number_input("Sets", min_value=1, max_value=10, value=ex["default_sets"], step=1, key=f"ds_{ex['id']}")
+                    with c4:
+                        st.number_input("Rest(s)", min_value=0, max_value=600, value=ex["default_rest_seconds"], step=5, key=f"rs_{ex['id']}")
+                    with c5:
+                        st.checkbox("🗑️ Eliminar", key=f"del_{ex['id']}")
+                    # Mostrar imagen actual si existe
+                    if show_images and ("image_path" in ex.keys()) and ex["image_path"]:
+                        img = image_variant(ex["image_path"], 220)
+                        if img is None:
+                            st.caption("La imagen actual ya no está en disco.")
+                        else:
+                            st.image(img, caption="Imagen actual", width=220)
+
+                    st.file_uploader(
+                        "Reemplazar imagen (opcional)",
+                        type=["png", "jpg", "jpeg", "webp"],
+                        key=f"img_{ex['id']}"
+                    )
+
+            # un solo submit para toda la rutina: una transacción y un rerun
+            st.form_submit_button("💾 Guardar cambios", type="primary", on_click=_save_all, args=(routine_id, exs))
+
+        if "rutinas_msg" in st.session_state:
+            st.caption(st.session_state.pop("rutinas_msg"))
+
+exercise_editor(routine_id)
 
+metrics.page_done()
@@ -1,26 +1,28 @@
 import streamlit as st
+import db_sqlite
+import metrics
+import warmup
+import maintenance
+import math
 import time
-import os
-from datetime import datetime
 from pathlib import Path
-from db_sqlite import list_routines, list_exercises, start_session, finish_session, log_set
+from db_sqlite import (
+    init_db, list_routines, list_exercises, start_session, finish_session, enqueue_set, check_personal_record,
+    last_performance, day_date, pending_sets,
+)
+from backup import full_backup
+from images import image_variant
 
-st.title("Entrenar")
-
-def get_db_path() -> str:
-    # Debe coincidir con db_sqlite.py si usas env var
-    return os.getenv("GYM_DB_PATH", "gym.db")
+metrics.page("Entrenar")
+init_db()
+warmup.start()
 
-def make_backup_bytes() -> tuple[bytes, str]:
-    db_path = get_db_path()
-    data = Path(db_path).read_bytes()
-    ts = datetime.now().strftime("%Y%m%d_%H%M")
-    filename = f"gym_backup_{ts}.db"
-    return data, filename
+st.title("Entrenar")
 
 routines = list_routines()
 if not routines:
     st.info("Primero crea una rutina en la pestaña Rutinas.")
+    metrics.page_done()
     st.stop()
 
 # Prefill desde Home (si venías desde app.py)
@@ -43,6 +45,7 @@ st.session_state.pop("selected_routine_id", None)
 exs = list_exercises(routine_id)
 if not exs:
     st.info("Esta rutina no tiene ejercicios aún.")
+    metrics.page_done()
     st.stop()
 
 # --- estado sesión ---
@@ -54,18 +57,25 @@ if st.session_state.session_id is None:
         st.session_state.session_id = start_session(routine_id)
         st.session_state.set_done = {}   # (exercise_id, set_index) -> bool
         st.session_state.set_extra = {}  # exercise_id -> extra sets
+        st.session_state.set_pr = {}     # (exercise_id, set_index) -> récords que batió
         st.rerun()
 else:
     st.success(f"Sesión activa: {st.session_state.session_id}")
     if st.button("⏹️ Finalizar sesión"):
         finish_session(st.session_state.session_id)
         st.session_state.session_id = None
-
-        # ✅ backup automático (genera bytes + nombre y lo deja listo para descargar)
+        # las estadísticas solo cambian al registrar sets: se precalculan ahora, en segundo plano
+        # (import acá: stats trae pandas y esta página no lo necesita para nada más)
+        import stats
+        stats.schedule_snapshot()
+        # y si toca, la mantención (huérfanos, imágenes sin uso, vacuum incremental)
+        maintenance.schedule()
+
+        # ✅ backup automático (copia consistente a un archivo temporal; en session_state solo va la ruta)
         try:
-            b, fname = make_backup_bytes()
-            st.session_state.last_backup_bytes = b
-            st.session_state.last_backup_name = fname
+            path = full_backup()
+            st.session_state.last_backup_path = str(path)
+            st.session_state.last_backup_name = path.name
             st.session_state.last_backup_ready = True
             st.session_state.last_backup_error = None
         except Exception as e:
@@ -75,16 +85,17 @@ else:
         st.rerun()
 
 # --- Backup listo para descargar (aparece después de finalizar sesión) ---
-if st.session_state.get("last_backup_ready"):
+if st.session_state.get("last_backup_ready") and Path(st.session_state["last_backup_path"]).exists():
     st.success("✅ Sesión finalizada. Backup listo para descargar.")
-    st.download_button(
-        label=f"⬇️ Descargar backup ({st.session_state.get('last_backup_name','gym_backup.db')})",
-        data=st.session_state["last_backup_bytes"],
-        file_name=st.session_state.get("last_backup_name", "gym_backup.db"),
-        mime="application/octet-stream",
-        type="primary",
-        use_container_width=True,
-    )
+    with open(st.session_state["last_backup_path"], "rb") as backup_file:
+        st.download_button(
+            label=f"⬇️ Descargar backup ({st.session_state.get('last_backup_name','gym_backup.db')})",
+            data=backup_file,
+            file_name=st.session_state.get("last_backup_name", "gym_backup.db"),
+            mime="application/octet-stream",
+            type="primary",
+            use_container_width=True,
+        )
 elif st.session_state.get("last_backup_error"):
     st.warning(f"⚠️ No pude generar el backup automático: {st.session_state['last_backup_error']}")
 
@@ -92,58 +103,153 @@ elif st.session_state.get("last_backup_error"):
 
 st.divider()
 
-rest_default = st.number_input("Descanso global (segundos)", min_value=0, max_value=600, value=60, step=5)
+rest_override = st.number_input(
+    "Descanso global (segundos, 0 = usar el de cada ejercicio)", min_value=0, max_value=600, value=0, step=5
+)
 
 BEEP_PATH = Path("assets/beep.wav")
 
-def run_timer(seconds: int):
-    ph = st.empty()
-    for t in range(seconds, -1, -1):
-        ph.info(f"⏱️ Descanso: {t}s")
-        time.sleep(1)
-    ph.success("✅ Listo!")
-
-    # 🔊 Beep al terminar
-    if BEEP_PATH.exists():
-        st.audio(str(BEEP_PATH), autoplay=True)
+def start_timer(seconds: int, label: str):
+    # el timer vive en session_state: un rerun (otro check, agregar serie) no lo corta
+    st.session_state.timer_end = time.time() + seconds
+    st.session_state.timer_label = label
+    st.session_state.timer_done = False
+
+def rest_timer():
+    """
+    Cuenta regresiva como fragment: se refresca sola cada 1s sin re-ejecutar la
+    página ni bloquear el script. Hace polling mientras hay una sesión activa: las
+    tarjetas (también fragments) inician el descanso sin rerun completo, así que el
+    timer tiene que enterarse solo.
+    """
+    @st.fragment(run_every=1)
+    def _timer():
+        end = st.session_state.get("timer_end")
+        if end is not None:
+            left = int(math.ceil(end - time.time()))
+            if left > 0:
+                st.info(f"⏱️ Descanso ({st.session_state.timer_label}): {left}s")
+                return
+            st.session_state.timer_end = None
+            st.session_state.timer_done = True
+            st.session_state.timer_beep = True
+
+        if st.session_state.get("timer_done"):
+            st.success("✅ Listo!")
+            # 🔊 Beep al terminar (una sola vez, no en cada refresco)
+            if st.session_state.pop("timer_beep", False) and BEEP_PATH.exists():
+                st.audio(str(BEEP_PATH), autoplay=True)
+
+    _timer()
 
 if st.session_state.session_id is None:
+    metrics.page_done()
     st.stop()
 
+# el escritor de fondo reintenta solo; mientras falle, los sets siguen en memoria y en el journal
+if db_sqlite.writer_error:
+    st.warning(
+        f"⚠️ No se pudieron guardar {pending_sets()} sets en la base ({db_sqlite.writer_error}). "
+        "Siguen en el journal y se reintenta cada pocos segundos; no cierres la app todavía."
+    )
+
+# el timer se dibuja arriba de las tarjetas, pero se llena al final (después de procesar los checks)
+timer_slot = st.container()
+
+PR_LABELS = {"weight": "peso para esas reps", "e1rm": "1RM estimada", "volume": "volumen de la sesión"}
+
+def add_set(ex_id: int):
+    st.session_state.set_extra[ex_id] = st.session_state.set_extra.get(ex_id, 0) + 1
+
+@st.fragment
+def exercise_card(ex, session_id: int, rest_seconds: int, show_image: bool, last=None):
+    """
+    Una tarjeta por ejercicio. Marcar una serie o agregar una re-ejecuta solo esta
+    tarjeta, no la página (ni las consultas de rutinas/ejercicios ni las otras tarjetas).
+    `last` (LastPerformance o None) prellena peso y reps con el top set de la vez anterior.
+    """
+    with metrics.fragment("Entrenar"):
+        ex_id = ex["id"]
+        base_sets = int(ex["default_sets"])
+        extra = st.session_state.set_extra.get(ex_id, 0)
+        total_sets = base_sets + extra
+
+        with st.container(border=True):
+            st.subheader(ex["name"])
+
+            # imagen diferida: solo la del ejercicio en curso se carga de entrada
+            if ("image_path" in ex.keys()) and ex["image_path"]:
+                if st.toggle("📷 Imagen", value=show_image, key=f"img_{ex_id}"):
+                    img = image_variant(ex["image_path"], 260)
+                    if img is None:
+                        st.caption("La imagen ya no está en disco.")
+                    else:
+                        st.image(img, width=260)
+
+            if last is not None:
+                done_sets = " · ".join(f"{r}×{w:g}" for _, r, w in last.sets)
+                st.caption(f"Última vez ({day_date(last.local_day):%d/%m/%Y}): {done_sets}")
+            _, last_reps, last_weight = last.top_set if last is not None else (None, 10, 0.0)
+
+            # inputs globales por ejercicio
+            cA, cB = st.columns(2)
+            with cA:
+                weight = st.number_input("Peso (kg)", min_value=0.0, value=float(last_weight), step=1.0, key=f"w_{ex_id}")
+            with cB:
+                reps = st.number_input("Reps", min_value=1, value=max(int(last_reps), 1), step=1, key=f"r_{ex_id}")
+
+            set_pr = st.session_state.setdefault("set_pr", {})
+            cols = st.columns([1]*total_sets + [2])
+            for i in range(total_sets):
+                key = (ex_id, i)
+                done = st.session_state.set_done.get(key, False)
+                label = f"S{i+1}"
+                with cols[i]:
+                    new_done = st.checkbox(label, value=done, key=f"cb_{ex_id}_{i}")
+
+                # Si lo marca recién ahora: log + timer (no bloquea: el resto de la página sigue)
+                if (not done) and new_done:
+                    st.session_state.set_done[key] = True
+                    # PR contra el índice de récords, antes de encolar el set
+                    records = check_personal_record(session_id, ex_id, int(reps), float(weight))
+                    if records:
+                        set_pr[key] = records
+                        st.toast(f"🏆 ¡Nuevo récord en {ex['name']}! ({', '.join(PR_LABELS[r] for r in records)})")
+                    enqueue_set(session_id, ex_id, i+1, int(reps), float(weight))
+                    start_timer(rest_seconds, ex["name"])
+
+            with cols[-1]:
+                # callback: la serie nueva ya aparece en el mismo rerun de la tarjeta
+                st.button("➕ Agregar 1 serie", key=f"add_{ex_id}", on_click=add_set, args=(ex_id,))
+
+            prs = [f"S{i+1}: {', '.join(PR_LABELS[r] for r in set_pr[(ex_id, i)])}"
+                   for i in range(total_sets) if set_pr.get((ex_id, i))]
+            if prs:
+                st.caption("🏆 Récords: " + " · ".join(prs))
+
+# lo hecho la última vez, para toda la rutina en una consulta; se guarda mientras dure la sesión
+perf_key = (st.session_state.session_id, routine_id)
+if st.session_state.get("last_perf_key") != perf_key:
+    st.session_state.last_perf = last_performance(routine_id, st.session_state.session_id)
+    st.session_state.last_perf_key = perf_key
+last_perf = st.session_state.last_perf
+
+# ejercicio en curso = el primero con series pendientes
+current_id = next((
+    ex["id"] for ex in exs
+    if not all(st.session_state.set_done.get((ex["id"], i), False)
+               for i in range(int(ex["default_sets"]) + st.session_state.set_extra.get(ex["id"], 0)))
+), None)
+
 for ex in exs:
-    ex_id = ex["id"]
-    base_sets = int(ex["default_sets"])
-    extra = st.session_state.set_extra.get(ex_id, 0)
-    total_sets = base_sets + extra
-
-    with st.container(border=True):
-        st.subheader(ex["name"])
-
-        if ("image_path" in ex.keys()) and ex["image_path"]:
-            st.image(ex["image_path"], width=260)
-
-        # inputs globales por ejercicio
-        cA, cB = st.columns(2)
-        with cA:
-            weight = st.number_input("Peso (kg)", min_value=0.0, value=0.0, step=1.0, key=f"w_{ex_id}")
-        with cB:
-            reps = st.number_input("Reps", min_value=1, value=10, step=1, key=f"r_{ex_id}")
-
-        cols = st.columns([1]*total_sets + [2])
-        for i in range(total_sets):
-            key = (ex_id, i)
-            done = st.session_state.set_done.get(key, False)
-            label = f"S{i+1}"
-            with cols[i]:
-                new_done = st.checkbox(label, value=done, key=f"cb_{ex_id}_{i}")
-
-            # Si lo marca recién ahora: log + timer
-            if (not done) and new_done:
-                st.session_state.set_done[key] = True
-                log_set(st.session_state.session_id, ex_id, i+1, int(reps), float(weight))
-                run_timer(int(rest_default))
-
-        with cols[-1]:
-            if st.button("➕ Agregar 1 serie", key=f"add_{ex_id}"):
-                st.session_state.set_extra[ex_id] = extra + 1
-                st.rerun()
+    exercise_card(
+        ex, st.session_state.session_id,
+        int(rest_override or ex["default_rest_seconds"]),
+        show_image=ex["id"] == current_id,
+        last=last_perf.get(ex["id"]),
+    )
+
+with timer_slot:
+    rest_timer()
+
+metrics.page_done()
@@ -1,33 +1,57 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
+import metrics
+import warmup
 import os
 from pathlib import Path
-from db_sqlite import stats_sets
+from db_sqlite import init_db, has_sets, archive_path, personal_records
+from backup import (
+    full_backup, incremental_backup, archive_backup, last_backup,
+    stage_upload, restore_backup, merge_backup, BackupError
+)
+
+metrics.page("Estadísticas")
+init_db()
+warmup.start()
 
 st.title("Estadísticas")
 
 def get_db_path() -> str:
     return os.getenv("GYM_DB_PATH", "gym.db")
 
-rows = stats_sets()
-if not rows:
-    st.info("Aún no hay sets registrados. Ve a Entrenar y marca series.")
-    st.stop()
-
 st.subheader("Backup y restauración")
 
 db_path = get_db_path()
 
 # --- Descargar DB actual ---
 if Path(db_path).exists():
-    st.download_button(
-        label="⬇️ Descargar backup completo (gym.db)",
-        data=Path(db_path).read_bytes(),
-        file_name="gym_backup.db",
-        mime="application/octet-stream",
-        use_container_width=True
-    )
+    prev = last_backup()
+    if prev:
+        st.caption(f"Último backup: {prev['created_at']} UTC ({prev['kind']})")
+
+    compress = st.checkbox("Comprimir (.gz)", value=False)
+    cA, cB = st.columns(2)
+    with cA:
+        if st.button("📦 Generar backup completo", use_container_width=True):
+            st.session_state.stats_backup_path = str(full_backup(compress))
+    with cB:
+        if st.button("➕ Exportar solo sets nuevos", use_container_width=True):
+            path = incremental_backup(compress)
+            st.session_state.stats_backup_path = str(path) if path else None
+            if path is None:
+                st.info("No hay sets nuevos desde el último backup.")
+    if archive_path().exists() and st.button("🗄️ Copiar sets archivados", use_container_width=True):
+        st.session_state.stats_backup_path = str(archive_backup(compress))
+
+    backup_path = st.session_state.get("stats_backup_path")
+    if backup_path and Path(backup_path).exists():
+        with open(backup_path, "rb") as backup_file:
+            st.download_button(
+                label=f"⬇️ Descargar {Path(backup_path).name}",
+                data=backup_file,
+                file_name=Path(backup_path).name,
+                mime="application/gzip" if backup_path.endswith(".gz") else "application/octet-stream",
+                use_container_width=True
+            )
 else:
     st.warning(f"No encuentro la base de datos en: {db_path}")
 
@@ -35,118 +59,180 @@ st.divider()
 
 # --- Restaurar desde backup ---
 st.markdown("### Restaurar desde un backup (.db)")
-st.caption("Sube tu archivo .db. Esto reemplaza la base actual y reinicia la app.")
+st.caption(
+    "Sube tu archivo .db (o .db.gz). Se valida antes de tocar nada. "
+    "'Reemplazar' cambia la base completa; 'Combinar' solo agrega los sets que falten."
+)
+
+if st.session_state.get("restore_msg"):
+    st.success(st.session_state.pop("restore_msg"))
 
-uploaded = st.file_uploader("Subir backup .db", type=["db"])
+uploaded = st.file_uploader("Subir backup .db", type=["db", "gz"])
+mode = st.radio("Modo", ["Reemplazar base actual", "Combinar sets con la base actual"], horizontal=True)
+replace = mode.startswith("Reemplazar")
 
-confirm = st.checkbox("Entiendo que esto reemplaza mi base actual", value=False)
+confirm = st.checkbox("Entiendo que esto reemplaza mi base actual", value=False) if replace else True
 
 if uploaded and confirm:
-    if st.button("♻️ Restaurar backup", type="primary"):
+    if st.button("♻️ Restaurar backup" if replace else "🔀 Combinar backup", type="primary"):
+        staged = None
         try:
-            Path(db_path).write_bytes(uploaded.read())
-            st.success("✅ Backup restaurado. Reiniciando app…")
+            # a disco por partes, validar y recién ahí reemplazar (rename atómico) o combinar
+            staged = stage_upload(uploaded)
+            if replace:
+                previous = restore_backup(staged)
+                st.session_state.restore_msg = f"✅ Backup restaurado. La base anterior quedó en {previous}"
+            else:
+                result = merge_backup(staged)
+                st.session_state.restore_msg = f"✅ Backup combinado: {result['sets_added']} sets nuevos."
             st.rerun()
+        except BackupError as e:
+            st.error(f"❌ Backup inválido: {e}")
         except Exception as e:
             st.error(f"❌ Error restaurando backup: {e}")
+        finally:
+            if staged is not None:
+                staged.unlink(missing_ok=True)
 
 st.divider()
 
+# --- Importar / exportar historial ---
+st.markdown("### Importar / exportar historial (CSV o Parquet)")
+st.caption(
+    "Columnas: created_at (UTC), routine, exercise, reps, weight; opcionales set_index y session_id. "
+    "Rutinas y ejercicios se buscan por nombre y se crean si faltan. Importar dos veces el mismo archivo no duplica sets."
+)
 
+if st.session_state.get("import_msg"):
+    st.success(st.session_state.pop("import_msg"))
+
+history_file = st.file_uploader("Subir historial", type=["csv", "parquet"])
+if history_file and st.button("📥 Importar sets", type="primary"):
+    # transfer trae pyarrow: solo se importa al usarlo
+    from transfer import import_sets, TransferError
+    try:
+        result = import_sets(history_file)
+        st.session_state.import_msg = (
+            f"✅ {result['sets_added']} sets importados de {result['rows']} filas "
+            f"({result['sessions_created']} sesiones y {result['exercises_created']} ejercicios nuevos)."
+        )
+        st.rerun()
+    except TransferError as e:
+        st.error(f"❌ Archivo inválido: {e}")
+
+cA, cB = st.columns(2)
+with cA:
+    export_fmt = st.radio("Formato", ["parquet", "csv"], horizontal=True, key="export_fmt")
+with cB:
+    if st.button("📤 Exportar todos los sets", use_container_width=True):
+        from transfer import export_file
+        st.session_state.export_path = str(export_file(export_fmt))
+
+export_path = st.session_state.get("export_path")
+if export_path and Path(export_path).exists():
+    with open(export_path, "rb") as export:
+        st.download_button(
+            label=f"⬇️ Descargar {Path(export_path).name}",
+            data=export,
+            file_name=Path(export_path).name,
+            use_container_width=True
+        )
+
+st.divider()
+
+if not has_sets():
+    st.info("Aún no hay sets registrados. Ve a Entrenar y marca series.")
+    metrics.page_done()
+    st.stop()
+
+# pandas y plotly son lo más caro de importar: solo cuando hay algo que graficar
+with metrics.phase("pandas"):
+    import pandas as pd
+    import stats
+with metrics.phase("plotly"):
+    import plotly.express as px
+    import charts
 
-df = pd.DataFrame([dict(r) for r in rows])
-df["created_at"] = (
-    pd.to_datetime(df["created_at"], utc=True)
-      .dt.tz_convert("America/Santiago")
-      .dt.tz_localize(None)
-)
 
-df["session_date"] = df["created_at"].dt.date  # <-- clave: date sin hora
 
 # -------------------------
 # Filtro temporal
 # -------------------------
 st.subheader("Filtros")
-range_opt = st.selectbox(
-    "Rango",
-    ["Últimas 4 semanas", "Últimas 8 semanas", "Últimos 3 meses", "Todo"],
-    index=0
-)
-
-now = pd.Timestamp.now(tz=None)
-if range_opt == "Últimas 4 semanas":
-    cutoff = now - pd.Timedelta(days=28)
-    df = df[df["created_at"] >= cutoff]
-elif range_opt == "Últimas 8 semanas":
-    cutoff = now - pd.Timedelta(days=56)
-    df = df[df["created_at"] >= cutoff]
-elif range_opt == "Últimos 3 meses":
-    cutoff = now - pd.Timedelta(days=90)
-    df = df[df["created_at"] >= cutoff]
-
-if df.empty:
+RANGE_DAYS = {
+    "Últimas 4 semanas": 28,
+    "Últimas 8 semanas": 56,
+    "Últimos 3 meses": 90,
+    "Todo": None,
+}
+range_opt = st.selectbox("Rango", list(RANGE_DAYS.keys()), index=0)
+days = RANGE_DAYS[range_opt]
+
+# el corte se aplica en SQLite y el resultado queda memorizado hasta el próximo commit
+with metrics.phase("pandas"):
+    res = stats.compute(days)
+if res.empty:
     st.warning("No hay registros en el rango seleccionado.")
+    metrics.page_done()
     st.stop()
 
-st.caption(f"Registros (sets) en rango: {len(df)}")
-st.dataframe(df.sort_values("created_at", ascending=False), use_container_width=True)
+df = res.sets
 
-# -------------------------
-# Métricas derivadas
-# -------------------------
-# fecha "de sesión" (día)
-df["session_date"] = df["created_at"].dt.date
-
-# e1RM (Epley). Si weight=0, queda 0.
-df["e1rm"] = df["weight"] * (1 + (df["reps"] / 30.0))
-
-# ID de sesión simple: (día + rutina)
-df["session_id"] = df["session_date"].astype(str) + " | " + df["routine"].astype(str)
+shown = f" · mostrando los {len(df)} más recientes" if len(df) < res.n_sets else ""
+st.caption(f"Registros (sets) en rango: {res.n_sets}{shown}")
+with metrics.phase("pandas"):
+    st.dataframe(df.drop(columns=["session_id", "exercise_id", "e1rm"]), use_container_width=True)
 
 # -------------------------
 # 1) Volumen por ejercicio
 # -------------------------
 st.subheader("Volumen por ejercicio (rango seleccionado)")
-vol = (
-    df.groupby(["exercise"], as_index=False)["volume"]
-      .sum()
-      .sort_values("volume", ascending=False)
-)
-fig = px.bar(vol, x="exercise", y="volume")
-st.plotly_chart(fig, use_container_width=True)
+vol = res.volume
+with metrics.phase("plotly"):
+    fig = px.bar(vol, x="exercise", y="volume")
+    st.plotly_chart(fig, use_container_width=True)
+
+exercise_ids = dict(zip(vol["exercise"], vol["exercise_id"]))
+exercise_names = sorted(exercise_ids.keys())
 
 # -------------------------
 # 2) Progreso por SET (tal como lo tienes)
 # -------------------------
 st.subheader("Progreso por set (peso)")
-ex = st.selectbox("Ejercicio (por set)", sorted(df["exercise"].unique()), key="ex_set")
-df_set = df[df["exercise"] == ex].sort_values("created_at")
+ex = st.selectbox("Ejercicio (por set)", exercise_names, key="ex_set")
+
+def downsample_note(chart):
+    if chart.downsampled:
+        st.caption(f"Mostrando {chart.points} de {chart.total} puntos (submuestreo que conserva picos y valles).")
+
+# figuras memorizadas por (gráfico, ejercicio, rango) hasta el próximo commit;
+# con historiales largos se submuestrean a un máximo de puntos y van en WebGL
+def set_chart():
+    df_set = stats.exercise_sets(exercise_ids[ex], days).sort_values("created_at")
+    return charts.line(df_set, "created_at", "weight", ["routine", "reps", "set_index", "volume"])
 
-fig2 = px.line(df_set, x="created_at", y="weight", markers=True, hover_data=["routine", "reps", "set_index", "volume"])
-st.plotly_chart(fig2, use_container_width=True)
+with metrics.phase("plotly"):
+    chart2 = charts.cached(("sets", exercise_ids[ex], days), set_chart)
+    st.plotly_chart(chart2.figure, use_container_width=True)
+downsample_note(chart2)
 
 # -------------------------
 # 3) Progreso por SESIÓN (Top set)
 # -------------------------
 st.subheader("Progreso por sesión (top set de peso)")
-ex2 = st.selectbox("Ejercicio (por sesión)", sorted(df["exercise"].unique()), key="ex_sess")
-
-df_ex = df[df["exercise"] == ex2].copy()
-
-# agregación por sesión: top weight, volumen total, top e1rm
-sess = (
-    df_ex.groupby(["session_date", "routine"], as_index=False)
-         .agg(
-             top_weight=("weight", "max"),
-             session_volume=("volume", "sum"),
-             top_e1rm=("e1rm", "max"),
-             n_sets=("weight", "count"),
-         )
-         .sort_values("session_date")
-)
+ex2 = st.selectbox("Ejercicio (por sesión)", exercise_names, key="ex_sess")
+
+# una fila por sesión (id real de workout_sessions): top weight, volumen total, top e1rm
+def session_chart(y, hover_data):
+    def build():
+        sess = res.sessions_for(exercise_ids[ex2])
+        return charts.line(sess, "session_date", y, hover_data)
+    return charts.cached((y, exercise_ids[ex2], days), build)
 
-fig3 = px.line(sess, x="session_date", y="top_weight", markers=True, hover_data=["routine", "n_sets", "session_volume", "top_e1rm"])
-st.plotly_chart(fig3, use_container_width=True)
+with metrics.phase("plotly"):
+    chart3 = session_chart("top_weight", ["routine", "n_sets", "session_volume", "top_e1rm"])
+    st.plotly_chart(chart3.figure, use_container_width=True)
+downsample_note(chart3)
 
 # -------------------------
 # 4) e1RM por sesión (mejor set)
@@ -154,30 +240,51 @@ st.plotly_chart(fig3, use_container_width=True)
 st.subheader("Progreso por sesión (1RM estimada - Epley)")
 st.caption("e1RM = weight * (1 + reps/30). Útil si cambias reps entre sesiones.")
 
-fig4 = px.line(sess, x="session_date", y="top_e1rm", markers=True, hover_data=["routine", "top_weight", "n_sets"])
-st.plotly_chart(fig4, use_container_width=True)
+with metrics.phase("plotly"):
+    chart4 = session_chart("top_e1rm", ["routine", "top_weight", "n_sets"])
+    st.plotly_chart(chart4.figure, use_container_width=True)
+downsample_note(chart4)
 
 # -------------------------
 # 5) Constancia: sesiones por semana
 # -------------------------
 st.subheader("Constancia: sesiones por semana")
 
-# semana ISO basada en created_at
-df["week"] = df["created_at"].dt.isocalendar().week.astype(int)
-df["year"] = df["created_at"].dt.isocalendar().year.astype(int)
-
-# sesiones únicas: (año, semana, session_id)
-weekly = (
-    df.drop_duplicates(subset=["year", "week", "session_id"])
-      .groupby(["year", "week"], as_index=False)
-      .size()
-      .rename(columns={"size": "sessions"})
-)
-
-# etiqueta "YYYY-WW"
-weekly["year_week"] = weekly["year"].astype(str) + "-W" + weekly["week"].astype(str).str.zfill(2)
+# sesiones por (año, semana ISO) en hora local, con etiqueta "YYYY-WW"
+weekly = res.weekly
 
-fig5 = px.bar(weekly, x="year_week", y="sessions")
-st.plotly_chart(fig5, use_container_width=True)
+with metrics.phase("plotly"):
+    fig5 = px.bar(weekly, x="year_week", y="sessions")
+    st.plotly_chart(fig5, use_container_width=True)
 
 st.caption("Tip: si tu meta es 4 sesiones/semana, este gráfico te deja ver rápidamente si estás cumpliendo.")
+
+# -------------------------
+# 6) Récords personales
+# -------------------------
+st.subheader("Récords personales")
+st.caption("Desde el índice de récords: todo el historial, sin importar el rango.")
+ex3 = st.selectbox("Ejercicio (récords)", exercise_names, key="ex_pr")
+PR_KINDS = {"weight": "Peso", "e1rm": "1RM estimada", "volume": "Volumen sesión"}
+
+def records_frame(rows):
+    return pd.DataFrame({
+        "récord": [PR_KINDS[r["kind"]] for r in rows],
+        "reps": pd.array([r["reps"] or None for r in rows], dtype="Int64"),
+        "valor": [round(r["value"], 1) for r in rows],
+        "fecha": stats.local_from_ms([r["achieved_ms"] for r in rows]),
+    })
+
+current = personal_records(exercise_ids[ex3], current=True)
+if current:
+    with metrics.phase("pandas"):
+        st.dataframe(records_frame(current), use_container_width=True, hide_index=True)
+        history = records_frame(personal_records(exercise_ids[ex3]))
+    with metrics.phase("plotly"):
+        # escalera de la 1RM estimada: cada escalón es una sesión que batió el récord
+        fig6 = px.line(history[history["récord"] == PR_KINDS["e1rm"]], x="fecha", y="valor", line_shape="hv", markers=True)
+        st.plotly_chart(fig6, use_container_width=True)
+    with st.expander("Historial de récords"):
+        st.dataframe(history.iloc[::-1], use_container_width=True, hide_index=True)
+
+metrics.page_done()
@@ -0,0 +1,376 @@
+"""
+Motor de estadísticas.
+
+Las columnas derivadas (hora local, fecha de sesión, volumen, e1RM Epley) se
+calculan una sola vez, vectorizadas sobre arrays de numpy, y las agrupaciones van
+por el id entero de la sesión (workout_sessions.id). Los instantes llegan como
+epoch ms y la semana ISO viene guardada en la DB: no se parsea texto.
+La página de Estadísticas solo dibuja lo que devuelve compute().
+
+Volumen, sesiones y semanas salen de session_exercise_summary (una fila por sesión
+y ejercicio, que SQLite mantiene al escribir), no de los sets. Filas por set se
+leen solo para lo que las muestra: la tabla (los RECENT_SETS más recientes) y el
+gráfico por set (exercise_sets(), un ejercicio a la vez).
+
+Los resultados se memorizan por rango y versión de la DB (data_version()):
+cualquier commit, de este u otro proceso, los invalida.
+
+Al finalizar una sesión, schedule_snapshot() precalcula en segundo plano los
+rangos estándar y los deja en disco (gym-stats/, Arrow + zstd). compute() los
+usa mientras la huella de la DB y el día local sean los mismos; si no, calcula
+en vivo.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from datetime import datetime
+from hashlib import sha256
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+import db_sqlite
+from db_sqlite import (
+    TIMEZONE, data_version, fetch_arrow, iso_days_ago, flush_sets, pooled, archived_until,
+    _sets_filter, _set_logs_source,
+)
+
+# filas de la tabla de sets de la página; el conteo del rango sale del resumen
+RECENT_SETS = 500
+
+# --- Columnas derivadas (numpy puro) ---
+# los offsets de la zona horaria se resuelven por bloque de 15 minutos: los cambios
+# de horario caen siempre en un borde de bloque y hay pocos bloques distintos
+_TZ_BUCKET_SECONDS = 900
+
+def to_local(utc: np.ndarray) -> np.ndarray:
+    """datetime64 en UTC (naive) -> datetime64[s] en hora local de TIMEZONE (naive)."""
+    secs = utc.astype("datetime64[s]").astype(np.int64)
+    if secs.size == 0:
+        return secs.astype("datetime64[s]")
+    buckets, inverse = np.unique(secs // _TZ_BUCKET_SECONDS, return_inverse=True)
+    offsets = np.array([
+        datetime.fromtimestamp(int(b) * _TZ_BUCKET_SECONDS, TIMEZONE).utcoffset().total_seconds()
+        for b in buckets
+    ], dtype=np.int64)
+    return (secs + offsets[inverse.reshape(-1)]).astype("datetime64[s]")
+
+def local_from_ms(ms) -> np.ndarray:
+    """Epoch ms (lista o array, como vienen de la DB) -> datetime64[s] en hora local."""
+    return to_local(np.asarray(ms, dtype=np.int64).astype("datetime64[ms]"))
+
+def local_day(utc: np.ndarray) -> np.ndarray:
+    """Fecha local (datetime64[D]) de cada instante UTC."""
+    return to_local(utc).astype("datetime64[D]")
+
+def e1rm(weight: np.ndarray, reps: np.ndarray) -> np.ndarray:
+    # Epley, igual que db_sqlite.e1rm
+    return weight * (1 + reps / 30.0)
+
+# --- Agrupación por clave entera ---
+def group_by(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Ordena por `keys` y devuelve (claves únicas, orden, inicio de cada grupo) para
+    reducir con reduce_groups(). Sirve para ids enteros o claves compuestas (ej. año * 100 + semana).
+    """
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if keys.size else np.empty(0, np.int64)
+    return sorted_keys[starts], order, starts
+
+def reduce_groups(ufunc, values: np.ndarray, order: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    if starts.size == 0:
+        return values[:0]
+    return ufunc.reduceat(values[order], starts)
+
+# --- Lectura ---
+def _arrays(sql: str, params, columns: dict[str, str]) -> dict[str, np.ndarray]:
+    table = fetch_arrow(sql, params, columns)
+    return {name: table.column(name).to_numpy() for name in columns}
+
+def _names() -> dict[str, np.ndarray]:
+    # tabla chica: ids de ejercicio ordenados + nombres, para buscar con searchsorted
+    return _arrays("""
+        SELECT e.id, e.name, r.name
+        FROM exercises e JOIN routines r ON r.id = e.routine_id
+        ORDER BY e.id
+    """, [], {"id": "int64", "exercise": "string", "routine": "string"})
+
+def _lookup(names: dict[str, np.ndarray], exercise_id: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(posición en names, máscara de encontrados). Sets de ejercicios borrados quedan fuera, como con el JOIN."""
+    pos = np.searchsorted(names["id"], exercise_id)
+    pos = np.minimum(pos, max(len(names["id"]) - 1, 0))
+    found = names["id"][pos] == exercise_id if len(names["id"]) else np.zeros(exercise_id.shape, bool)
+    return pos, found
+
+def _sets_query(since=None, exercise_id=None, limit=None) -> tuple[str, list]:
+    where, params = _sets_filter(since, exercise_id=exercise_id)
+    if limit is not None:
+        params.append(limit)
+    return f"""
+        SELECT sl.created_ms, sl.session_id, sl.exercise_id, sl.set_index, sl.reps, sl.weight
+        FROM {_set_logs_source(since)} sl
+        {where}
+        ORDER BY sl.created_ms DESC
+        {"LIMIT ?" if limit is not None else ""}
+    """, params
+
+def load_sets(since: str | None = None, exercise_id: int | None = None, limit: int | None = None) -> dict[str, np.ndarray]:
+    """Sets por fila, más reciente primero. Las páginas piden un ejercicio o un límite, nunca todo."""
+    return _arrays(*_sets_query(since, exercise_id, limit), {
+        "created_at": "timestamp", "session_id": "int64", "exercise_id": "int64",
+        "set_index": "int64", "reps": "int64", "weight": "float64",
+    })
+
+def load_summary(since: str | None = None) -> dict[str, np.ndarray]:
+    where, params = _sets_filter(since, table="ses", ts="started_ms")
+    return _arrays(f"""
+        SELECT ses.session_id, ses.exercise_id, ses.started_ms, ses.iso_week,
+               ses.top_weight, ses.session_volume, ses.top_e1rm, ses.n_sets
+        FROM session_exercise_summary ses
+        {where}
+        ORDER BY ses.started_ms
+    """, params, {
+        "session_id": "int64", "exercise_id": "int64", "started_at": "timestamp", "iso_week": "int64",
+        "top_weight": "float64", "session_volume": "float64", "top_e1rm": "float64", "n_sets": "int64",
+    })
+
+# --- Cálculo ---
+@dataclass(frozen=True)
+class Stats:
+    sets: pd.DataFrame       # los RECENT_SETS sets más recientes, created_at en hora local
+    volume: pd.DataFrame     # volumen y sets por ejercicio, de mayor a menor volumen
+    sessions: pd.DataFrame   # una fila por (sesión, ejercicio): top set, volumen, top e1RM
+    weekly: pd.DataFrame     # sesiones por semana ISO (hora local)
+
+    @property
+    def empty(self) -> bool:
+        return self.sessions.empty
+
+    @property
+    def n_sets(self) -> int:
+        """Sets en el rango (no solo los de la tabla)."""
+        return int(self.volume["n_sets"].sum())
+
+    def sessions_for(self, exercise_id: int) -> pd.DataFrame:
+        return self.sessions[self.sessions["exercise_id"] == exercise_id]
+
+def build_sets(sets: dict[str, np.ndarray], names: dict[str, np.ndarray]) -> pd.DataFrame:
+    pos, found = _lookup(names, sets["exercise_id"])
+    sets = {k: v[found] for k, v in sets.items()}
+    pos = pos[found]
+    return pd.DataFrame({
+        "created_at": to_local(sets["created_at"]),
+        "routine": names["routine"][pos],
+        "exercise": names["exercise"][pos],
+        "set_index": sets["set_index"],
+        "reps": sets["reps"],
+        "weight": sets["weight"],
+        "volume": sets["reps"] * sets["weight"],
+        "e1rm": e1rm(sets["weight"], sets["reps"]),
+        "session_id": sets["session_id"],
+        "exercise_id": sets["exercise_id"],
+    })
+
+def build_volume(summary: dict[str, np.ndarray], names: dict[str, np.ndarray]) -> pd.DataFrame:
+    keys, order, starts = group_by(summary["exercise_id"])
+    volume = reduce_groups(np.add, summary["session_volume"], order, starts)
+    n_sets = reduce_groups(np.add, summary["n_sets"], order, starts)
+    pos, found = _lookup(names, keys)
+    by_volume = np.argsort(-volume[found], kind="stable")
+    return pd.DataFrame({
+        "exercise_id": keys[found][by_volume],
+        "exercise": names["exercise"][pos[found]][by_volume],
+        "volume": volume[found][by_volume],
+        "n_sets": n_sets[found][by_volume],
+    })
+
+def build_sessions(summary: dict[str, np.ndarray], names: dict[str, np.ndarray]) -> pd.DataFrame:
+    pos, found = _lookup(names, summary["exercise_id"])
+    summary = {k: v[found] for k, v in summary.items()}
+    return pd.DataFrame({
+        "session_id": summary["session_id"],
+        "exercise_id": summary["exercise_id"],
+        "session_date": to_local(summary["started_at"]),
+        "routine": names["routine"][pos[found]],
+        "top_weight": summary["top_weight"],
+        "session_volume": summary["session_volume"],
+        "top_e1rm": summary["top_e1rm"],
+        "n_sets": summary["n_sets"],
+    })
+
+def build_weekly(summary: dict[str, np.ndarray]) -> pd.DataFrame:
+    # cada sesión cuenta una vez, en la semana (guardada al escribir) de su primer set;
+    # summary viene ordenado por inicio y el orden de group_by es estable
+    sessions, order, starts = group_by(summary["session_id"])
+    first_week = summary["iso_week"][order[starts]]
+    keys, order, starts = group_by(first_week)
+    counts = np.diff(np.r_[starts, sessions.size])
+    year, week = keys // 100, keys % 100
+    return pd.DataFrame({
+        "year": year,
+        "week": week,
+        "year_week": [f"{y}-W{w:02d}" for y, w in zip(year.tolist(), week.tolist())],
+        "sessions": counts,
+    })
+
+def _since(days: int | None) -> str | None:
+    return iso_days_ago(days) if days is not None else None
+
+def _compute(days: int | None) -> Stats:
+    since = _since(days)
+    names = _names()
+    summary = load_summary(since)
+    return Stats(
+        sets=build_sets(load_sets(since, limit=RECENT_SETS), names),
+        volume=build_volume(summary, names),
+        sessions=build_sessions(summary, names),
+        weekly=build_weekly(summary),
+    )
+
+def exercise_sets(exercise_id: int, days: int | None = None) -> pd.DataFrame:
+    """Todos los sets de un ejercicio en el rango (para el gráfico por set; charts.cached lo memoriza)."""
+    return build_sets(load_sets(_since(days), exercise_id=exercise_id), _names())
+
+# --- Memo por versión de la DB ---
+# solo se guarda la última versión: los DataFrames de "Todo" pueden ser grandes
+_memo: dict[int | None, Stats] = {}
+_memo_version = None
+_memo_lock = threading.Lock()
+
+def compute(days: int | None = None) -> Stats:
+    """Estadísticas de los últimos `days` días (None = todo). No modificar los DataFrames: se comparten entre reruns."""
+    global _memo_version
+    version = data_version()
+    with _memo_lock:
+        if version != _memo_version:
+            _memo.clear()
+            _memo_version = version
+        hit = _memo.get(days)
+    if hit is not None:
+        return hit
+
+    result = load_snapshot(days) or _compute(days)
+    with _memo_lock:
+        if _memo_version == version:
+            _memo[days] = result
+    return result
+
+def clear_memo():
+    global _memo_version
+    with _memo_lock:
+        _memo.clear()
+        _memo_version = None
+
+# --- Snapshot en disco ---
+# rangos de la página de Estadísticas (4 semanas, 8 semanas, 3 meses, todo)
+SNAPSHOT_RANGES = (28, 56, 90, None)
+SNAPSHOT_FORMAT = 2
+
+_snapshot_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stats-snapshot")
+_snapshot_pending = None
+_snapshot_lock = threading.Lock()
+_write_lock = threading.Lock()
+GEN_MAX_AGE_SECONDS = 3600  # generaciones sin manifest (un escritor que murió a medias)
+
+def snapshot_dir() -> Path:
+    return db_sqlite.DB_PATH.with_name(f"{db_sqlite.DB_PATH.stem}-stats")
+
+def _range_label(days: int | None) -> str:
+    return "all" if days is None else f"{days}d"
+
+def _today() -> str:
+    return datetime.now(TIMEZONE).date().isoformat()
+
+def fingerprint() -> str:
+    """
+    Huella barata del contenido que entra en las estadísticas: cambia al agregar o
+    quitar sets (también los archivados), al renombrar o borrar rutinas y ejercicios
+    y al cambiar la zona horaria.
+    """
+    with pooled() as conn:
+        counts = tuple(conn.execute("""
+            SELECT (SELECT COALESCE(MAX(id), 0) FROM set_logs),
+                   (SELECT COUNT(*) FROM set_logs),
+                   (SELECT COUNT(*) FROM session_exercise_summary),
+                   (SELECT TOTAL(session_volume) FROM session_exercise_summary)
+        """).fetchone())
+        names = conn.execute("""
+            SELECT e.id, e.name, r.name FROM exercises e JOIN routines r ON r.id = e.routine_id ORDER BY e.id
+        """).fetchall()
+    payload = repr((SNAPSHOT_FORMAT, TIMEZONE.key, counts, archived_until(), [tuple(r) for r in names]))
+    return sha256(payload.encode()).hexdigest()[:32]
+
+def write_snapshot() -> Path:
+    """
+    Calcula los rangos estándar y los deja en snapshot_dir(). Devuelve el directorio.
+    Para llamarlo desde la app, mejor schedule_snapshot(): un solo escritor por proceso.
+    """
+    with _write_lock:
+        return _write_snapshot()
+
+def _write_snapshot() -> Path:
+    flush_sets()
+    base = snapshot_dir()
+    manifest = {"fingerprint": fingerprint(), "day": _today(), "ranges": {}}
+    gen = base / f"gen-{uuid.uuid4().hex[:12]}"
+    gen.mkdir(parents=True)
+    for days in SNAPSHOT_RANGES:
+        result = compute(days)
+        label = _range_label(days)
+        for f in fields(Stats):
+            table = pa.Table.from_pandas(getattr(result, f.name), preserve_index=False)
+            feather.write_feather(table, gen / f"{label}_{f.name}.arrow", compression="zstd")
+        manifest["ranges"][label] = gen.name
+
+    # el manifest se cambia de una vez; después se borra la generación que publicaba el
+    # anterior (y las abandonadas), nunca una que otro proceso esté escribiendo todavía
+    path = base / "manifest.json"
+    try:
+        replaced = set(json.loads(path.read_text(encoding="utf-8"))["ranges"].values())
+    except (OSError, ValueError, KeyError):
+        replaced = set()
+    tmp = base / f"manifest.{gen.name}.tmp"
+    tmp.write_text(json.dumps(manifest), encoding="utf-8")
+    os.replace(tmp, path)
+    cutoff = time.time() - GEN_MAX_AGE_SECONDS
+    for old in base.glob("gen-*"):
+        if old != gen and (old.name in replaced or old.stat().st_mtime < cutoff):
+            shutil.rmtree(old, ignore_errors=True)
+    return base
+
+def load_snapshot(days: int | None) -> Stats | None:
+    """Stats del snapshot para `days`, o None si no hay, es de otro día o la DB cambió."""
+    path = snapshot_dir() / "manifest.json"
+    if days not in SNAPSHOT_RANGES or not path.exists():
+        return None
+    try:
+        manifest = json.loads(path.read_text(encoding="utf-8"))
+        gen = manifest["ranges"].get(_range_label(days))
+        if gen is None or manifest["day"] != _today() or manifest["fingerprint"] != fingerprint():
+            return None
+        label = _range_label(days)
+        return Stats(**{
+            f.name: feather.read_table(snapshot_dir() / gen / f"{label}_{f.name}.arrow").to_pandas()
+            for f in fields(Stats)
+        })
+    except (OSError, ValueError, KeyError, pa.ArrowException):
+        # snapshot a medio reemplazar o de otro formato: se calcula en vivo
+        return None
+
+def schedule_snapshot():
+    """Encola write_snapshot() en el thread de fondo (si ya hay uno esperando, no agrega otro)."""
+    global _snapshot_pending
+    with _snapshot_lock:
+        if _snapshot_pending is not None and not _snapshot_pending.running() and not _snapshot_pending.done():
+            return _snapshot_pending
+        _snapshot_pending = _snapshot_pool.submit(write_snapshot)
+        return _snapshot_pending
@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+# antes de importar db_sqlite: que nada apunte nunca al gym.db del repo
+os.environ["GYM_DB_PATH"] = str(Path(tempfile.mkdtemp()) / "gym.db")
+os.environ.setdefault("GYM_WARMUP", "0")
+
+import backup  # noqa: E402
+import db_sqlite  # noqa: E402
+
+
+@pytest.fixture
+def gym_db(tmp_path, monkeypatch):
+    """DB vacía y migrada en tmp_path; assets/ y los backups temporales también quedan ahí."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db_sqlite, "DB_PATH", tmp_path / "gym.db")
+    monkeypatch.setattr(backup, "BACKUP_DIR", tmp_path / "backups")
+    db_sqlite.init_db()
+    yield db_sqlite.DB_PATH
+    db_sqlite.flush_sets()
+    db_sqlite.close_connections()
+    db_sqlite.invalidate_cache()
+
+
+@pytest.fixture
+def seeded_db(gym_db):
+    """gym_db con historial sintético (benchmarks/workload.py): ~3000 sets en 2 años."""
+    from workload import generate
+
+    generate(gym_db, 3000, years=2)
+    db_sqlite.invalidate_cache()
+    return gym_db
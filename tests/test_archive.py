@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+import db_sqlite
+from conftest import ROOT
+
+
+def _archive_in_other_process(db_path, days: int = 180):
+    subprocess.run(
+        [sys.executable, str(ROOT / "archive.py"), "run", "--days", str(days), "--no-vacuum"],
+        env={**os.environ, "GYM_DB_PATH": str(db_path)}, cwd=db_path.parent, check=True, capture_output=True,
+    )
+
+
+def test_archive_from_another_process(seeded_db):
+    before = len(db_sqlite.stats_sets())
+    # el pool ya tiene conexiones abiertas (sin el archivo adjunto) y el cache, su valor
+    assert db_sqlite.archived_until() is None
+
+    _archive_in_other_process(seeded_db)
+
+    assert db_sqlite.archived_until() is not None
+    assert len(db_sqlite.stats_sets()) == before
+    with db_sqlite.pooled() as a, db_sqlite.pooled() as b:
+        # todas las conexiones del pool, también las que se abrieron antes
+        assert db_sqlite.has_archive(a) and db_sqlite.has_archive(b)
+    assert db_sqlite.check_personal_records() == 0
+
+    # un segundo paso mueve más: el valor memorizado se actualiza solo
+    until = db_sqlite.archived_until()
+    _archive_in_other_process(seeded_db, days=30)
+    assert db_sqlite.archived_until() > until
+    assert len(db_sqlite.stats_sets()) == before
@@ -0,0 +1,54 @@
+import sqlite3
+
+import backup
+import db_sqlite
+
+
+def _export_counts(path):
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+        return {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("workout_sessions", "set_logs")}
+    finally:
+        conn.close()
+
+
+def test_incremental_backup_with_foreign_keys(seeded_db):
+    with db_sqlite.pooled() as conn:
+        assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        n_sets = conn.execute("SELECT COUNT(*) FROM set_logs").fetchone()[0]
+
+    first = backup.incremental_backup()
+    assert _export_counts(first)["set_logs"] == n_sets
+    assert backup.incremental_backup() is None
+
+    # sets nuevos en una sesión nueva y en una vieja (la sesión vieja tiene que viajar con ellos)
+    routine_id = db_sqlite.list_routines()[0]["id"]
+    exercise_id = db_sqlite.list_exercises(routine_id)[0]["id"]
+    with db_sqlite.pooled() as conn:
+        old_session = conn.execute("SELECT MIN(id) FROM workout_sessions WHERE routine_id = ?", (routine_id,)).fetchone()[0]
+    new_session = db_sqlite.start_session(routine_id)
+    db_sqlite.log_set(new_session, exercise_id, 1, 8, 50.0)
+    db_sqlite.log_set(old_session, exercise_id, 99, 5, 40.0)
+
+    second = backup.incremental_backup()
+    assert _export_counts(second) == {"workout_sessions": 2, "set_logs": 2}
+
+
+def test_restore_keeps_previous_db_next_to_it(seeded_db):
+    snapshot = backup.full_backup()
+    routine_id = db_sqlite.list_routines()[0]["id"]
+    session_id = db_sqlite.start_session(routine_id)
+    db_sqlite.log_set(session_id, db_sqlite.list_exercises(routine_id)[0]["id"], 1, 8, 50.0)
+    with db_sqlite.pooled() as conn:
+        n_sets = conn.execute("SELECT COUNT(*) FROM set_logs").fetchone()[0]
+
+    with open(snapshot, "rb") as f:
+        previous = backup.restore_backup(backup.stage_upload(f))
+
+    assert previous.parent == seeded_db.parent
+    assert previous.name.startswith("gym.db.pre-restore-")
+    backup.cleanup_backups(max_age_seconds=0)
+    assert _export_counts(previous)["set_logs"] == n_sets
+    with db_sqlite.pooled() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM set_logs").fetchone()[0] == n_sets - 1
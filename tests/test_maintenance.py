@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import time
+
+import db_sqlite
+import images
+import maintenance
+
+
+def _old_file(path, size: int = 100):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    old = time.time() - 7200
+    os.utime(path, (old, old))
+    return path
+
+
+def _age_released():
+    with db_sqlite.transaction() as conn:
+        conn.execute("UPDATE released_images SET released_at = '2000-01-01T00:00:00'")
+
+
+def test_foreign_keys_cascade(seeded_db):
+    routine_id = db_sqlite.list_routines()[0]["id"]
+    db_sqlite.delete_routine(routine_id)
+    assert maintenance.count_orphans() == 0
+    with db_sqlite.pooled() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM workout_sessions WHERE routine_id = ?", (routine_id,)).fetchone()[0] == 0
+    assert db_sqlite.check_personal_records() == 0
+
+
+def test_collect_orphans(seeded_db):
+    # filas huérfanas de antes de foreign_keys=ON
+    raw = sqlite3.connect(seeded_db)
+    raw.execute("DELETE FROM routines WHERE id = (SELECT MIN(id) FROM routines)")
+    raw.execute("DELETE FROM workout_sessions WHERE id = (SELECT MAX(id) FROM workout_sessions)")
+    raw.commit()
+    raw.close()
+    db_sqlite.invalidate_cache()
+    assert maintenance.count_orphans() > 0
+
+    removed = maintenance.collect_orphans()
+    assert removed["exercises"] > 0 and removed["set_logs"] > 0
+    assert maintenance.count_orphans() == 0
+    assert db_sqlite.check_personal_records() == 0
+    assert not any(maintenance.collect_orphans().values())
+
+
+def test_images_of_other_dbs_are_kept(gym_db):
+    # la carpeta de assets tiene imágenes que esta DB nunca usó
+    foreign = _old_file(images.EXERCISE_IMG_DIR / "foreign.png")
+    stale_thumb = _old_file(images.THUMB_DIR / "gone_96.webp")
+    maintenance.run_maintenance()
+    assert foreign.exists()
+    assert not stale_thumb.exists()
+
+    assert images.collect_unused_images(sweep=True)["images_removed"] == 1
+    assert not foreign.exists()
+
+
+def test_released_images_are_collected(gym_db):
+    first = _old_file(images.EXERCISE_IMG_DIR / "first.png", 300)
+    second = _old_file(images.EXERCISE_IMG_DIR / "second.png", 500)
+    shared = _old_file(images.EXERCISE_IMG_DIR / "shared.png")
+    db_sqlite.create_routine("R")
+    routine_id = db_sqlite.list_routines()[0]["id"]
+    db_sqlite.add_exercise(routine_id, "A", 1, 3, 60, str(first))
+    db_sqlite.add_exercise(routine_id, "B", 2, 3, 60, str(shared))
+    db_sqlite.add_exercise(routine_id, "C", 3, 3, 60, str(shared))
+    a, b, _ = db_sqlite.list_exercises(routine_id)
+
+    db_sqlite.update_exercise(a["id"], "A", 1, 3, 60, str(second))
+    db_sqlite.delete_exercise(b["id"])
+    # recién soltada: todavía en el período de gracia
+    assert images.collect_unused_images()["images_removed"] == 0
+    _age_released()
+    assert images.collect_unused_images() == {"images_removed": 1, "bytes_freed": 300}
+    assert not first.exists() and second.exists() and shared.exists()
+
+    # borrar la rutina suelta las de sus ejercicios (CASCADE)
+    db_sqlite.delete_routine(routine_id)
+    _age_released()
+    assert images.collect_unused_images()["images_removed"] == 2
+    assert not second.exists() and not shared.exists()
+
+
+def test_reclaim_space_and_schedule(seeded_db):
+    # la mantención programada no convierte: eso es un VACUUM completo
+    scheduled = maintenance.maybe_run()
+    assert scheduled["space"]["main"]["mode"] == "skipped"
+    first = maintenance.run_maintenance(convert=True)
+    assert first["space"]["main"]["mode"] == "vacuum"
+    assert maintenance.last_report()["at"] == first["at"]
+    assert not maintenance.is_due()
+    assert maintenance.maybe_run() is None
+
+    db_sqlite.delete_routine(db_sqlite.list_routines()[0]["id"])
+    second = maintenance.run_maintenance()
+    assert second["space"]["main"]["mode"] == "incremental"
+    assert second["space"]["main"]["bytes_reclaimed"] > 0
+    assert second["bytes_reclaimed"] >= second["space"]["main"]["bytes_reclaimed"]
+
+
+def test_image_variant_missing_file(gym_db):
+    # un backup viejo puede apuntar a una imagen que el GC ya borró
+    assert images.image_variant("assets/exercises/no-existe.png", 220) is None
+    present = _old_file(gym_db.parent / "assets" / "exercises" / "roto.png")
+    # existe pero no se puede decodificar: se muestra la ruta tal cual
+    assert images.image_variant(str(present), 220) == str(present)
@@ -0,0 +1,12 @@
+import db_sqlite
+import metrics
+
+
+def test_writer_state_is_collected(gym_db, monkeypatch):
+    collected = metrics.snapshot()["collected"]
+    assert collected["pending_sets"] == 0
+    assert collected["writer_failing"] == 0
+
+    monkeypatch.setattr(db_sqlite, "writer_error", "database is locked")
+    assert metrics.snapshot()["collected"]["writer_failing"] == 1
+    assert "gym_writer_failing" in metrics.prometheus_text()
@@ -0,0 +1,108 @@
+"""El índice de récords mantenido set a set coincide con un recálculo completo."""
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import archive
+import backup
+import db_sqlite
+
+
+def _sessions(exercise_id: int) -> list[tuple[int, str]]:
+    with db_sqlite.pooled() as conn:
+        return [tuple(r) for r in conn.execute("""
+            SELECT DISTINCT sl.session_id, ws.started_at
+            FROM set_logs sl JOIN workout_sessions ws ON ws.id = sl.session_id
+            WHERE sl.exercise_id = ? ORDER BY ws.started_at
+        """, (exercise_id,))]
+
+
+def _records_for(session_id: int, started_at: str, exercise_id: int, weights, first_index: int = 50):
+    t0 = datetime.fromisoformat(started_at)
+    return [
+        (session_id, exercise_id, first_index + k, reps, weight, (t0 + timedelta(minutes=k + 1)).isoformat(timespec="seconds"))
+        for k, (reps, weight) in enumerate(weights)
+    ]
+
+
+def _insert(records):
+    with db_sqlite.transaction() as conn:
+        db_sqlite._insert_sets(conn, records)
+
+
+@pytest.fixture
+def exercise_id(seeded_db):
+    with db_sqlite.pooled() as conn:
+        return conn.execute("SELECT exercise_id FROM set_logs GROUP BY exercise_id ORDER BY COUNT(*) DESC").fetchone()[0]
+
+
+def test_check_detects_drift(seeded_db):
+    assert db_sqlite.check_personal_records() == 0
+    with db_sqlite.transaction() as conn:
+        conn.execute("DELETE FROM personal_records WHERE session_id = (SELECT MIN(session_id) FROM personal_records)")
+    assert db_sqlite.check_personal_records() > 0
+    db_sqlite.rebuild_personal_records()
+    assert db_sqlite.check_personal_records() == 0
+
+
+def test_out_of_order_inserts(exercise_id):
+    sessions = _sessions(exercise_id)
+    rnd = random.Random(0)
+    picked = [sessions[-1], sessions[0], sessions[len(sessions) // 2], sessions[len(sessions) // 3]]
+    # récords nuevos en sesiones viejas: tapan a los récords posteriores ya indexados
+    records = []
+    for i, (sid, started) in enumerate(picked):
+        records += _records_for(sid, started, exercise_id, [(rnd.randint(1, 12), 200.0 + 10 * i), (3, 500.0 - i)])
+    rnd.shuffle(records)
+    _insert(records[: len(records) // 2])
+    assert db_sqlite.check_personal_records() == 0
+    # el resto, de a uno y del más nuevo al más viejo
+    for record in sorted(records[len(records) // 2:], key=lambda r: r[-1], reverse=True):
+        _insert([record])
+        assert db_sqlite.check_personal_records() == 0
+    # repetir un lote ya insertado no cambia nada
+    _insert(records)
+    assert db_sqlite.check_personal_records() == 0
+
+
+def test_set_before_first_moves_record_dates(exercise_id):
+    # un set liviano anterior al primero de la sesión: no es récord, pero corre la fecha de los que sí
+    sid, started = _sessions(exercise_id)[-2]
+    _insert([(sid, exercise_id, 90, 1, 0.5, started)])
+    assert db_sqlite.check_personal_records() == 0
+
+
+def test_write_behind_queue(exercise_id):
+    routine_id = db_sqlite.list_routines()[0]["id"]
+    session_id = db_sqlite.start_session(routine_id)
+    for ex in db_sqlite.list_exercises(routine_id):
+        for set_index, weight in ((3, 300.0), (1, 100.0), (2, 310.0)):
+            db_sqlite.enqueue_set(session_id, ex["id"], set_index, 5, weight)
+    db_sqlite.flush_sets()
+    assert db_sqlite.check_personal_records() == 0
+
+
+def test_archive_merge_and_restore(exercise_id):
+    sessions = _sessions(exercise_id)
+    result = archive.archive_sets(horizon_days=180, vacuum=False)
+    assert result["moved"] > 0
+    assert db_sqlite.check_personal_records() == 0
+
+    # set nuevo (un récord) en una sesión cuyos sets ya están archivados
+    sid, started = sessions[1]
+    _insert(_records_for(sid, started, exercise_id, [(8, 400.0)]))
+    assert db_sqlite.check_personal_records() == 0
+
+    snapshot = backup.full_backup()
+    sid, started = sessions[-2]
+    _insert(_records_for(sid, started, exercise_id, [(1, 900.0)], first_index=80))
+    assert db_sqlite.check_personal_records() == 0
+
+    with open(snapshot, "rb") as f:
+        backup.merge_backup(backup.stage_upload(f))
+    assert db_sqlite.check_personal_records() == 0
+
+    with open(snapshot, "rb") as f:
+        backup.restore_backup(backup.stage_upload(f))
+    assert db_sqlite.check_personal_records() == 0
@@ -0,0 +1,70 @@
+"""Las consultas calientes usan los índices de las migraciones (EXPLAIN QUERY PLAN)."""
+import pytest
+
+import db_sqlite
+
+SINCE = "2026-01-01T00:00:00"
+
+
+def _plan(sql: str, params=()) -> list[str]:
+    with db_sqlite.pooled() as conn:
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def _uses(plan: list[str], table: str, index: str) -> bool:
+    return any(step.startswith(f"SEARCH {table} USING") and index in step for step in plan)
+
+
+@pytest.fixture(params=[False, True], ids=["sin-analyze", "con-analyze"])
+def planned_db(request, seeded_db):
+    # con ANALYZE (lo que deja PRAGMA optimize en la mantención) el planificador tiene estadísticas
+    if request.param:
+        with db_sqlite.pooled() as conn:
+            conn.execute("ANALYZE")
+    return seeded_db
+
+
+@pytest.mark.parametrize("filters, index", [
+    (dict(exercise_id=3), "idx_set_logs_exercise_ms"),
+    (dict(exercise_id=3, since=SINCE), "idx_set_logs_exercise_ms"),
+    (dict(since=SINCE), "idx_set_logs_ms"),
+])
+def test_stats_sets_uses_index(planned_db, filters, index):
+    plan = _plan(*db_sqlite._stats_sets_query(**filters))
+    assert _uses(plan, "sl", index), plan
+    assert not any(step.startswith("SCAN sl") for step in plan), plan
+
+
+def test_duplicate_check_uses_session_set_index(planned_db):
+    # el mismo lookup que hace _insert_sets por cada set en cola
+    plan = _plan(
+        "SELECT 1 FROM set_logs WHERE session_id = ? AND exercise_id = ? AND set_index = ? AND created_at = ?",
+        (1, 1, 1, SINCE),
+    )
+    assert _uses(plan, "set_logs", "idx_set_logs_session_set"), plan
+
+
+def test_list_exercises_uses_routine_order_index(planned_db):
+    plan = _plan("""
+        SELECT id, routine_id, name, order_index, default_sets, default_rest_seconds, image_path
+        FROM exercises WHERE routine_id = ? ORDER BY order_index ASC, id ASC
+    """, (1,))
+    assert _uses(plan, "exercises", "idx_exercises_routine_order"), plan
+
+
+def test_session_lookup_uses_routine_started_index(planned_db):
+    # transfer._resolve busca la sesión por (rutina, inicio)
+    plan = _plan("SELECT id FROM workout_sessions WHERE routine_id = ? AND started_at = ?", (1, SINCE))
+    assert _uses(plan, "workout_sessions", "idx_sessions_routine_started"), plan
+
+
+@pytest.mark.parametrize("filters, index", [
+    (dict(exercise_id=3), "idx_set_logs_exercise_ms"),
+    (dict(since=SINCE, limit=500), "idx_set_logs_ms"),
+])
+def test_stats_engine_sets_use_index(planned_db, filters, index):
+    # Estadísticas lee filas por set solo para un ejercicio o para los más recientes
+    import stats
+
+    plan = _plan(*stats._sets_query(**filters))
+    assert _uses(plan, "sl", index), plan
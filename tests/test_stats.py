@@ -0,0 +1,47 @@
+import threading
+
+import numpy as np
+
+import stats
+
+
+def test_concurrent_snapshot_writers(seeded_db):
+    errors = []
+
+    def write():
+        try:
+            stats.write_snapshot()
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(3)]
+    for t in threads:
+        t.start()
+    queued = stats.schedule_snapshot()
+    for t in threads:
+        t.join()
+    queued.result()
+
+    assert errors == []
+    assert len(list(stats.snapshot_dir().glob("gen-*"))) == 1
+    assert not list(stats.snapshot_dir().glob("*.tmp"))
+    stats.clear_memo()
+    assert stats.load_snapshot(None) is not None
+
+
+def test_sets_only_where_shown(seeded_db, monkeypatch):
+    monkeypatch.setattr(stats, "RECENT_SETS", 50)
+    stats.clear_memo()
+    res = stats.compute(None)
+    assert len(res.sets) == 50
+    assert res.sets["created_at"].is_monotonic_decreasing
+    assert res.n_sets == len(stats.load_sets()["session_id"]) > 50
+
+    exercise_id = int(res.volume["exercise_id"].iloc[0])
+    per_set = stats.exercise_sets(exercise_id)
+    assert len(per_set) == int(res.volume["n_sets"].iloc[0])
+    assert (per_set["exercise_id"] == exercise_id).all()
+    # el top e1RM por sesión del resumen coincide con el de los sets
+    top = per_set.groupby("session_id")["e1rm"].max()
+    sessions = res.sessions_for(exercise_id).set_index("session_id")["top_e1rm"]
+    assert np.allclose(top.sort_index(), sessions.sort_index())
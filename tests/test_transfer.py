@@ -0,0 +1,38 @@
+import pytest
+
+import archive
+import db_sqlite
+import transfer
+
+
+def _counts() -> dict:
+    with db_sqlite.pooled() as conn:
+        sets = len(db_sqlite.stats_sets())
+        return {
+            "sets": sets,
+            "sessions": conn.execute("SELECT COUNT(*) FROM workout_sessions").fetchone()[0],
+            "exercises": conn.execute("SELECT COUNT(*) FROM exercises").fetchone()[0],
+        }
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_export_import_round_trip(seeded_db, tmp_path, fmt):
+    before = _counts()
+    dest = tmp_path / f"sets.{fmt}"
+    assert transfer.export_sets(dest) == before["sets"]
+
+    result = transfer.import_sets(dest)
+    assert result["sets_added"] == 0
+    assert result["sessions_created"] == 0
+    assert _counts() == before
+
+
+def test_round_trip_with_archived_sets(seeded_db, tmp_path):
+    archive.archive_sets(horizon_days=180, vacuum=False)
+    before = _counts()
+    dest = tmp_path / "sets.parquet"
+    transfer.export_sets(dest)
+
+    assert transfer.import_sets(dest)["sets_added"] == 0
+    assert _counts() == before
+    assert db_sqlite.check_personal_records() == 0
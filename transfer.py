@@ -0,0 +1,294 @@
+"""
+Import / export masivo del historial de sets, en CSV o Parquet.
+
+El formato es el de stats_sets(): created_at (UTC), routine, exercise, set_index,
+reps, weight. Al importar, set_index y session_id son opcionales: sin session_id
+los sets se agrupan en una sesión por rutina y día local; sin set_index se
+numeran en el orden del archivo.
+
+El archivo se lee dos veces, por lotes y sin cargarlo entero: la primera pasada
+junta rutinas, ejercicios y sesiones (se crean los que falten, buscando por
+nombre), la segunda inserta los sets con _insert_sets() en transacciones de
+IMPORT_CHUNK_ROWS filas. Re-importar el mismo archivo no duplica nada: la sesión
+se reconoce por rutina + hora de inicio (o, si ya está en la DB, por rutina + su
+primer set, que es lo que trae un export) y los sets repetidos se ignoran.
+"""
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from backup import _new_backup_path
+from db_sqlite import (
+    STATS_SETS_COLUMNS, arrow_schema, iter_arrow_batches, transaction, invalidate_cache,
+    epoch_ms, local_day_number, _insert_sets, _stats_sets_query, _set_logs_source,
+)
+from stats import local_day
+
+IMPORT_CHUNK_ROWS = 100_000
+CSV_BLOCK_SIZE = 8 << 20
+REQUIRED_COLUMNS = ("created_at", "routine", "exercise", "reps", "weight")
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet"}
+_SEP = "\x1f"  # separador para claves compuestas (rutina + ejercicio / sesión)
+
+class TransferError(Exception):
+    """El archivo no se puede importar (formato, columnas o valores)."""
+
+def _format(source, fmt: str | None) -> str:
+    if fmt:
+        return fmt
+    name = source if isinstance(source, (str, Path)) else getattr(source, "name", "")
+    try:
+        return FORMATS[Path(name).suffix.lower()]
+    except KeyError:
+        raise TransferError(f"No sé leer '{name}': usa .csv o .parquet") from None
+
+def _read_batches(source, fmt: str):
+    if hasattr(source, "seek"):
+        source.seek(0)
+    try:
+        if fmt == "parquet":
+            yield from pq.ParquetFile(source).iter_batches(batch_size=IMPORT_CHUNK_ROWS)
+        else:
+            reader = pacsv.open_csv(
+                source,
+                read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+                convert_options=pacsv.ConvertOptions(column_types={
+                    "created_at": pa.string(), "routine": pa.string(), "exercise": pa.string(),
+                    "set_index": pa.int64(), "reps": pa.int64(), "weight": pa.float64(),
+                    "session_id": pa.string(),
+                }),
+            )
+            yield from reader
+    except pa.ArrowInvalid as e:
+        raise TransferError(str(e)) from e
+
+def _normalize(batch: pa.RecordBatch) -> dict:
+    """Columnas del lote con tipos fijos; created_at como texto ISO en UTC (el formato de la DB)."""
+    missing = [c for c in REQUIRED_COLUMNS if c not in batch.schema.names]
+    if missing:
+        raise TransferError(f"Faltan columnas: {', '.join(missing)}")
+    cols = {name: batch.column(name) for name in batch.schema.names}
+
+    for name in REQUIRED_COLUMNS:
+        if cols[name].null_count:
+            raise TransferError(f"La columna '{name}' tiene valores vacíos")
+
+    try:
+        ts = cols["created_at"]
+        if pa.types.is_string(ts.type) or pa.types.is_large_string(ts.type):
+            # ISO sin zona se toma como UTC (igual que en la DB); con offset se convierte
+            has_zone = pc.match_substring_regex(ts, r"(Z|[+-]\d\d:?\d\d)$")
+            ts = pc.if_else(has_zone, ts, pc.binary_join_element_wise(ts, "+00:00", ""))
+            ts = pc.cast(ts, pa.timestamp("us", tz="UTC"))
+        if ts.type.tz is not None:
+            ts = pc.cast(ts, pa.timestamp(ts.type.unit, tz="UTC"))
+        ts = pc.cast(ts, pa.timestamp("s", tz=ts.type.tz), safe=False)
+        # cast a texto ("2024-01-31 10:00:00[Z]") es mucho más rápido que strftime
+        iso = pc.replace_substring(pc.utf8_slice_codeunits(pc.cast(ts, pa.string()), 0, 19), " ", "T", max_replacements=1)
+        out = {
+            "created_at": iso,
+            "routine": pc.cast(cols["routine"], pa.string()),
+            "exercise": pc.cast(cols["exercise"], pa.string()),
+            "reps": pc.cast(cols["reps"], pa.int64()),
+            "weight": pc.cast(cols["weight"], pa.float64()),
+        }
+        if "set_index" in cols and not cols["set_index"].null_count:
+            out["set_index"] = pc.cast(cols["set_index"], pa.int64())
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        raise TransferError(str(e)) from e
+
+    # sesión: la del archivo si viene, si no una por rutina y día local
+    if "session_id" in cols and not cols["session_id"].null_count:
+        session = pc.cast(cols["session_id"], pa.string())
+    else:
+        epoch = pc.cast(ts, pa.int64()).to_numpy(zero_copy_only=False)  # segundos UTC, con o sin tz
+        days = local_day(epoch.astype("datetime64[s]"))
+        session = pa.array(days.astype(str))
+    out["session_key"] = pc.binary_join_element_wise(out["routine"], session, _SEP)
+    out["exercise_key"] = pc.binary_join_element_wise(out["routine"], out["exercise"], _SEP)
+    return out
+
+def _scan(source, fmt: str):
+    """Primera pasada: sesiones (inicio/fin), ejercicios y rutinas del archivo."""
+    sessions: dict[str, list[str]] = {}
+    exercises: set[str] = set()
+    rows = 0
+    for batch in _read_batches(source, fmt):
+        cols = _normalize(batch)
+        rows += batch.num_rows
+        table = pa.table({"k": cols["session_key"], "t": cols["created_at"]})
+        grouped = table.group_by("k").aggregate([("t", "min"), ("t", "max")]).to_pydict()
+        for key, first, last in zip(grouped["k"], grouped["t_min"], grouped["t_max"]):
+            span = sessions.get(key)
+            if span is None:
+                sessions[key] = [first, last]
+            else:
+                span[0], span[1] = min(span[0], first), max(span[1], last)
+        exercises.update(pc.unique(cols["exercise_key"]).to_pylist())
+    return rows, sessions, exercises
+
+def _resolve(sessions: dict, exercises: set) -> tuple[dict, dict, dict]:
+    """Busca por nombre (y crea lo que falte) rutinas, ejercicios y sesiones. Devuelve los ids y cuántos se crearon."""
+    created = Counter()
+    with transaction() as conn:
+        routine_ids = {}
+        for rid, name in conn.execute("SELECT id, name FROM routines ORDER BY id DESC").fetchall():
+            routine_ids[name] = rid  # si hay nombres repetidos, gana la rutina más antigua
+        exercise_ids = {}
+        for eid, rid, name in conn.execute("SELECT id, routine_id, name FROM exercises ORDER BY id DESC").fetchall():
+            exercise_ids[(rid, name)] = eid
+
+        # una rutina nueva queda creada en la fecha de su primer set
+        first_set = {}
+        for key, (started, _) in sessions.items():
+            routine = key.split(_SEP, 1)[0]
+            first_set[routine] = min(first_set.get(routine, started), started)
+
+        def routine_id(name):
+            if name not in routine_ids:
+                cur = conn.execute("INSERT INTO routines (name, created_at) VALUES (?, ?)", (name, first_set[name]))
+                routine_ids[name] = cur.lastrowid
+                created["routines"] += 1
+            return routine_ids[name]
+
+        by_key = {}
+        for key in sorted(exercises):
+            routine, name = key.split(_SEP, 1)
+            rid = routine_id(routine)
+            if (rid, name) not in exercise_ids:
+                order = conn.execute("SELECT COALESCE(MAX(order_index), 0) + 1 FROM exercises WHERE routine_id=?", (rid,)).fetchone()[0]
+                cur = conn.execute("INSERT INTO exercises (routine_id, name, order_index) VALUES (?, ?, ?)", (rid, name, order))
+                exercise_ids[(rid, name)] = cur.lastrowid
+                created["exercises"] += 1
+            by_key[key] = exercise_ids[(rid, name)]
+
+        session_ids = {}
+        for key, (started, finished) in sessions.items():
+            rid = routine_id(key.split(_SEP, 1)[0])
+            row = conn.execute("SELECT id FROM workout_sessions WHERE routine_id=? AND started_at=?", (rid, started)).fetchone()
+            if row is None:
+                # un export propio: la sesión ya está, pero empezó antes de su primer set
+                row = conn.execute(f"""
+                    SELECT sl.session_id FROM {_set_logs_source(started)} sl
+                    JOIN workout_sessions ws ON ws.id = sl.session_id
+                    WHERE ws.routine_id = ? AND sl.created_ms = ?
+                    LIMIT 1
+                """, (rid, epoch_ms(started))).fetchone()
+            if row is None:
+                ms = epoch_ms(started)
+                cur = conn.execute(
+                    "INSERT INTO workout_sessions (routine_id, started_at, finished_at, started_ms, finished_ms, local_day)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (rid, started, finished, ms, epoch_ms(finished), local_day_number(ms)),
+                )
+                session_ids[key] = cur.lastrowid
+                created["sessions"] += 1
+            else:
+                session_ids[key] = row[0]
+    invalidate_cache()
+    return session_ids, by_key, created
+
+def _lookup(keys: pa.Array, ids: dict) -> list:
+    # clave de texto -> id, vectorizado: index_in contra el diccionario completo
+    names = pa.array(list(ids), type=pa.string())
+    values = np.fromiter(ids.values(), dtype=np.int64, count=len(ids))
+    return values[pc.index_in(keys, value_set=names).to_numpy()].tolist()
+
+def import_sets(source, fmt: str | None = None) -> dict:
+    """
+    Importa sets desde `source` (ruta o archivo abierto, ej. el UploadedFile de Streamlit).
+    Devuelve cuántas filas se leyeron, cuántos sets se agregaron y qué se creó.
+    """
+    t0 = time.perf_counter()
+    fmt = _format(source, fmt)
+    rows, sessions, exercises = _scan(source, fmt)
+    if not rows:
+        raise TransferError("El archivo no tiene filas")
+    session_ids, exercise_ids, created = _resolve(sessions, exercises)
+
+    added = 0
+    next_index = Counter()  # (sesión, ejercicio) -> último set_index, si el archivo no lo trae
+    for batch in _read_batches(source, fmt):
+        cols = _normalize(batch)
+        sids = _lookup(cols["session_key"], session_ids)
+        eids = _lookup(cols["exercise_key"], exercise_ids)
+        if "set_index" in cols:
+            set_index = cols["set_index"].to_numpy().tolist()
+        else:
+            set_index = []
+            for key in zip(sids, eids):
+                next_index[key] += 1
+                set_index.append(next_index[key])
+        records = zip(sids, eids, set_index, cols["reps"].to_numpy().tolist(),
+                      cols["weight"].to_numpy().tolist(), cols["created_at"].to_pylist())
+        with transaction() as conn:
+            added += _insert_sets(conn, records)
+
+    return {
+        "rows": rows,
+        "sets_added": added,
+        "routines_created": created["routines"],
+        "exercises_created": created["exercises"],
+        "sessions_created": created["sessions"],
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+
+def export_sets(dest: str | Path, since: str | None = None, fmt: str | None = None) -> int:
+    """
+    Escribe los sets (mismas columnas que stats_sets) a `dest` lote por lote, sin
+    armar la tabla completa en memoria. Devuelve cuántas filas escribió.
+    """
+    dest = Path(dest)
+    fmt = _format(dest, fmt)
+    schema = arrow_schema(STATS_SETS_COLUMNS)
+    sql, params = _stats_sets_query(since, columnar=True)
+
+    # a un temporal y rename: si falla a medias no queda un archivo cortado
+    tmp = dest.with_name(dest.name + ".tmp")
+    rows = 0
+    writer = pq.ParquetWriter(tmp, schema) if fmt == "parquet" else pacsv.CSVWriter(tmp, schema)
+    try:
+        for batch in iter_arrow_batches(sql, params, STATS_SETS_COLUMNS):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    except BaseException:
+        writer.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    writer.close()
+    tmp.replace(dest)
+    return rows
+
+def export_file(fmt: str = "parquet", since: str | None = None) -> Path:
+    """Exporta a un archivo temporal (junto a los backups) listo para descargar."""
+    dest = _new_backup_path("gym_sets").with_suffix(f".{fmt}")
+    export_sets(dest, since, fmt)
+    return dest
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from db_sqlite import init_db, iso_days_ago
+
+    ap = argparse.ArgumentParser(description="Import / export del historial de sets (CSV o Parquet)")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="importa sets desde un .csv o .parquet")
+    imp.add_argument("path", type=Path)
+    exp = sub.add_parser("export", help="exporta los sets a un .csv o .parquet")
+    exp.add_argument("path", type=Path)
+    exp.add_argument("--days", type=int, help="solo los últimos N días")
+    args = ap.parse_args()
+
+    init_db()
+    if args.cmd == "import":
+        print(import_sets(args.path))
+    else:
+        since = iso_days_ago(args.days) if args.days else None
+        print(f"{export_sets(args.path, since)} filas -> {args.path}")
@@ -0,0 +1,88 @@
+"""
+Precalentamiento: deja hecho lo que si no pagaría el primer usuario después de
+un deploy o reinicio.
+
+- En el proceso de Streamlit, start() corre warmup() en un thread de fondo la
+  primera vez que se abre cualquier página: DB lista, cache de rutinas y
+  ejercicios, miniaturas en el LRU, pandas/plotly importados y las stats del
+  rango por defecto memorizadas; al final, la mantención si ya toca (ver
+  maintenance.py). La página que lo dispara no espera.
+- Antes de abrir la app (script de deploy), `python warmup.py` deja en disco lo
+  que sobrevive entre procesos: migraciones, miniaturas y el snapshot de stats.
+
+GYM_WARMUP=0 lo apaga.
+"""
+import os
+import threading
+import time
+
+import db_sqlite
+from db_sqlite import init_db, list_routines, list_exercises, has_sets
+
+ENABLED = os.getenv("GYM_WARMUP", "1") not in ("", "0")
+
+_started = False
+_lock = threading.Lock()
+
+def _prime_routines():
+    for r in list_routines():
+        list_exercises(r["id"])
+    db_sqlite.data_version()
+
+def _prime_images():
+    from images import THUMB_WIDTHS, image_variant
+    for r in list_routines():
+        for ex in list_exercises(r["id"]):
+            if ex["image_path"]:
+                for width in THUMB_WIDTHS:
+                    image_variant(ex["image_path"], width)
+
+def _import_heavy():
+    import plotly.express  # noqa: F401
+    import stats  # noqa: F401
+
+def _prime_stats():
+    import stats
+    if not has_sets():
+        return
+    # snapshot vencido (o nunca hecho): se rehace; si no, basta con cargar el rango por defecto
+    if stats.load_snapshot(stats.SNAPSHOT_RANGES[0]) is None:
+        # por la cola de snapshots: si Entrenar encoló uno, no escriben dos a la vez
+        stats.schedule_snapshot().result()
+    stats.compute(stats.SNAPSHOT_RANGES[0])
+
+def _maintenance():
+    import maintenance
+    maintenance.maybe_run()
+
+def warmup() -> dict:
+    """Corre todos los pasos. Devuelve los ms de cada uno."""
+    timings = {}
+    for name, step in (
+        ("init_db", init_db),
+        ("rutinas", _prime_routines),
+        ("imágenes", _prime_images),
+        ("import pandas/plotly", _import_heavy),
+        ("stats", _prime_stats),
+        ("mantención", _maintenance),
+    ):
+        t0 = time.perf_counter()
+        step()
+        timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+    return timings
+
+def start():
+    """Lanza warmup() en un thread de fondo, una sola vez por proceso."""
+    global _started
+    if not ENABLED:
+        return
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warmup, name="gym-warmup", daemon=True).start()
+
+
+if __name__ == "__main__":
+    for step, ms in warmup().items():
+        print(f"{step:<22} {ms:10.1f} ms")